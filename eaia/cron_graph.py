@@ -1,3 +1,4 @@
+import asyncio
 from typing import TypedDict
 from eaia.gmail import fetch_group_emails
 from langgraph_sdk import get_client
@@ -6,6 +7,7 @@ import uuid
 import hashlib
 from langgraph.graph import StateGraph, START, END
 from eaia.main.config import get_config
+from eaia.main.near_duplicates import group_near_duplicates
 
 from dotenv import load_dotenv
 import os
@@ -23,8 +25,11 @@ async def main(state: JobKickoff, config):
     minutes_since: int = state["minutes_since"]
     email = get_config(config)["email"]
 
-    # TODO: This really should be async
-    for email in fetch_group_emails(email, minutes_since=minutes_since):
+    # Each email is fetched from Gmail in a thread, so the server's event loop
+    # is not blocked while paging through the inbox
+    emails = iter(fetch_group_emails(email, minutes_since=minutes_since))
+    pending = {}
+    while (email := await asyncio.to_thread(next, emails, None)) is not None:
         thread_id = str(
             uuid.UUID(hex=hashlib.md5(email["thread_id"].encode("UTF-8")).hexdigest())
         )
@@ -44,11 +49,16 @@ async def main(state: JobKickoff, config):
         if recent_email == email["id"]:
             break
         await client.threads.update(thread_id, metadata={"email_id": email["id"]})
+        pending[email["id"]] = (thread_id, email)
 
+    # Near-identical emails from one sender in one thread are triaged and
+    # surfaced as one; other threads reuse the decision through the
+    # near-duplicate clusters (see `eaia.main.near_duplicates`)
+    for group in group_near_duplicates([e for _, e in pending.values()]):
         await client.runs.create(
-            thread_id,
+            pending[group[0]["id"]][0],
             "main",
-            input={"email": email},
+            input={"email": group[0], "duplicates": group[1:]},
             multitask_strategy="rollback",
         )
 
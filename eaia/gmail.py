@@ -1,6 +1,8 @@
 import logging
-from datetime import datetime, timedelta, time
+import threading
+from datetime import datetime, timedelta
 from pathlib import Path
+from time import monotonic
 from typing import Iterable
 import pytz
 import os
@@ -19,7 +21,10 @@ import email.utils
 from langchain_core.tools import tool
 from langchain_core.pydantic_v1 import BaseModel, Field
 
+from eaia import metrics
+from eaia.normalize import normalize_body
 from eaia.schemas import EmailData
+from eaia.tokens import estimate_tokens
 
 logger = logging.getLogger(__name__)
 _SCOPES = [
@@ -254,17 +259,28 @@ def fetch_group_emails(
                 send_time = next(
                     header["value"] for header in headers if header["name"] == "Date"
                 )
+                list_id = next(
+                    (header["value"] for header in headers if header["name"] == "List-Id"),
+                    "",
+                ).strip()
                 # Only process emails that are less than an hour old
                 parsed_time = parse_time(send_time)
-                body = extract_message_part(payload)
+                raw_body = extract_message_part(payload)
+                body = normalize_body(raw_body)
+                tokens_saved = estimate_tokens(raw_body) - estimate_tokens(body)
+                metrics.incr("normalization_tokens_saved", tokens_saved)
+                logger.info(f"Normalized {message['id']}: saved {tokens_saved} tokens")
                 yield {
                     "from_email": from_email,
                     "to_email": _to_email,
                     "subject": subject,
                     "page_content": body,
+                    "raw_page_content": raw_body,
+                    "tokens_saved": tokens_saved,
                     "id": message["id"],
                     "thread_id": message["threadId"],
                     "send_time": parsed_time.isoformat(),
+                    "list_id": list_id,
                 }
                 count += 1
         except Exception:
@@ -292,29 +308,153 @@ class CalInput(BaseModel):
     )
 
 
-def get_calendar_id(calendar_name: str = "primary") -> str:
+# Calendar names rarely change, so their IDs are looked up once an hour
+CALENDAR_ID_TTL = 3600
+# Events are reused this long, so repeated availability checks in one
+# scheduling conversation do not hit the API again
+CALENDAR_CACHE_TTL = float(os.environ.get("EAIA_CALENDAR_CACHE_SECONDS", 300))
+_calendar_lock = threading.Lock()
+_calendar_ids: dict[str, tuple[float, str]] = {}
+# (calendar_id, dd-mm-yyyy) -> (fetched at, events)
+_calendar_cache: dict[tuple[str, str], tuple[float, list]] = {}
+
+
+def _calendar_service():
+    return build("calendar", "v3", credentials=get_credentials(None, None))
+
+
+def get_calendar_id(calendar_name: str = "primary", service=None) -> str:
     """
     Get the calendar ID for a specific calendar name.
-    
+
     Args:
         calendar_name: The name of the calendar to find. Defaults to "primary".
-        
+        service: Calendar API client to use, built if not given.
+
     Returns:
         The calendar ID if found, otherwise returns "primary"
     """
-    creds = get_credentials(None, None)
-    service = build("calendar", "v3", credentials=creds)
-    
-    # Get list of all calendars
+    if calendar_name == "primary":
+        return "primary"
+    with _calendar_lock:
+        cached = _calendar_ids.get(calendar_name)
+    if cached and monotonic() - cached[0] < CALENDAR_ID_TTL:
+        return cached[1]
+
+    service = service or _calendar_service()
+    metrics.incr("calendar_api_calls", method="calendarList")
     calendar_list = service.calendarList().list().execute()
-    
-    # Find the calendar with matching name
-    for calendar_list_entry in calendar_list['items']:
-        if calendar_list_entry['summary'] == calendar_name:
-            return calendar_list_entry['id']
-            
-    # If not found, return primary
-    return "primary"
+
+    # Find the calendar with matching name, or fall back to primary
+    calendar_id = next(
+        (c["id"] for c in calendar_list["items"] if c["summary"] == calendar_name),
+        "primary",
+    )
+    with _calendar_lock:
+        _calendar_ids[calendar_name] = (monotonic(), calendar_id)
+    return calendar_id
+
+
+def invalidate_calendar_cache(calendar_id: str | None = None) -> None:
+    """Forget cached events, e.g. after creating an event."""
+    with _calendar_lock:
+        for key in list(_calendar_cache):
+            if calendar_id is None or key[0] == calendar_id:
+                del _calendar_cache[key]
+
+
+def _day_bounds(date_str: str) -> tuple[datetime, datetime]:
+    day = datetime.strptime(date_str, "%d-%m-%Y").replace(tzinfo=pytz.utc)
+    return day, day + timedelta(days=1)
+
+
+def _parse_event_time(value: dict) -> datetime:
+    if "dateTime" in value:
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    return datetime.fromisoformat(value["date"]).replace(tzinfo=pytz.utc)
+
+
+def _from_cache(
+    calendar_id: str, date_strs: list[str]
+) -> tuple[dict[str, list], list[str]]:
+    now = monotonic()
+    found, missing = {}, []
+    with _calendar_lock:
+        for date_str in date_strs:
+            cached = _calendar_cache.get((calendar_id, date_str))
+            if cached and now - cached[0] < CALENDAR_CACHE_TTL:
+                found[date_str] = cached[1]
+            else:
+                missing.append(date_str)
+    metrics.incr("calendar_cache_hits", len(found))
+    return found, missing
+
+
+def _to_cache(calendar_id: str, values: dict[str, list]) -> None:
+    now = monotonic()
+    with _calendar_lock:
+        for date_str, value in values.items():
+            _calendar_cache[(calendar_id, date_str)] = (now, value)
+
+
+def _by_day(date_strs: list[str], items: list, start_of, end_of) -> dict[str, list]:
+    """Items overlapping each day; an item spanning days is in all of them."""
+    days = {date_str: [] for date_str in date_strs}
+    for item in items:
+        start, end = start_of(item), end_of(item)
+        for date_str in date_strs:
+            day_start, day_end = _day_bounds(date_str)
+            if start < day_end and end > day_start:
+                days[date_str].append(item)
+    return days
+
+
+def _range(date_strs: list[str]) -> tuple[str, str]:
+    bounds = [_day_bounds(d) for d in date_strs]
+    return (
+        min(b[0] for b in bounds).isoformat(),
+        max(b[1] for b in bounds).isoformat(),
+    )
+
+
+def list_events(date_strs: list[str], calendar_name: str = "primary") -> dict[str, list]:
+    """Raw calendar events for each day (dd-mm-yyyy string), keyed by day.
+
+    Days not in the cache are fetched with one request over their whole range.
+    """
+    calendar_id = get_calendar_id(calendar_name)
+    events, missing = _from_cache(calendar_id, date_strs)
+    if missing:
+        service = _calendar_service()
+        time_min, time_max = _range(missing)
+        items, page_token = [], None
+        while True:
+            metrics.incr("calendar_api_calls", method="events")
+            result = (
+                service.events()
+                .list(
+                    calendarId=calendar_id,
+                    timeMin=time_min,
+                    timeMax=time_max,
+                    singleEvents=True,
+                    orderBy="startTime",
+                    pageToken=page_token,
+                )
+                .execute()
+            )
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                break
+        fetched = _by_day(
+            missing,
+            items,
+            lambda e: _parse_event_time(e["start"]),
+            lambda e: _parse_event_time(e["end"]),
+        )
+        _to_cache(calendar_id, fetched)
+        events.update(fetched)
+    return {date_str: events[date_str] for date_str in date_strs}
 
 
 @tool(args_schema=CalInput)
@@ -330,31 +470,8 @@ def get_events_for_days(date_strs: list[str], calendar_name: str = "primary"):
 
     Returns: availability for those days.
     """
-
-    creds = get_credentials(None, None)
-    service = build("calendar", "v3", credentials=creds)
-    calendar_id = get_calendar_id(calendar_name)
     results = ""
-    for date_str in date_strs:
-        # Convert the date string to a datetime.date object
-        day = datetime.strptime(date_str, "%d-%m-%Y").date()
-
-        start_of_day = datetime.combine(day, time.min).isoformat() + "Z"
-        end_of_day = datetime.combine(day, time.max).isoformat() + "Z"
-
-        events_result = (
-            service.events()
-            .list(
-                calendarId=calendar_id,
-                timeMin=start_of_day,
-                timeMax=end_of_day,
-                singleEvents=True,
-                orderBy="startTime",
-            )
-            .execute()
-        )
-        events = events_result.get("items", [])
-
+    for date_str, events in list_events(date_strs, calendar_name).items():
         results += f"***FOR DAY {date_str}***\n\n" + print_events(events)
     return results
 
@@ -407,9 +524,8 @@ def print_events(events):
 def send_calendar_invite(
     emails, title, start_time, end_time, email_address, timezone="PST", calendar_name="primary"
 ):
-    creds = get_credentials(None, None)
-    service = build("calendar", "v3", credentials=creds)
-    calendar_id = get_calendar_id(calendar_name)
+    service = _calendar_service()
+    calendar_id = get_calendar_id(calendar_name, service)
 
     # Parse the start and end times
     start_datetime = datetime.fromisoformat(start_time)
@@ -448,6 +564,8 @@ def send_calendar_invite(
             sendNotifications=True,
             conferenceDataVersion=1,
         ).execute()
+        # The new event makes cached availability for this calendar stale
+        invalidate_calendar_cache(calendar_id)
         return True
     except Exception as e:
         logger.info(f"An error occurred while sending the calendar invite: {e}")
@@ -0,0 +1,98 @@
+"""Detects code that blocks the event loop, for debugging.
+
+All runs on a LangGraph server share one event loop, so a synchronous LLM
+or Gmail call inside an async node stalls every concurrent run. The
+watchdog keeps a heartbeat task on the loop and a thread that checks it;
+when the heartbeat is late by more than `threshold` seconds, the thread
+logs the loop thread's current stack, which points at the blocking call.
+
+Enable it with `EAIA_LOOP_WATCHDOG=true` (threshold in
+`EAIA_LOOP_WATCHDOG_THRESHOLD`, seconds). It is started with the store, so
+it runs for the lifetime of the server.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from eaia import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.25
+
+_watchdogs: dict[int, "LoopWatchdog"] = {}
+
+
+class LoopWatchdog:
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD):
+        self.threshold = threshold
+        self.interval = threshold / 2
+        self._last_beat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start watching the running loop."""
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._heartbeat = asyncio.get_running_loop().create_task(self._beat())
+        threading.Thread(
+            target=self._watch, name="eaia-loop-watchdog", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+
+    async def _beat(self) -> None:
+        while True:
+            self._last_beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        stall_started = None
+        while not self._stopped.wait(self.interval):
+            late = time.monotonic() - self._last_beat - self.interval
+            if late > self.threshold and stall_started is None:
+                stall_started = self._last_beat
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = "".join(traceback.format_stack(frame)) if frame else ""
+                metrics.incr("event_loop_stalls")
+                logger.warning(
+                    f"Event loop blocked for more than {late:.2f}s at:\n{stack}"
+                )
+            elif late <= self.threshold and stall_started is not None:
+                # The heartbeat ran again, so the stall is over
+                metrics.observe("event_loop_stall", self._last_beat - stall_started)
+                stall_started = None
+
+
+def start_watchdog(threshold: Optional[float] = None) -> Optional[LoopWatchdog]:
+    """Watch the running loop if `EAIA_LOOP_WATCHDOG` is set (or a threshold given)."""
+    if threshold is None:
+        if os.environ.get("EAIA_LOOP_WATCHDOG", "").lower() not in ("1", "true"):
+            return None
+        threshold = float(
+            os.environ.get("EAIA_LOOP_WATCHDOG_THRESHOLD", DEFAULT_THRESHOLD)
+        )
+    loop_id = id(asyncio.get_running_loop())
+    if loop_id not in _watchdogs:
+        watchdog = LoopWatchdog(threshold)
+        watchdog.start()
+        _watchdogs[loop_id] = watchdog
+        logger.info(f"Watching the event loop for stalls over {threshold}s")
+    return _watchdogs[loop_id]
+
+
+def stop_watchdog() -> None:
+    watchdog = _watchdogs.pop(id(asyncio.get_running_loop()), None)
+    if watchdog is not None:
+        watchdog.stop()
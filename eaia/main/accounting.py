@@ -0,0 +1,325 @@
+"""Per-node token, latency and cost accounting for LLM calls.
+
+`USAGE_TRACKER` is attached to every LLM built by `get_azure_llm`. It reads
+the node, run and assistant from the callback metadata LangGraph provides,
+and for every call records prompt/completion tokens, wall latency and
+estimated cost, plus the cached prompt tokens the provider reports so
+prefix-cache hit rates can be measured. Extra calls within one node
+execution (the draft retry loop, cascade escalations) count as retries.
+
+Totals are kept per run and node, emitted to the local metrics sink and,
+when running on a LangGraph server, written to the thread's metadata under
+`llm_usage`. Thread writes are debounced: one writer task per thread
+collects the calls of the last `THREAD_WRITE_DELAY` seconds into one update.
+
+`start_usage_scope` additionally counts the tokens of every call made from
+the current task onwards (e.g. a speculative draft), including calls still
+in flight, whose prompt tokens are estimated.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+from eaia import metrics
+from eaia.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# USD per million (input, output) tokens; override with EAIA_MODEL_PRICES
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "o1": (15.00, 60.00),
+    "o1-mini": (3.00, 12.00),
+}
+_MAX_RUNS = 1000
+# Seconds to wait for further calls before writing a thread's usage
+THREAD_WRITE_DELAY = 2.0
+
+_usage_scope: ContextVar[Optional[dict]] = ContextVar("usage_scope", default=None)
+
+
+def start_usage_scope(scope: Optional[dict] = None) -> dict:
+    """Count the tokens of LLM calls made from the current task onwards.
+
+    Call it at the start of a task; tasks it creates inherit the scope.
+    Counts go into `scope` when given, e.g. a dict held by whoever started
+    the task.
+    """
+    scope = scope if scope is not None else {}
+    scope.update(tokens=0, in_flight={})
+    _usage_scope.set(scope)
+    return scope
+
+
+def scope_tokens(scope: dict) -> int:
+    """Tokens used in `scope`, with estimated prompt tokens for unfinished calls."""
+    return scope["tokens"] + sum(scope["in_flight"].values())
+
+
+def _prices() -> dict:
+    override = os.environ.get("EAIA_MODEL_PRICES")
+    return {**MODEL_PRICES, **json.loads(override)} if override else MODEL_PRICES
+
+
+def estimate_cost(model: Optional[str], prompt_tokens: int, completion_tokens: int) -> float:
+    prices = _prices()
+    # Versioned names such as gpt-4o-2024-08-06 use their base model's price
+    match = max((m for m in prices if model and model.startswith(m)), key=len, default=None)
+    if match is None:
+        return 0.0
+    input_price, output_price = prices[match]
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def _node_name(metadata: dict) -> str:
+    # Calls inside subgraphs (the meeting react agent, nested reflection
+    # graphs) are attributed to the top-level node that ran them
+    namespace = metadata.get("checkpoint_ns") or ""
+    if namespace:
+        return namespace.split("|")[0].split(":")[0]
+    return metadata.get("langgraph_node", "unknown")
+
+
+def _usage(response: LLMResult) -> dict:
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None)
+            if usage:
+                details = usage.get("input_token_details") or {}
+                return {
+                    "prompt_tokens": usage.get("input_tokens", 0),
+                    "completion_tokens": usage.get("output_tokens", 0),
+                    "cached_tokens": details.get("cache_read", 0),
+                }
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": token_usage.get("prompt_tokens", 0),
+        "completion_tokens": token_usage.get("completion_tokens", 0),
+        "cached_tokens": (token_usage.get("prompt_tokens_details") or {}).get(
+            "cached_tokens", 0
+        ),
+    }
+
+
+def _empty_totals() -> dict:
+    return {
+        "calls": 0,
+        "retries": 0,
+        "errors": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "latency": 0.0,
+        "cost": 0.0,
+    }
+
+
+class UsageTracker(BaseCallbackHandler):
+    """Callback handler that accounts every LLM call to its node and run."""
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: dict[UUID, dict] = {}
+        # Calls per node execution, to tell retries from first attempts
+        self._executions: OrderedDict[str, int] = OrderedDict()
+        self._runs: OrderedDict[str, dict] = OrderedDict()
+        # Latest unwritten usage and the task writing it, per thread
+        self._unwritten: dict[str, dict] = {}
+        self._writers: dict[str, asyncio.Task] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict,
+        messages: list,
+        *,
+        run_id: UUID,
+        metadata: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> None:
+        metadata = metadata or {}
+        scope = _usage_scope.get()
+        if scope is not None:
+            scope["in_flight"][run_id] = sum(
+                estimate_tokens(str(m.content)) for batch in messages for m in batch
+            )
+        execution = metadata.get("checkpoint_ns") or str(run_id)
+        with self._lock:
+            attempt = self._executions.get(execution, 0)
+            self._executions[execution] = attempt + 1
+            while len(self._executions) > _MAX_RUNS:
+                self._executions.popitem(last=False)
+            self._pending[run_id] = {
+                "start": time.perf_counter(),
+                "node": _node_name(metadata),
+                "run": str(
+                    metadata.get("run_id") or metadata.get("thread_id") or "local"
+                ),
+                "thread_id": metadata.get("thread_id"),
+                "assistant_id": metadata.get("assistant_id", "default"),
+                "model": metadata.get("ls_model_name"),
+                "retry": attempt > 0,
+                "scope": scope,
+            }
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(run_id, _usage(response), error=False)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._finish(
+            run_id, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}, error=True
+        )
+
+    def _finish(self, run_id: UUID, usage: dict, error: bool) -> None:
+        with self._lock:
+            call = self._pending.pop(run_id, None)
+        if call is None:
+            return
+        if call["scope"] is not None:
+            call["scope"]["in_flight"].pop(run_id, None)
+            call["scope"]["tokens"] += usage["prompt_tokens"] + usage["completion_tokens"]
+        latency = time.perf_counter() - call["start"]
+        cost = estimate_cost(
+            call["model"], usage["prompt_tokens"], usage["completion_tokens"]
+        )
+        with self._lock:
+            run = self._runs.setdefault(
+                call["run"], {"assistant_id": call["assistant_id"], "nodes": {}}
+            )
+            self._runs.move_to_end(call["run"])
+            while len(self._runs) > _MAX_RUNS:
+                self._runs.popitem(last=False)
+            totals = run["nodes"].setdefault(call["node"], _empty_totals())
+            totals["calls"] += 1
+            totals["retries"] += int(call["retry"])
+            totals["errors"] += int(error)
+            totals["prompt_tokens"] += usage["prompt_tokens"]
+            totals["completion_tokens"] += usage["completion_tokens"]
+            totals["cached_tokens"] += usage["cached_tokens"]
+            totals["latency"] += latency
+            totals["cost"] += cost
+            summary = self._summarize(run)
+
+        labels = {"node": call["node"], "assistant_id": call["assistant_id"]}
+        cache_hit = usage["cached_tokens"] > 0
+        metrics.incr("llm_calls", **labels)
+        metrics.incr("llm_prompt_tokens", usage["prompt_tokens"], **labels)
+        metrics.incr("llm_completion_tokens", usage["completion_tokens"], **labels)
+        metrics.incr("llm_cached_tokens", usage["cached_tokens"], **labels)
+        metrics.incr("llm_cache_hits", int(cache_hit), **labels)
+        metrics.incr("llm_cost", cost, **labels)
+        # Split by cache hit to compare latency with and without a cached prefix
+        metrics.observe("llm_latency", latency, cache_hit=cache_hit, **labels)
+        metrics.emit(
+            "llm_call",
+            run=call["run"],
+            model=call["model"],
+            retry=call["retry"],
+            error=error,
+            latency=latency,
+            cost=cost,
+            cache_hit=cache_hit,
+            **labels,
+            **usage,
+        )
+        if call["thread_id"]:
+            self._write_thread_metadata(call["thread_id"], call["run"], summary)
+
+    def _summarize(self, run: dict) -> dict:
+        total = _empty_totals()
+        for totals in run["nodes"].values():
+            for k in total:
+                total[k] += totals[k]
+        return {
+            "assistant_id": run["assistant_id"],
+            "nodes": {k: dict(v) for k, v in run["nodes"].items()},
+            "total": total,
+        }
+
+    def _write_thread_metadata(self, thread_id: str, run: str, summary: dict) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._unwritten[thread_id] = {"run_id": run, **summary}
+        if thread_id not in self._writers:
+            task = loop.create_task(self._write_thread(thread_id))
+            self._writers[thread_id] = task
+            task.add_done_callback(lambda t: self._writer_done(thread_id, t))
+
+    async def _write_thread(self, thread_id: str) -> None:
+        try:
+            while thread_id in self._unwritten:
+                await asyncio.sleep(THREAD_WRITE_DELAY)
+                await _update_thread(thread_id, self._unwritten.pop(thread_id))
+        finally:
+            # Unregistered in the same step as the check above: a call that
+            # finishes after it must start a new writer, and the done
+            # callback may only run after that call
+            self._writers.pop(thread_id, None)
+
+    def _writer_done(self, thread_id: str, task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(
+                f"Could not write usage to thread {thread_id}: {task.exception()}"
+            )
+
+    async def flush(self) -> None:
+        """Wait for pending thread metadata writes, e.g. before shutdown."""
+        await asyncio.gather(*self._writers.values(), return_exceptions=True)
+
+    def get_run_usage(self, run: str) -> Optional[dict]:
+        with self._lock:
+            if run not in self._runs:
+                return None
+            return self._summarize(self._runs[run])
+
+
+_CLIENT = None
+
+
+async def _update_thread(thread_id: str, usage: dict) -> None:
+    global _CLIENT
+    # Imported lazily, so the tracker works without a LangGraph server
+    from langgraph_sdk import get_client
+
+    if _CLIENT is None:
+        _CLIENT = get_client()
+    try:
+        await _CLIENT.threads.update(thread_id, metadata={"llm_usage": usage})
+    except Exception as e:
+        logger.debug(f"Could not write usage to thread {thread_id}: {e}")
+
+
+# Triage, drafting and rewrite send a system message that only changes
+# with the assistant's config or learned prompts, and put the email in a
+# separate user message. The provider can then serve the system message
+# as a cached prompt prefix; these stats show how often that happens.
+def get_prompt_cache_stats(node: str, assistant_id: str = "default") -> dict:
+    """Prefix-cache hit rates for `node`, from the provider's cached-token counts."""
+    labels = {"node": node, "assistant_id": assistant_id}
+    calls = metrics.get_counter("llm_calls", **labels)
+    prompt_tokens = metrics.get_counter("llm_prompt_tokens", **labels)
+    cached_tokens = metrics.get_counter("llm_cached_tokens", **labels)
+    return {
+        "calls": calls,
+        "hit_rate": metrics.get_counter("llm_cache_hits", **labels) / calls if calls else 0.0,
+        "cached_token_share": cached_tokens / prompt_tokens if prompt_tokens else 0.0,
+    }
+
+
+USAGE_TRACKER = UsageTracker()
@@ -0,0 +1,190 @@
+"""Free-slot computation for `find_meeting_time`.
+
+Busy intervals from the calendar are merged, widened by a travel buffer
+and subtracted from the assistant's working hours; what is left, in
+windows of at least the minimum meeting length, is when the user is free.
+Working hours, minimum length and buffer come from the config
+(`working_hours`, `min_meeting_minutes`, `travel_buffer_minutes`).
+"""
+
+import re
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Iterable, NamedTuple
+
+import pytz
+
+from eaia.gmail import list_events
+from eaia.main.config import AssistantConfig
+
+Interval = tuple[datetime, datetime]
+
+DEFAULT_WORKING_HOURS = "Mon-Fri 09:00-17:00"
+DEFAULT_MIN_MEETING_MINUTES = 30
+DEFAULT_TRAVEL_BUFFER_MINUTES = 0
+# How far ahead free slots are looked for
+SEARCH_DAYS = 14
+# All-day event types that block the whole day
+ALL_DAY_BUSY_TYPES = {"default", "outOfOffice"}
+
+_DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+_WORKING_HOURS = re.compile(
+    r"^\s*(\w{3})\w*(?:\s*-\s*(\w{3})\w*)?\s+(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*$"
+)
+
+
+class WorkingHours(NamedTuple):
+    # Weekday numbers, Monday is 0
+    days: frozenset[int]
+    start: time
+    end: time
+
+
+class SchedulingSettings(NamedTuple):
+    hours: WorkingHours
+    min_length: timedelta
+    buffer: timedelta
+    tz: tzinfo
+
+
+def parse_working_hours(spec: str) -> WorkingHours:
+    """Parse e.g. "Mon-Sat 09:00-19:00" or "Tue 10:00-16:00"."""
+    match = _WORKING_HOURS.match(spec)
+    if not match:
+        raise ValueError(f"Invalid working hours: {spec!r}")
+    first, last, start_h, start_m, end_h, end_m = match.groups()
+    try:
+        first_day = _DAYS.index(first.lower())
+        last_day = _DAYS.index((last or first).lower())
+    except ValueError:
+        raise ValueError(f"Invalid working hours: {spec!r}") from None
+    days = frozenset(
+        d % 7 for d in range(first_day, first_day + (last_day - first_day) % 7 + 1)
+    )
+    start, end = time(int(start_h), int(start_m)), time(int(end_h), int(end_m))
+    if end <= start:
+        raise ValueError(f"Working hours end before they start: {spec!r}")
+    return WorkingHours(days, start, end)
+
+
+def get_settings(prompt_config: AssistantConfig) -> SchedulingSettings:
+    return SchedulingSettings(
+        hours=parse_working_hours(
+            prompt_config.get("working_hours", DEFAULT_WORKING_HOURS)
+        ),
+        min_length=timedelta(
+            minutes=prompt_config.get("min_meeting_minutes", DEFAULT_MIN_MEETING_MINUTES)
+        ),
+        buffer=timedelta(
+            minutes=prompt_config.get(
+                "travel_buffer_minutes", DEFAULT_TRAVEL_BUFFER_MINUTES
+            )
+        ),
+        tz=pytz.timezone(prompt_config["timezone"]),
+    )
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Sorted, non-overlapping union of `intervals`."""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _localize(tz: tzinfo, day: date, at: time) -> datetime:
+    naive = datetime.combine(day, at)
+    return tz.localize(naive) if hasattr(tz, "localize") else naive.replace(tzinfo=tz)
+
+
+def _event_time(value: dict, tz: tzinfo) -> datetime:
+    if "dateTime" in value:
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    # All-day events block the whole day in the user's timezone
+    return _localize(tz, date.fromisoformat(value["date"]), time.min)
+
+
+def _is_busy(event: dict) -> bool:
+    if event.get("status") == "cancelled":
+        return False
+    if "date" in event["start"]:
+        return event.get("eventType", "default") in ALL_DAY_BUSY_TYPES
+    return event.get("transparency") != "transparent"
+
+
+def busy_intervals(events: Iterable[dict], tz: tzinfo) -> list[Interval]:
+    """Busy intervals of Google Calendar events, skipping ones marked free.
+
+    All-day regular and out-of-office events always block their days:
+    Google Calendar marks them as free by default, so the FreeBusy API would
+    leave out e.g. holidays. Other all-day events, such as working locations
+    and birthdays, never block.
+    """
+    return merge_intervals(
+        (_event_time(e["start"], tz), _event_time(e["end"], tz))
+        for e in events
+        if _is_busy(e)
+    )
+
+
+def free_slots(
+    busy: Iterable[Interval],
+    start: datetime,
+    end: datetime,
+    settings: SchedulingSettings,
+) -> list[Interval]:
+    """Free windows between `start` and `end` within working hours."""
+    blocked = merge_intervals(
+        (b_start - settings.buffer, b_end + settings.buffer) for b_start, b_end in busy
+    )
+    slots = []
+    day = start.astimezone(settings.tz).date()
+    while day <= end.astimezone(settings.tz).date():
+        if day.weekday() in settings.hours.days:
+            window_start = max(start, _localize(settings.tz, day, settings.hours.start))
+            window_end = min(end, _localize(settings.tz, day, settings.hours.end))
+            cursor = window_start
+            for b_start, b_end in blocked:
+                if b_end <= cursor or b_start >= window_end:
+                    continue
+                if b_start - cursor >= settings.min_length:
+                    slots.append((cursor, b_start))
+                cursor = max(cursor, b_end)
+            if window_end - cursor >= settings.min_length:
+                slots.append((cursor, window_end))
+        day += timedelta(days=1)
+    return slots
+
+
+def format_slots(slots: list[Interval], tz: tzinfo) -> str:
+    """One line per day, e.g. "Tuesday 04 June: 09:00-11:30, 14:00-19:00"."""
+    days: dict[date, list[str]] = {}
+    for start, end in slots:
+        start, end = start.astimezone(tz), end.astimezone(tz)
+        days.setdefault(start.date(), []).append(
+            f"{start:%H:%M}-{end:%H:%M}"
+        )
+    return "\n".join(
+        f"{day:%A %d %B}: {', '.join(windows)}" for day, windows in days.items()
+    )
+
+
+def calendar_days(start: date, days: int) -> list[str]:
+    return [(start + timedelta(days=i)).strftime("%d-%m-%Y") for i in range(days)]
+
+
+def fetch_busy(
+    prompt_config: AssistantConfig, start: date, days: int = SEARCH_DAYS + 1
+) -> list[Interval]:
+    """Busy intervals in the user's calendar for `days` days from `start`."""
+    events = list_events(
+        calendar_days(start, days), prompt_config.get("calendar_name", "primary")
+    )
+    # Events spanning several days are listed under each of them, which
+    # merging takes care of
+    return busy_intervals(
+        (event for day in events.values() for event in day),
+        pytz.timezone(prompt_config["timezone"]),
+    )
@@ -1,28 +1,207 @@
 """Configuration for Azure OpenAI."""
+import asyncio
+import json
 import os
-from typing import Optional
+import time
+from typing import Any, List, Optional
 
+from langchain_core.messages import BaseMessage
 from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 
 from dotenv import load_dotenv
-import os
 
-load_dotenv() 
+from eaia.main.accounting import USAGE_TRACKER
+from eaia.main.embeddings import EMBEDDING_BATCH_SIZE
+from eaia.main.deployment_pool import (
+    Deployment,
+    get_cooldown,
+    get_pool,
+    is_retryable_error,
+)
+from eaia.main.rate_limit import DEFAULT_COMPLETION_RESERVE, INTERACTIVE, LIMITER
+from eaia.tokens import estimate_tokens
+
+load_dotenv()
+
+# Per-deployment clients, shared by every pooled LLM with the same settings
+_CLIENTS: dict[tuple, AzureChatOpenAI] = {}
+
+
+class PooledAzureChatOpenAI(AzureChatOpenAI):
+    """AzureChatOpenAI that routes each request through the deployment pool.
+
+    Every request picks a deployment from the pool, reserves budget for it in
+    the shared rate limiter and fails over to another deployment on 429/5xx.
+    """
+
+    priority: int = INTERACTIVE
+    # Pool group or deployment name to route to, None for the default group
+    pool_name: Optional[str] = None
+    # Ask for token usage on streamed responses, for accounting and budgeting
+    stream_usage: bool = True
+
+    def _client_for(self, deployment: Deployment) -> AzureChatOpenAI:
+        key = (deployment.key, self.model_name, self.temperature, self.streaming)
+        if key not in _CLIENTS:
+            # Retries are done by the pool, so a 429 fails over to another
+            # deployment instead of being retried on the same one
+            _CLIENTS[key] = AzureChatOpenAI(
+                azure_deployment=deployment.deployment,
+                azure_endpoint=deployment.endpoint,
+                api_key=deployment.api_key,
+                openai_api_version=deployment.api_version,
+                temperature=self.temperature,
+                model=self.model_name,
+                streaming=self.streaming,
+                max_retries=0,
+            )
+        return _CLIENTS[key]
+
+    def _estimate_request_tokens(self, messages: List[BaseMessage], kwargs: dict) -> int:
+        tokens = sum(estimate_tokens(str(m.content)) + 4 for m in messages)
+        if kwargs.get("tools"):
+            tokens += estimate_tokens(json.dumps(kwargs["tools"], default=str))
+        return tokens + (self.max_tokens or DEFAULT_COMPLETION_RESERVE)
+
+    async def _acquire(self, tokens: int, tried: set):
+        pool = get_pool()
+        deployment = pool.choose(self.pool_name, exclude=tried)
+        reservation = await LIMITER.acquire(deployment.key, tokens, self.priority)
+        pool.start(deployment, tokens)
+        return deployment, reservation
+
+    async def _should_fail_over(
+        self, deployment: Deployment, error: Exception, tried: set, rounds: list
+    ) -> bool:
+        """Whether to retry on another deployment after `error`.
+
+        Once every deployment failed, another round over all of them starts
+        after the first cooldown ends, up to `max_retries` rounds.
+        """
+        pool = get_pool()
+        if not is_retryable_error(error):
+            return False
+        pool.mark_unhealthy(deployment, get_cooldown(error))
+        tried.add(deployment.key)
+        candidates = pool.candidates(self.pool_name)
+        if len(tried) < len(candidates):
+            return True
+        if len(rounds) >= self.max_retries:
+            return False
+        rounds.append(deployment.key)
+        tried.clear()
+        wait = min(d.cooldown_until for d in candidates) - time.monotonic()
+        await asyncio.sleep(max(wait, 0.0))
+        return True
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ):
+        if self.streaming:
+            # Routed in `_astream`, which the parent delegates to
+            return await super()._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+        tokens = self._estimate_request_tokens(messages, kwargs)
+        pool = get_pool()
+        tried, rounds = set(), []
+        while True:
+            deployment, reservation = await self._acquire(tokens, tried)
+            start = time.perf_counter()
+            error = False
+            # `finally` also releases the deployment's outstanding tokens
+            # when the call is cancelled, e.g. a discarded speculative draft
+            try:
+                result = await self._client_for(deployment)._agenerate(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                )
+            except Exception as e:
+                error = True
+                pool.finish(deployment, tokens, time.perf_counter() - start, error=True)
+                if await self._should_fail_over(deployment, e, tried, rounds):
+                    continue
+                raise
+            finally:
+                if not error:
+                    pool.finish(deployment, tokens, time.perf_counter() - start)
+            usage = (result.llm_output or {}).get("token_usage") or {}
+            if usage.get("total_tokens"):
+                reservation.reconcile(usage["total_tokens"])
+            return result
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ):
+        tokens = self._estimate_request_tokens(messages, kwargs)
+        if self.stream_usage:
+            kwargs.setdefault("stream_options", {"include_usage": True})
+        pool = get_pool()
+        tried, rounds = set(), []
+        while True:
+            deployment, reservation = await self._acquire(tokens, tried)
+            start = time.perf_counter()
+            started = False
+            error = False
+            try:
+                async for chunk in self._client_for(deployment)._astream(
+                    messages, stop=stop, run_manager=run_manager, **kwargs
+                ):
+                    started = True
+                    usage = getattr(chunk.message, "usage_metadata", None)
+                    if usage and usage.get("total_tokens"):
+                        reservation.reconcile(usage["total_tokens"])
+                    yield chunk
+            except Exception as e:
+                error = True
+                pool.finish(deployment, tokens, time.perf_counter() - start, error=True)
+                # Can only fail over before anything was streamed
+                if not started and await self._should_fail_over(
+                    deployment, e, tried, rounds
+                ):
+                    continue
+                raise
+            finally:
+                # Also runs when the consumer stops early or is cancelled
+                if not error:
+                    pool.finish(deployment, tokens, time.perf_counter() - start)
+            return
+
 
 def get_azure_llm(
     temperature: float = 0,
     model: Optional[str] = None,
     disable_streaming: Optional[bool] = None,
+    deployment: Optional[str] = None,
+    priority: int = INTERACTIVE,
 ) -> AzureChatOpenAI:
-    """Get configured Azure OpenAI LLM instance."""
-    return AzureChatOpenAI(
-        azure_deployment=os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"],
-        openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
-        azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
-        api_key=os.environ["AZURE_OPENAI_API_KEY"],
+    """Get configured Azure OpenAI LLM instance.
+
+    Requests are spread over the deployment pool (see `deployment_pool`).
+    `deployment` selects a pool group or deployment name instead of the
+    default group, e.g. to target a cheaper deployment in a model cascade.
+    `priority` orders this LLM's requests in the shared rate limiter
+    (`rate_limit.BACKGROUND` for reflection).
+    """
+    base = get_pool().candidates(deployment)[0]
+    return PooledAzureChatOpenAI(
+        azure_deployment=base.deployment,
+        openai_api_version=base.api_version,
+        azure_endpoint=base.endpoint,
+        api_key=base.api_key,
         temperature=temperature,
         model=model,
         streaming=not disable_streaming if disable_streaming is not None else True,
+        priority=priority,
+        pool_name=deployment,
+        callbacks=[USAGE_TRACKER],
     )
 
 
@@ -38,5 +217,6 @@ def get_azure_embeddings() -> AzureOpenAIEmbeddings:
         openai_api_version=os.environ["AZURE_OPENAI_API_VERSION"],
         azure_endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
         api_key=api_key,
-        chunk_size=1,  # Process one text at a time
-    ) 
\ No newline at end of file
+        # Batching is done by eaia.main.embeddings, send each batch as is
+        chunk_size=EMBEDDING_BATCH_SIZE,
+    )
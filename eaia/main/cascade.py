@@ -0,0 +1,99 @@
+"""Model cascade: try a cheaper deployment first, escalate when the result is not good enough.
+
+Configured per node under `configurable.cascade`, e.g.
+
+    {"cascade": {"triage_input": {
+        "tiers": [{"model": "gpt-4o-mini", "deployment": "gpt-4o-mini"}, "gpt-4o"],
+        "min_confidence": 0.7,
+    }}}
+
+Nodes without a cascade use `configurable.model` only, as before.
+"""
+
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from eaia import metrics
+from eaia.main.azure_config import get_azure_llm
+
+logger = logging.getLogger(__name__)
+
+
+def _node_config(config: dict, node: str) -> dict:
+    return (config["configurable"].get("cascade") or {}).get(node) or {}
+
+
+def get_tiers(config: dict, node: str) -> list[dict]:
+    """Return the tiers for `node`, cheapest first."""
+    tiers = _node_config(config, node).get("tiers")
+    if not tiers:
+        return [{"model": config["configurable"].get("model", "gpt-4o")}]
+    return [{"model": t} if isinstance(t, str) else dict(t) for t in tiers]
+
+
+def get_min_confidence(config: dict, node: str) -> float:
+    return float(_node_config(config, node).get("min_confidence", 0.0))
+
+
+def get_tier_llm(tier: dict, **kwargs):
+    return get_azure_llm(model=tier["model"], deployment=tier.get("deployment"), **kwargs)
+
+
+def record_call(node: str) -> None:
+    metrics.incr("cascade_calls", node=node)
+
+
+def record_latency(node: str, tier: dict, seconds: float) -> None:
+    metrics.observe("cascade_tier_latency", seconds, node=node, model=tier["model"])
+
+
+def record_escalation(node: str, tier: dict, reason: str) -> None:
+    metrics.incr("cascade_escalations", node=node, reason=reason)
+    logger.info(f"Escalating {node} from {tier['model']} ({reason})")
+
+
+def get_escalation_rate(node: str) -> float:
+    """Fraction of calls to `node` that escalated past the first tier."""
+    calls = metrics.get_counter("cascade_calls", node=node)
+    if not calls:
+        return 0.0
+    escalations = sum(
+        c["value"]
+        for c in metrics.snapshot()["counters"]
+        if c["name"] == "cascade_escalations" and c["labels"].get("node") == node
+    )
+    return escalations / calls
+
+
+async def run_cascade(
+    node: str,
+    config: dict,
+    call: Callable[[Any], Awaitable[Any]],
+    accept: Optional[Callable[[Any], bool]] = None,
+    **llm_kwargs,
+):
+    """Run `call(llm)` on each tier until `accept(result)` holds.
+
+    A schema validation failure (pydantic and output parser errors are both
+    `ValueError`s) also escalates. The last tier's result is returned as is,
+    and its errors propagate.
+    """
+    tiers = get_tiers(config, node)
+    record_call(node)
+    for i, tier in enumerate(tiers):
+        last = i == len(tiers) - 1
+        llm = get_tier_llm(tier, **llm_kwargs)
+        start = time.perf_counter()
+        try:
+            result = await call(llm)
+        except ValueError:
+            record_latency(node, tier, time.perf_counter() - start)
+            if last:
+                raise
+            record_escalation(node, tier, "schema_error")
+            continue
+        record_latency(node, tier, time.perf_counter() - start)
+        if last or accept is None or accept(result):
+            return result
+        record_escalation(node, tier, "low_confidence")
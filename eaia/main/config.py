@@ -1,15 +1,118 @@
-import yaml
+import os
+import threading
 from pathlib import Path
+from typing import Optional
+
+import yaml
+from typing_extensions import NotRequired, TypedDict
 
 _ROOT = Path(__file__).absolute().parent
+CONFIG_PATH = _ROOT.joinpath("config.yaml")
+_MAX_CACHED_CONFIGURABLES = 128
+
+
+class AssistantConfig(TypedDict):
+    email: str
+    full_name: str
+    name: str
+    background: str
+    timezone: str
+    schedule_preferences: str
+    background_preferences: str
+    response_preferences: str
+    rewrite_preferences: str
+    triage_no: str
+    triage_notify: str
+    triage_email: str
+    memory: bool
+    calendar_name: NotRequired[str]
+    # Used by `find_meeting_time` to compute free slots, e.g. "Mon-Sat 09:00-19:00"
+    working_hours: NotRequired[str]
+    min_meeting_minutes: NotRequired[int]
+    travel_buffer_minutes: NotRequired[int]
+
+
+_REQUIRED_KEYS = AssistantConfig.__required_keys__
+_OPTIONAL_KEYS = AssistantConfig.__optional_keys__
+_KEY_TYPES = {
+    "memory": bool,
+    "min_meeting_minutes": int,
+    "travel_buffer_minutes": int,
+}
+_lock = threading.Lock()
+# path -> (mtime, parsed config)
+_file_cache: dict[str, tuple[int, AssistantConfig]] = {}
+_configurable_cache: dict[tuple, AssistantConfig] = {}
+
+
+def validate_config(raw: dict, source: str) -> AssistantConfig:
+    """Check `raw` has every required key with the right type."""
+    if not isinstance(raw, dict):
+        raise ValueError(f"Config from {source} must be a mapping")
+    missing = sorted(k for k in _REQUIRED_KEYS if raw.get(k) is None)
+    if missing:
+        raise ValueError(f"Config from {source} is missing keys: {', '.join(missing)}")
+    for key in _REQUIRED_KEYS | _OPTIONAL_KEYS:
+        if key not in raw:
+            continue
+        expected = _KEY_TYPES.get(key, str)
+        # bool is a subclass of int, but `true` is not a number of minutes
+        if not isinstance(raw[key], expected) or (
+            expected is int and isinstance(raw[key], bool)
+        ):
+            raise ValueError(
+                f"Config key `{key}` from {source} must be a {expected.__name__}"
+            )
+    if "working_hours" in raw:
+        # Imported here, as `availability` imports this module
+        from eaia.main.availability import parse_working_hours
+
+        try:
+            parse_working_hours(raw["working_hours"])
+        except ValueError as e:
+            raise ValueError(f"Config key `working_hours` from {source}: {e}") from None
+    return AssistantConfig(
+        **{k: raw[k] for k in _REQUIRED_KEYS | _OPTIONAL_KEYS if k in raw}
+    )
+
+
+def load_file_config(path: Optional[Path] = None) -> AssistantConfig:
+    """Parse and validate config.yaml, re-reading it only when its mtime changes."""
+    path = str(path or CONFIG_PATH)
+    mtime = os.stat(path).st_mtime_ns
+    with _lock:
+        cached = _file_cache.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path) as stream:
+        config = validate_config(yaml.safe_load(stream), path)
+    with _lock:
+        _file_cache[path] = (mtime, config)
+    return config
+
+
+def _from_configurable(configurable: dict) -> AssistantConfig:
+    values = tuple(configurable.get(k) for k in sorted(_REQUIRED_KEYS | _OPTIONAL_KEYS))
+    try:
+        hash(values)
+    except TypeError:
+        return validate_config(configurable, "configurable")
+    with _lock:
+        if values in _configurable_cache:
+            return _configurable_cache[values]
+    config = validate_config(configurable, "configurable")
+    with _lock:
+        if len(_configurable_cache) >= _MAX_CACHED_CONFIGURABLES:
+            _configurable_cache.pop(next(iter(_configurable_cache)))
+        _configurable_cache[values] = config
+    return config
 
 
-def get_config(config: dict):
+def get_config(config: dict) -> AssistantConfig:
     # This loads things either ALL from configurable, or
     # all from the config.yaml
     # This is done intentionally to enforce an "all or nothing" configuration
     if "email" in config["configurable"]:
-        return config["configurable"]
+        return _from_configurable(config["configurable"])
     else:
-        with open(_ROOT.joinpath("config.yaml")) as stream:
-            return yaml.safe_load(stream)
+        return load_file_config()
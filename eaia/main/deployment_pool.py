@@ -0,0 +1,207 @@
+"""Pool of Azure OpenAI deployments to spread load across quotas.
+
+The pool is read from `AZURE_OPENAI_DEPLOYMENTS`, a JSON list such as
+
+    [{"endpoint": "https://a.openai.azure.com", "deployment": "gpt-4o", "weight": 2, "tpm": 150000},
+     {"endpoint": "https://b.openai.azure.com", "deployment": "gpt-4o", "api_key": "...", "rpm": 300},
+     {"endpoint": "https://b.openai.azure.com", "deployment": "gpt-4o-mini", "group": "mini"}]
+
+Missing `api_key`/`api_version` fall back to the usual `AZURE_OPENAI_*`
+variables. Without the variable the pool holds the single
+`AZURE_OPENAI_DEPLOYMENT_NAME` deployment, as before.
+
+Requests go to the healthy deployment with the fewest outstanding tokens
+relative to its weight. A deployment that returns 429 or 5xx is taken out
+of rotation for a cooldown period.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from eaia import metrics
+from eaia.main.rate_limit import LIMITER
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP = "default"
+DEFAULT_COOLDOWN_SECONDS = 30.0
+
+
+class Deployment:
+    def __init__(
+        self,
+        endpoint: str,
+        deployment: str,
+        api_key: str,
+        api_version: str,
+        weight: float = 1.0,
+        group: str = DEFAULT_GROUP,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+    ):
+        self.endpoint = endpoint
+        self.deployment = deployment
+        self.api_key = api_key
+        self.api_version = api_version
+        self.weight = weight
+        self.group = group
+        self.rpm = rpm
+        self.tpm = tpm
+        self.outstanding_tokens = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.cooldown_until = 0.0
+
+    @property
+    def key(self) -> str:
+        """Identifies the deployment in the rate limiter and in metrics."""
+        return f"{self.endpoint.rstrip('/')}/{self.deployment}"
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def load(self) -> float:
+        return (self.outstanding_tokens + 1) / self.weight
+
+
+class DeploymentPool:
+    def __init__(self, deployments: list[Deployment]):
+        if not deployments:
+            raise ValueError("Deployment pool needs at least one deployment")
+        self.deployments = deployments
+        self._lock = threading.Lock()
+        for d in deployments:
+            if d.rpm is not None or d.tpm is not None:
+                LIMITER.configure(d.key, rpm=d.rpm, tpm=d.tpm)
+
+    def candidates(self, name: Optional[str] = None) -> list[Deployment]:
+        """Deployments serving `name` (a group or deployment name)."""
+        if name is None:
+            name = DEFAULT_GROUP
+        with self._lock:
+            matches = [d for d in self.deployments if name in (d.group, d.deployment)]
+            if not matches:
+                # An unknown deployment name, e.g. a cascade tier outside the
+                # pool: serve it from the first endpoint, in its own group
+                base = self.deployments[0]
+                matches = [
+                    Deployment(
+                        base.endpoint, name, base.api_key, base.api_version, group=name
+                    )
+                ]
+                self.deployments.extend(matches)
+            return matches
+
+    def choose(self, name: Optional[str] = None, exclude=()) -> Deployment:
+        candidates = [d for d in self.candidates(name) if d.key not in exclude]
+        if not candidates:
+            raise ValueError(f"No deployment left to serve {name or DEFAULT_GROUP}")
+        now = time.monotonic()
+        with self._lock:
+            healthy = [d for d in candidates if d.is_healthy(now)]
+            if not healthy:
+                # Everything is cooling down, use whichever recovers first
+                return min(candidates, key=lambda d: d.cooldown_until)
+            return min(healthy, key=lambda d: (d.load(), d.requests))
+
+    def start(self, deployment: Deployment, tokens: int) -> None:
+        with self._lock:
+            deployment.outstanding_tokens += tokens
+            deployment.requests += 1
+
+    def finish(
+        self, deployment: Deployment, tokens: int, latency: float, error: bool = False
+    ) -> None:
+        with self._lock:
+            deployment.outstanding_tokens -= tokens
+            deployment.total_latency += latency
+            if error:
+                deployment.errors += 1
+        metrics.observe("deployment_latency", latency, deployment=deployment.key)
+        if error:
+            metrics.incr("deployment_errors", deployment=deployment.key)
+
+    def mark_unhealthy(
+        self, deployment: Deployment, cooldown: float = DEFAULT_COOLDOWN_SECONDS
+    ) -> None:
+        with self._lock:
+            deployment.cooldown_until = time.monotonic() + cooldown
+        logger.warning(f"Taking {deployment.key} out of rotation for {cooldown:.0f}s")
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                d.key: {
+                    "requests": d.requests,
+                    "errors": d.errors,
+                    "avg_latency": d.total_latency / d.requests if d.requests else 0.0,
+                    "outstanding_tokens": d.outstanding_tokens,
+                    "healthy": d.is_healthy(now),
+                }
+                for d in self.deployments
+            }
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """Whether `error` is a 429 or 5xx that should fail over."""
+    status = getattr(error, "status_code", None)
+    return status == 429 or (status is not None and status >= 500)
+
+
+def get_cooldown(error: Exception) -> float:
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(retry_after) if retry_after else DEFAULT_COOLDOWN_SECONDS
+    except ValueError:
+        return DEFAULT_COOLDOWN_SECONDS
+
+
+def load_pool() -> DeploymentPool:
+    api_key = os.environ.get("AZURE_OPENAI_API_KEY") or os.environ.get(
+        "AZURE_OPENAI_KEY"
+    )
+    api_version = os.environ.get("AZURE_OPENAI_API_VERSION")
+    raw = os.environ.get("AZURE_OPENAI_DEPLOYMENTS")
+    if not raw:
+        return DeploymentPool(
+            [
+                Deployment(
+                    endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
+                    deployment=os.environ["AZURE_OPENAI_DEPLOYMENT_NAME"],
+                    api_key=api_key,
+                    api_version=api_version,
+                )
+            ]
+        )
+    return DeploymentPool(
+        [
+            Deployment(
+                endpoint=entry["endpoint"],
+                deployment=entry["deployment"],
+                api_key=entry.get("api_key", api_key),
+                api_version=entry.get("api_version", api_version),
+                weight=float(entry.get("weight", 1.0)),
+                group=entry.get("group", DEFAULT_GROUP),
+                rpm=entry.get("rpm"),
+                tpm=entry.get("tpm"),
+            )
+            for entry in json.loads(raw)
+        ]
+    )
+
+
+_POOL: Optional[DeploymentPool] = None
+
+
+def get_pool() -> DeploymentPool:
+    global _POOL
+    if _POOL is None:
+        _POOL = load_pool()
+    return _POOL
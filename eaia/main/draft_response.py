@@ -1,5 +1,7 @@
 """Core agent responsible for drafting email."""
 
+import time
+
 from langchain_core.runnables import RunnableConfig
 from langgraph.store.base import BaseStore
 
@@ -14,7 +16,14 @@ from eaia.schemas import (
     email_template,
 )
 from eaia.main.config import get_config
-from eaia.main.azure_config import get_azure_llm
+from eaia.main.preferences import get_preferences
+from eaia.main.cascade import (
+    get_tiers,
+    get_tier_llm,
+    record_call,
+    record_escalation,
+    record_latency,
+)
 
 EMAIL_WRITING_INSTRUCTIONS = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
@@ -75,23 +84,16 @@ Note that you should only call this if working to schedule a meeting - if a meet
 # Background information: information you may find helpful when responding to emails or deciding what to do.
 
 {random_preferences}"""
-draft_prompt = """{instructions}
+draft_system_prompt = """{instructions}
 
-Remember to call a tool correctly! Use the specified names exactly - not add `functions::` to the start. Pass all required arguments.
-
-Here is the email thread. Note that this is the full email thread. Pay special attention to the most recent email.
+Remember to call a tool correctly! Use the specified names exactly - not add `functions::` to the start. Pass all required arguments."""
+draft_prompt = """Here is the email thread. Note that this is the full email thread. Pay special attention to the most recent email.
 
 {email}"""
 
 
 async def draft_response(state: State, config: RunnableConfig, store: BaseStore):
     """Write an email to a customer."""
-    model = config["configurable"].get("model", "gpt-4o")
-    llm = get_azure_llm(
-        temperature=0,
-        model=model,
-        disable_streaming=True,
-    )
     tools = [
         NewEmailDraft,
         ResponseEmailDraft,
@@ -103,40 +105,19 @@ async def draft_response(state: State, config: RunnableConfig, store: BaseStore)
     if len(messages) > 0:
         tools.append(Ignore)
     prompt_config = get_config(config)
-    namespace = (config["configurable"].get("assistant_id", "default"),)
-    key = "schedule_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        schedule_preferences = result.value["data"]
-    else:
-        await store.aput(namespace, key, {"data": prompt_config["schedule_preferences"]})
-        schedule_preferences = prompt_config["schedule_preferences"]
-    key = "random_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        random_preferences = result.value["data"]
-    else:
-        await store.aput(
-            namespace, key, {"data": prompt_config["background_preferences"]}
-        )
-        random_preferences = prompt_config["background_preferences"]
-    key = "response_preferences"
-    result = await store.aget(namespace, key)
-    if result and "data" in result.value:
-        response_preferences = result.value["data"]
-    else:
-        await store.aput(namespace, key, {"data": prompt_config["response_preferences"]})
-        response_preferences = prompt_config["response_preferences"]
+    preferences = await get_preferences(
+        store, config["configurable"].get("assistant_id", "default"), prompt_config
+    )
     _prompt = EMAIL_WRITING_INSTRUCTIONS.format(
-        schedule_preferences=schedule_preferences,
-        random_preferences=random_preferences,
-        response_preferences=response_preferences,
+        schedule_preferences=preferences["schedule_preferences"],
+        random_preferences=preferences["random_preferences"],
+        response_preferences=preferences["response_preferences"],
         name=prompt_config["name"],
         full_name=prompt_config["full_name"],
         background=prompt_config["background"],
     )
+    system_message = draft_system_prompt.format(instructions=_prompt)
     input_message = draft_prompt.format(
-        instructions=_prompt,
         email=email_template.format(
             email_thread=state["email"]["page_content"],
             author=state["email"]["from_email"],
@@ -145,12 +126,26 @@ async def draft_response(state: State, config: RunnableConfig, store: BaseStore)
         ),
     )
 
-    model = llm.bind_tools(tools)
-    messages = [{"role": "user", "content": input_message}] + messages
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": input_message},
+    ] + messages
+    # Malformed tool calls escalate through the cascade tiers; once on the
+    # last tier we keep retrying it.
+    tiers = get_tiers(config, "draft_response")
+    record_call("draft_response")
     i = 0
     while i < 5:
+        tier = tiers[min(i, len(tiers) - 1)]
+        model = get_tier_llm(tier, temperature=0, disable_streaming=True).bind_tools(
+            tools
+        )
+        start = time.perf_counter()
         response = await model.ainvoke(messages)
+        record_latency("draft_response", tier, time.perf_counter() - start)
         if len(response.tool_calls) != 1:
+            if i + 1 < len(tiers):
+                record_escalation("draft_response", tier, "malformed_tool_call")
             i += 1
             messages += [{"role": "user", "content": "Please call a valid tool call."}]
         else:
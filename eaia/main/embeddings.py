@@ -0,0 +1,219 @@
+"""Embedding text and cached embeddings for few-shot triage examples.
+
+`build_embedding_text` renders the compact text an email is embedded by:
+subject, sender domain and the start of its normalized body. The same text
+is used as the few-shot search query at triage time and as the indexed
+field when the example is saved, so with `aembed_texts` as the store's
+embedding function (see `langgraph.json`) each email is embedded once: the
+vector computed for the query is reused from the cache when it is indexed.
+Concurrent misses for the same text share one request.
+
+Cache misses go through `embed_texts`, which packs texts into as few
+requests as the deployment's input limits allow and sends them concurrently
+under the shared rate limiter. Backfills should call it directly with
+`priority=BACKGROUND`.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from email.utils import parseaddr
+
+from eaia import metrics
+from eaia.main.rate_limit import INTERACTIVE, LIMITER
+from eaia.normalize import normalize_body
+from eaia.schemas import EmailData
+from eaia.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BODY_CHARS = 1000
+_MAX_CACHED_EMBEDDINGS = 10_000
+# Per-request input limits of the embedding deployment; Azure accepts up
+# to 2048 inputs per request, the token cap keeps requests well below 429s
+EMBEDDING_BATCH_SIZE = int(os.environ.get("AZURE_OPENAI_EMBEDDING_BATCH_SIZE", 256))
+EMBEDDING_BATCH_TOKENS = int(
+    os.environ.get("AZURE_OPENAI_EMBEDDING_BATCH_TOKENS", 100_000)
+)
+EMBEDDING_CONCURRENCY = int(os.environ.get("AZURE_OPENAI_EMBEDDING_CONCURRENCY", 4))
+
+_lock = threading.Lock()
+_cache: OrderedDict[str, list[float]] = OrderedDict()
+# Requests embedding cache misses, by cache key of each text they embed
+_in_flight: dict[str, asyncio.Task] = {}
+
+
+def sender_address(from_email: str) -> str:
+    return parseaddr(from_email)[1].lower()
+
+
+def sender_domain(from_email: str) -> str:
+    return sender_address(from_email).rpartition("@")[2]
+
+
+def build_embedding_text(email: EmailData) -> str:
+    body = normalize_body(email.get("page_content", ""), max_chars=EMBEDDING_BODY_CHARS)
+    return (
+        f"Subject: {email.get('subject', '')}\n"
+        f"From: {sender_domain(email.get('from_email', ''))}\n\n"
+        f"{body}"
+    )
+
+
+def _cache_key(text: str) -> str:
+    deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", "")
+    return hashlib.sha256(f"{deployment}\n{text}".encode("utf-8")).hexdigest()
+
+
+def get_cached(texts: list[str]) -> list:
+    """Cached vectors for `texts`, None where there is no cache entry."""
+    keys = [_cache_key(t) for t in texts]
+    with _lock:
+        vectors = [_cache.get(k) for k in keys]
+        for k, v in zip(keys, vectors):
+            if v is not None:
+                _cache.move_to_end(k)
+    return vectors
+
+
+def put_cached(texts: list[str], vectors: list[list[float]]) -> None:
+    with _lock:
+        for text, vector in zip(texts, vectors):
+            _cache[_cache_key(text)] = vector
+        while len(_cache) > _MAX_CACHED_EMBEDDINGS:
+            _cache.popitem(last=False)
+
+
+def make_batches(
+    texts: list[str],
+    max_texts: int = EMBEDDING_BATCH_SIZE,
+    max_tokens: int = EMBEDDING_BATCH_TOKENS,
+) -> list[list[str]]:
+    """Group `texts` in order into batches within the request limits."""
+    batches: list[list[str]] = []
+    batch: list[str] = []
+    batch_tokens = 0
+    for text in texts:
+        tokens = estimate_tokens(text)
+        if batch and (len(batch) >= max_texts or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def _deployment_key() -> str:
+    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT", "")
+    deployment = os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT_NAME", "")
+    return f"{endpoint.rstrip('/')}/{deployment}"
+
+
+async def _embed_batch(texts: list[str]) -> list[list[float]]:
+    # Imported lazily so the embedding text helpers work without Azure config
+    from eaia.main.azure_config import get_azure_embeddings
+
+    return await get_azure_embeddings().aembed_documents(texts)
+
+
+async def embed_texts(
+    texts: list[str], priority: int = INTERACTIVE
+) -> list[list[float]]:
+    """Embed `texts` in batched, rate-limited requests, one vector per text.
+
+    Identical texts are only sent once.
+    """
+    unique = list(dict.fromkeys(texts))
+    if not unique:
+        return []
+    semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+    deployment = _deployment_key()
+    vectors: dict[str, list[float]] = {}
+
+    async def run(batch: list[str]) -> None:
+        tokens = sum(estimate_tokens(t) for t in batch)
+        async with semaphore:
+            await LIMITER.acquire(deployment, tokens, priority)
+            start = time.monotonic()
+            result = await _embed_batch(batch)
+            metrics.observe("embedding_batch_latency", time.monotonic() - start)
+        vectors.update(zip(batch, result))
+
+    start = time.monotonic()
+    batches = make_batches(unique)
+    await asyncio.gather(*(run(batch) for batch in batches))
+    elapsed = time.monotonic() - start
+    rate = len(unique) / elapsed if elapsed > 0 else float(len(unique))
+    metrics.incr("embedding_texts", len(unique))
+    metrics.incr("embedding_requests", len(batches))
+    metrics.emit(
+        "embedding_throughput",
+        texts=len(unique),
+        requests=len(batches),
+        seconds=round(elapsed, 3),
+        texts_per_sec=round(rate, 1),
+    )
+    logger.info(
+        f"Embedded {len(unique)} texts in {len(batches)} requests "
+        f"({rate:.1f} texts/sec)"
+    )
+    return [vectors[t] for t in texts]
+
+
+async def _embed_missing(texts: list[str]) -> dict[str, list[float]]:
+    vectors = await embed_texts(texts)
+    put_cached(texts, vectors)
+    return dict(zip(texts, vectors))
+
+
+def _embedded(keys: list[str], task: asyncio.Task) -> None:
+    for key in keys:
+        if _in_flight.get(key) is task:
+            del _in_flight[key]
+    if not task.cancelled():
+        # Raised to the callers awaiting it; retrieved here in case none is left
+        task.exception()
+
+
+async def aembed_texts(texts: list[str]) -> list[list[float]]:
+    """Embed `texts`, reusing cached vectors for content seen before.
+
+    Texts another caller is already embedding wait for that request instead
+    of sending their own.
+    """
+    vectors = get_cached(texts)
+    missing = [t for t, v in zip(texts, vectors) if v is None]
+    metrics.incr("embedding_cache_hits", len(texts) - len(missing))
+    metrics.incr("embedding_cache_misses", len(missing))
+    if not missing:
+        return vectors
+
+    loop = asyncio.get_running_loop()
+    tasks: dict[str, asyncio.Task] = {}
+    new = []
+    for text in dict.fromkeys(missing):
+        task = _in_flight.get(_cache_key(text))
+        if task is not None and task.get_loop() is loop:
+            tasks[text] = task
+        else:
+            new.append(text)
+    if new:
+        task = loop.create_task(_embed_missing(new))
+        keys = [_cache_key(t) for t in new]
+        for text, key in zip(new, keys):
+            _in_flight[key] = task
+            tasks[text] = task
+        task.add_done_callback(lambda t: _embedded(keys, t))
+
+    found: dict[str, list[float]] = {}
+    for task in dict.fromkeys(tasks.values()):
+        # Shielded, so a cancelled caller does not cancel a request that
+        # other callers are waiting for
+        found.update(await asyncio.shield(task))
+    return [found[t] if v is None else v for t, v in zip(texts, vectors)]
@@ -0,0 +1,158 @@
+"""Deduplicated, bounded storage of triage few-shot examples.
+
+Examples are keyed by a hash of their content, so saving the same email
+again (or a copy of it) updates one example instead of adding another, and
+the latest triage label wins. Each assistant keeps at most
+`MAX_TRIAGE_EXAMPLES` examples; past that, near-duplicates are evicted
+first so the few-shots stay diverse, then the oldest examples.
+`scripts/compact_triage_examples.py` applies the same rules to an existing
+store.
+"""
+
+import hashlib
+import os
+import re
+from typing import Iterable, NamedTuple
+
+from langgraph.store.base import BaseStore
+
+from eaia import metrics
+from eaia.main.embeddings import (
+    build_embedding_text,
+    sender_address,
+    sender_domain,
+)
+from eaia.normalize import normalize_body
+from eaia.schemas import EmailData
+
+MAX_TRIAGE_EXAMPLES = int(os.environ.get("EAIA_MAX_TRIAGE_EXAMPLES", 500))
+# Evict once this many examples over the cap, so eviction runs in batches
+EVICTION_SLACK = 25
+# Jaccard similarity of word shingles above which examples are near-duplicates
+NEAR_DUPLICATE_SIMILARITY = 0.8
+_SHINGLE_SIZE = 3
+_LIST_PAGE_SIZE = 100
+
+
+class Example(NamedTuple):
+    key: str
+    text: str
+    updated_at: str
+
+
+def example_key(email: EmailData) -> str:
+    """Content hash of an email, stable across message ids and timestamps."""
+    content = "\n".join(
+        [
+            sender_address(email.get("from_email", "")),
+            email.get("subject", "").strip().lower(),
+            normalize_body(email.get("page_content", "")),
+        ]
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+
+def example_value(email: EmailData, status: str) -> dict:
+    """Stored value of a triage example."""
+    return {
+        "input": email,
+        "triage": status,
+        # Indexed by the same text triage searches with, so its cached
+        # embedding is reused instead of embedding the email again
+        "embedding_text": build_embedding_text(email),
+        # Metadata few-shot retrieval prefilters on
+        "sender": sender_address(email.get("from_email", "")),
+        "sender_domain": sender_domain(email.get("from_email", "")),
+        "list_id": email.get("list_id", ""),
+    }
+
+
+def _shingles(text: str) -> set[tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < _SHINGLE_SIZE:
+        return {tuple(words)}
+    return {
+        tuple(words[i : i + _SHINGLE_SIZE])
+        for i in range(len(words) - _SHINGLE_SIZE + 1)
+    }
+
+
+def _similarity(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def select_evictions(examples: Iterable[Example], cap: int) -> list[str]:
+    """Keys to drop so that at most `cap` examples remain.
+
+    Near-duplicates go first: of the most similar pair, the older example is
+    dropped. Once no pair is above `NEAR_DUPLICATE_SIMILARITY`, the oldest
+    examples are dropped.
+    """
+    # Oldest first, so ties and the fallback both evict older examples
+    remaining = sorted(examples, key=lambda e: e.updated_at)
+    excess = len(remaining) - cap
+    if excess <= 0:
+        return []
+    shingles = {e.key: _shingles(e.text) for e in remaining}
+    # For each example, its most similar newer example
+    nearest: dict[str, float] = {}
+    for i, a in enumerate(remaining):
+        nearest[a.key] = max(
+            (_similarity(shingles[a.key], shingles[b.key]) for b in remaining[i + 1 :]),
+            default=0.0,
+        )
+    duplicates = sorted(
+        (e for e in remaining if nearest[e.key] >= NEAR_DUPLICATE_SIMILARITY),
+        key=lambda e: nearest[e.key],
+        reverse=True,
+    )
+    evicted = [e.key for e in duplicates[:excess]]
+    if len(evicted) < excess:
+        dropped = set(evicted)
+        evicted += [e.key for e in remaining if e.key not in dropped][
+            : excess - len(evicted)
+        ]
+    return evicted
+
+
+def _to_example(key: str, value: dict, updated_at) -> Example:
+    text = value.get("embedding_text") or build_embedding_text(value["input"])
+    return Example(key, text, str(updated_at))
+
+
+async def _list_examples(store: BaseStore, namespace: tuple[str, ...]) -> list[Example]:
+    examples = []
+    while True:
+        page = await store.asearch(
+            namespace, limit=_LIST_PAGE_SIZE, offset=len(examples)
+        )
+        examples.extend(_to_example(i.key, i.value, i.updated_at) for i in page)
+        if len(page) < _LIST_PAGE_SIZE:
+            return examples
+
+
+async def save_example(
+    store: BaseStore,
+    namespace: tuple[str, ...],
+    email: EmailData,
+    status: str,
+    cap: int = MAX_TRIAGE_EXAMPLES,
+) -> str:
+    """Upsert `email` as a triage example and enforce the namespace cap."""
+    key = example_key(email)
+    existing = await store.aget(namespace, key)
+    if existing is not None and existing.value.get("triage") == status:
+        return key
+    await store.aput(
+        namespace, key, example_value(email, status), index=["embedding_text"]
+    )
+    if existing is None:
+        examples = await _list_examples(store, namespace)
+        if len(examples) > cap + EVICTION_SLACK:
+            evicted = select_evictions(examples, cap)
+            for evicted_key in evicted:
+                await store.adelete(namespace, evicted_key)
+            metrics.incr("triage_examples_evicted", len(evicted))
+    return key
@@ -1,8 +1,47 @@
-"""Fetches few shot examples for triage step."""
+"""Fetches few shot examples for triage step.
 
-from langgraph.store.base import BaseStore
+Examples from the same sender are used directly, ranked by BM25, without
+embedding the email. Otherwise candidates come from vector searches over
+the whole namespace and over examples sharing the sender's domain or
+mailing list. Their vector similarity is fused with a BM25 score computed
+locally over the candidates, and anything below `MIN_SIMILARITY` is
+dropped, so fewer examples are shown when good matches are scarce.
+"""
+
+import asyncio
+import math
+import re
+from collections import Counter
+
+from langgraph.store.base import BaseStore, SearchItem
 from eaia.schemas import EmailData
+from eaia.main.embeddings import build_embedding_text, sender_address, sender_domain
+
 
+MAX_EXAMPLES = 5
+CANDIDATES = 20
+# Cosine similarity below which a candidate is not shown
+MIN_SIMILARITY = 0.8
+VECTOR_WEIGHT = 0.7
+# Added to candidates that share the sender's domain or mailing list
+METADATA_BOOST = 0.05
+# Shared by unrelated senders, so not a useful prefilter
+PUBLIC_DOMAINS = {
+    "aol.com",
+    "gmail.com",
+    "gmx.com",
+    "googlemail.com",
+    "hotmail.com",
+    "icloud.com",
+    "live.com",
+    "me.com",
+    "outlook.com",
+    "proton.me",
+    "protonmail.com",
+    "yahoo.com",
+}
+_BM25_K1 = 1.2
+_BM25_B = 0.75
 
 template = """Email Subject: {subject}
 Email From: {from_email}
@@ -29,12 +68,104 @@ def format_similar_examples_store(examples):
     return "\n\n------------\n\n".join(strs)
 
 
+def _tokenize(text: str) -> list[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def bm25_scores(query: str, documents: list[str]) -> list[float]:
+    """BM25 score of each document for `query`, with IDF over `documents`."""
+    docs = [Counter(_tokenize(d)) for d in documents]
+    if not docs:
+        return []
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    scores = [0.0] * len(docs)
+    for term in set(_tokenize(query)):
+        df = sum(1 for d in docs if term in d)
+        if not df:
+            continue
+        idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+        for i, d in enumerate(docs):
+            tf = d[term]
+            if tf:
+                length = sum(d.values())
+                scores[i] += idf * tf * (_BM25_K1 + 1) / (
+                    tf + _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_len)
+                )
+    return scores
+
+
+def _example_text(item: SearchItem) -> str:
+    return item.value.get("embedding_text") or build_embedding_text(
+        item.value["input"]
+    )
+
+
+def _normalized_bm25(query: str, items: list[SearchItem]) -> list[float]:
+    scores = bm25_scores(query, [_example_text(i) for i in items])
+    top = max(scores, default=0.0)
+    return [s / top if top else 0.0 for s in scores]
+
+
+async def retrieve_examples(
+    email: EmailData,
+    store: BaseStore,
+    namespace: tuple[str, ...],
+    max_examples: int = MAX_EXAMPLES,
+    min_similarity: float = MIN_SIMILARITY,
+) -> list[SearchItem]:
+    query = build_embedding_text(email)
+    sender = sender_address(email.get("from_email", ""))
+    if sender:
+        same_sender = await store.asearch(
+            namespace, filter={"sender": sender}, limit=CANDIDATES
+        )
+        if same_sender:
+            ranked = zip(_normalized_bm25(query, same_sender), same_sender)
+            return [
+                item
+                for _, item in sorted(ranked, key=lambda r: r[0], reverse=True)
+            ][:max_examples]
+
+    domain = sender_domain(email.get("from_email", ""))
+    filters = [None]
+    if domain and domain not in PUBLIC_DOMAINS:
+        filters.append({"sender_domain": domain})
+    if email.get("list_id"):
+        filters.append({"list_id": email["list_id"]})
+    # The searches share one embedding request for the query (see
+    # `aembed_texts`)
+    results = await asyncio.gather(
+        *(
+            store.asearch(namespace, query=query, filter=f, limit=CANDIDATES)
+            for f in filters
+        )
+    )
+    candidates: dict[str, SearchItem] = {}
+    matched_metadata: set[str] = set()
+    for f, items in zip(filters, results):
+        for item in items:
+            if item.score is None or item.score < min_similarity:
+                continue
+            candidates[item.key] = item
+            if f is not None:
+                matched_metadata.add(item.key)
+    items = list(candidates.values())
+    fused = [
+        VECTOR_WEIGHT * item.score
+        + (1 - VECTOR_WEIGHT) * lexical
+        + (METADATA_BOOST if item.key in matched_metadata else 0.0)
+        for item, lexical in zip(items, _normalized_bm25(query, items))
+    ]
+    ranked = sorted(zip(fused, items), key=lambda r: r[0], reverse=True)
+    return [item for _, item in ranked][:max_examples]
+
+
 async def get_few_shot_examples(email: EmailData, store: BaseStore, config):
     namespace = (
         config["configurable"].get("assistant_id", "default"),
         "triage_examples",
     )
-    result = await store.asearch(namespace, query=str({"input": email}), limit=5)
-    if result is None:
+    result = await retrieve_examples(email, store, namespace)
+    if not result:
         return ""
     return format_similar_examples_store(result)
@@ -1,23 +1,36 @@
 """Agent responsible for managing calendar and finding meeting time."""
 
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.prebuilt import create_react_agent
 
-from eaia.gmail import get_events_for_days
+from eaia import metrics
 from eaia.schemas import State
 from eaia.main.config import get_config
 from eaia.main.azure_config import get_azure_llm
+from eaia.main.availability import (
+    SEARCH_DAYS,
+    fetch_busy,
+    format_slots,
+    free_slots,
+    get_settings,
+)
 
 meeting_prompts = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
-The below email thread has been flagged as requesting time to meet. Your SOLE purpose is to survey {name}'s calendar and schedule meetings for {name}.
+The below email thread has been flagged as requesting time to meet. Your SOLE purpose is to say when {name} is free to meet.
 
-If the email is suggesting some specific times, then check if {name} is available then.
+These are all of {name}'s free windows for the next {days} days, up to and including {last_day}, in {tz}. They already take working hours, minimum meeting length and travel time into account:
 
-If the emails asks for time, use the tool to find valid times to meet (always suggest them in {tz}).
+<free_windows>
+{free_windows}
+</free_windows>
+
+If the email is suggesting some specific times, then check if they fall within one of these windows. You do not know {name}'s calendar after {last_day}: for times after that, say that {name} still needs to check, never that {name} is free or busy.
+
+If the emails asks for time, suggest windows from the list (always in {tz}).
 
 If they express preferences in their email thread, try to abide by those. Do not suggest times they have already said won't work.
 
@@ -36,8 +49,6 @@ NOT
 2:30-3pm
 ```
 
-Do not send time slots less than 15 minutes in length.
-
 Your response should be extremely high density. You should not respond directly to the email, but rather just say factually whether {name} is free, and what time slots. Do not give any extra commentary. Examples of good responses include:
 
 <examples>
@@ -63,18 +74,42 @@ Subject: {subject}
 
 
 async def find_meeting_time(state: State, config: RunnableConfig):
-    """Write an email to a customer."""
+    """Work out when the user is free from their calendar, with at most one LLM call."""
+    prompt_config = get_config(config)
+    settings = get_settings(prompt_config)
+    now = datetime.now(settings.tz)
+    prefetched = (state.get("prefetched") or {}).get("busy")
+    if prefetched and prefetched["day"] == now.date().isoformat():
+        busy = [
+            (datetime.fromisoformat(s), datetime.fromisoformat(e))
+            for s, e in prefetched["intervals"]
+        ]
+    else:
+        busy = await asyncio.to_thread(fetch_busy, prompt_config, now.date())
+    end = now + timedelta(days=SEARCH_DAYS)
+    slots = free_slots(busy, now, end, settings)
+
+    tool_call = state["messages"][-1].tool_calls[0]
+    if not slots:
+        # Nothing to reason about, so no LLM call
+        metrics.incr("meeting_time_answers", source="calendar")
+        content = (
+            f"{prompt_config['name']} has no free slots of at least "
+            f"{int(settings.min_length.total_seconds() // 60)} minutes "
+            f"in the next {SEARCH_DAYS} days."
+        )
+        return {"messages": [ToolMessage(content=content, tool_call_id=tool_call["id"])]}
+
     model = config["configurable"].get("model", "gpt-4o")
     llm = get_azure_llm(temperature=0, model=model)
-    agent = create_react_agent(llm, [get_events_for_days])
-    current_date = datetime.now()
-    prompt_config = get_config(config)
-    calendar_name = prompt_config.get("calendar_name", "primary")
     input_message = meeting_prompts.format(
+        free_windows=format_slots(slots, settings.tz),
+        days=SEARCH_DAYS,
+        last_day=end.strftime("%A %B %d, %Y"),
         email_thread=state["email"]["page_content"],
         author=state["email"]["from_email"],
         subject=state["email"]["subject"],
-        current_date=current_date.strftime("%A %B %d, %Y"),
+        current_date=now.strftime("%A %B %d, %Y"),
         name=prompt_config["name"],
         full_name=prompt_config["full_name"],
         tz=prompt_config["timezone"],
@@ -82,18 +117,8 @@ async def find_meeting_time(state: State, config: RunnableConfig):
     messages = state.get("messages") or []
     # we do this because theres currently a tool call just for routing
     messages = messages[:-1]
-    result = await agent.ainvoke(
-        {
-            "messages": [{"role": "user", "content": input_message}] + messages,
-            "calendar_name": calendar_name,
-        }
-    )
-    prediction = state["messages"][-1]
-    tool_call = prediction.tool_calls[0]
+    result = await llm.ainvoke([{"role": "user", "content": input_message}] + messages)
+    metrics.incr("meeting_time_answers", source="llm")
     return {
-        "messages": [
-            ToolMessage(
-                content=result["messages"][-1].content, tool_call_id=tool_call["id"]
-            )
-        ]
+        "messages": [ToolMessage(content=result.content, tool_call_id=tool_call["id"])]
     }
@@ -1,4 +1,5 @@
 """Overall agent."""
+import asyncio
 import json
 from typing import TypedDict, Literal
 from langgraph.graph import END, StateGraph
@@ -14,7 +15,7 @@ load_dotenv()
 from eaia.main.draft_response import draft_response
 from eaia.main.find_meeting_time import find_meeting_time
 from eaia.main.rewrite import rewrite
-from eaia.main.config import get_config
+from eaia.main.config import get_config, load_file_config
 from langchain_core.messages import ToolMessage
 from eaia.main.human_inbox import (
     send_message,
@@ -31,10 +32,25 @@ from eaia.schemas import (
     State,
 )
 
+# Fail at startup rather than mid-run if config.yaml is invalid
+load_file_config()
+
 
 def route_after_triage(
     state: State,
-) -> Literal["draft_response", "mark_as_read_node", "notify"]:
+) -> Literal[
+    "draft_response",
+    "mark_as_read_node",
+    "notify",
+    "send_message",
+    "rewrite",
+    "find_meeting_time",
+    "send_cal_invite",
+    "bad_tool_name",
+]:
+    if state["triage"].response in ("email", "question") and state.get("messages"):
+        # Triage committed a speculative draft, act on it directly
+        return take_action(state)
     if state["triage"].response == "email":
         return "draft_response"
     elif state["triage"].response == "no":
@@ -117,12 +133,13 @@ def enter_after_human(
                 raise ValueError
 
 
-def send_cal_invite_node(state, config):
+async def send_cal_invite_node(state, config):
     tool_call = state["messages"][-1].tool_calls[0]
     _args = tool_call["args"]
     email = get_config(config)["email"]
     try:
-        send_calendar_invite(
+        await asyncio.to_thread(
+            send_calendar_invite,
             _args["emails"],
             _args["title"],
             _args["start_time"],
@@ -135,14 +152,15 @@ def send_cal_invite_node(state, config):
     return {"messages": [ToolMessage(content=message, tool_call_id=tool_call["id"])]}
 
 
-def send_email_node(state, config):
+async def send_email_node(state, config):
     tool_call = state["messages"][-1].tool_calls[0]
     _args = tool_call["args"]
     email = get_config(config)["email"]
     new_receipients = _args["new_recipients"]
     if isinstance(new_receipients, str):
         new_receipients = json.loads(new_receipients)
-    send_email(
+    await asyncio.to_thread(
+        send_email,
         state["email"]["id"],
         _args["content"],
         email,
@@ -150,8 +168,9 @@ def send_email_node(state, config):
     )
 
 
-def mark_as_read_node(state):
-    mark_as_read(state["email"]["id"])
+async def mark_as_read_node(state):
+    emails = [state["email"]] + (state.get("duplicates") or [])
+    await asyncio.gather(*(asyncio.to_thread(mark_as_read, e["id"]) for e in emails))
 
 
 def human_node(state: State):
@@ -161,6 +180,8 @@ def human_node(state: State):
 class ConfigSchema(TypedDict):
     db_id: int
     model: str
+    cascade: dict
+    speculative_drafting: dict
 
 
 graph_builder = StateGraph(State, config_schema=ConfigSchema)
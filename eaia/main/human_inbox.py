@@ -9,6 +9,8 @@ from langgraph.store.base import BaseStore
 from typing import TypedDict, Literal, Union, Optional
 from langgraph_sdk import get_client
 from eaia.main.config import get_config
+from eaia.main.examples import save_example
+from eaia.main.reputation import record_decision
 
 LGC = get_client()
 
@@ -47,15 +49,32 @@ TEMPLATE = """# {subject}
 """
 
 
+DUPLICATES_TEMPLATE = """
+**{count} near-identical emails** were handled with this one:
+
+{emails}
+"""
+
+
 def _generate_email_markdown(state: State):
     contents = state["email"]
-    return TEMPLATE.format(
+    markdown = TEMPLATE.format(
         subject=contents["subject"],
         url=f"https://mail.google.com/mail/u/0/#inbox/{contents['id']}",
         to=contents["to_email"],
         _from=contents["from_email"],
         page_content=contents["page_content"],
     )
+    if duplicates := state.get("duplicates"):
+        markdown += DUPLICATES_TEMPLATE.format(
+            count=len(duplicates),
+            emails="\n".join(
+                f"- {d['from_email']}: [{d['subject']}]"
+                f"(https://mail.google.com/mail/u/0/#inbox/{d['id']})"
+                for d in duplicates
+            ),
+        )
+    return markdown
 
 
 async def save_email(state: State, config, store: BaseStore, status: str):
@@ -63,11 +82,15 @@ async def save_email(state: State, config, store: BaseStore, status: str):
         config["configurable"].get("assistant_id", "default"),
         "triage_examples",
     )
-    key = state["email"]["id"]
-    response = await store.aget(namespace, key)
-    if response is None:
-        data = {"input": state["email"], "triage": status}
-        await store.aput(namespace, str(uuid.uuid4()), data)
+    await save_example(store, namespace, state["email"], status)
+    await record_decision(
+        store,
+        namespace[0],
+        state["email"]["from_email"],
+        state["email"]["id"],
+        status,
+        "user",
+    )
 
 
 @traceable
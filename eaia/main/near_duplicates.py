@@ -0,0 +1,228 @@
+"""Near-duplicate detection for bulk and automated emails, using MinHash LSH.
+
+Each email body gets a MinHash signature over word shingles. Signatures
+are split into `BANDS` bands, and two emails sharing any band are checked
+against `DUPLICATE_SIMILARITY` on the full signature, so lookups never
+scan all recent emails.
+
+Two levels use this:
+
+- Ingest (`eaia.cron_graph`) groups near-identical emails fetched in the
+  same batch with `LSHIndex` and starts one run per group; the other
+  members travel in the run's `duplicates` and share its outcome. Only
+  emails from the same sender in the same Gmail thread are grouped, since
+  a reply drafted in one thread would not reach the others.
+- `triage_input` keeps clusters of recently triaged emails in the store
+  (`find_cluster` / `record_cluster`), so a near-duplicate of an email
+  triaged in an earlier batch or another thread reuses its decision.
+  Clusters and their band keys older than `CLUSTER_TTL` are deleted by
+  `prune_clusters`, which `record_cluster` runs at most once every
+  `PRUNE_INTERVAL`.
+"""
+
+import hashlib
+import re
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+from langgraph.store.base import BaseStore, GetOp, PutOp
+
+from eaia import metrics
+from eaia.main.embeddings import sender_address
+
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+# Estimated Jaccard similarity above which emails are near-duplicates
+DUPLICATE_SIMILARITY = 0.8
+# How long a triaged cluster is reused for
+CLUSTER_TTL = timedelta(days=7)
+# How often expired clusters are pruned from the store
+PRUNE_INTERVAL = timedelta(days=1)
+_PRUNED_KEY = "pruned"
+_PRUNE_PAGE_SIZE = 500
+# Decisions that can be reused; `question` depends on the email itself
+REUSABLE_DECISIONS = {"no", "email", "notify"}
+# Shorter bodies ("Thanks!", "Sounds good") are alike without being bulk mail
+MIN_WORDS = 20
+_SHINGLE_SIZE = 3
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(seed=1)
+_A = _rng.integers(1, _PRIME, size=NUM_PERM, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, size=NUM_PERM, dtype=np.int64)
+
+
+def _minhash(words: list[str]) -> list[int]:
+    shingles = {
+        " ".join(words[i : i + _SHINGLE_SIZE])
+        for i in range(max(len(words) - _SHINGLE_SIZE + 1, 1))
+    }
+    hashes = np.array(
+        [zlib.crc32(s.encode("utf-8")) & _PRIME for s in shingles], dtype=np.int64
+    )
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME
+    return permuted.min(axis=1).tolist()
+
+
+def minhash_signature(text: str) -> Optional[list[int]]:
+    """Signature of a normalized body, None if it is too short to compare."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+    return _minhash(words)
+
+
+def estimate_similarity(a: list[int], b: list[int]) -> float:
+    return sum(x == y for x, y in zip(a, b)) / NUM_PERM
+
+
+def band_keys(signature: list[int]) -> list[str]:
+    keys = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS : (band + 1) * ROWS]
+        digest = hashlib.blake2b(repr(rows).encode(), digest_size=8).hexdigest()
+        keys.append(f"band:{band}:{digest}")
+    return keys
+
+
+class LSHIndex:
+    """In-memory LSH index of signatures, for grouping one ingest batch."""
+
+    def __init__(self):
+        self._buckets: dict[str, list[str]] = {}
+        self._signatures: dict[str, list[int]] = {}
+
+    def query(self, signature: list[int]) -> Optional[str]:
+        """Most similar indexed key at or above `DUPLICATE_SIMILARITY`."""
+        candidates = {
+            key for band in band_keys(signature) for key in self._buckets.get(band, [])
+        }
+        scored = [
+            (estimate_similarity(signature, self._signatures[key]), key)
+            for key in candidates
+        ]
+        best = max(scored, default=(0.0, None))
+        return best[1] if best[0] >= DUPLICATE_SIMILARITY else None
+
+    def add(self, key: str, signature: list[int]) -> None:
+        self._signatures[key] = signature
+        for band in band_keys(signature):
+            self._buckets.setdefault(band, []).append(key)
+
+
+def group_near_duplicates(emails: list[dict]) -> list[list[dict]]:
+    """Group near-duplicates from one sender in one thread, keeping input order."""
+    indexes: dict[tuple[str, str], LSHIndex] = {}
+    groups: dict[str, list[dict]] = {}
+    for email in emails:
+        signature = minhash_signature(email["page_content"])
+        if signature is None:
+            groups[email["id"]] = [email]
+            continue
+        thread = (email["thread_id"], sender_address(email["from_email"]))
+        index = indexes.setdefault(thread, LSHIndex())
+        representative = index.query(signature)
+        if representative is None:
+            index.add(email["id"], signature)
+            groups[email["id"]] = [email]
+        else:
+            groups[representative].append(email)
+    return list(groups.values())
+
+
+def _namespace(assistant_id: str) -> tuple[str, ...]:
+    return (assistant_id, "near_duplicates")
+
+
+async def find_cluster(
+    store: BaseStore, assistant_id: str, signature: list[int]
+) -> Optional[dict]:
+    """Recent triaged cluster the signature belongs to, if any."""
+    namespace = _namespace(assistant_id)
+    bands = await store.abatch([GetOp(namespace, key) for key in band_keys(signature)])
+    cluster_ids = list({band.value["cluster"] for band in bands if band})
+    if not cluster_ids:
+        return None
+    clusters = await store.abatch(
+        [GetOp(namespace, f"cluster:{cid}") for cid in cluster_ids]
+    )
+    cutoff = datetime.now(timezone.utc) - CLUSTER_TTL
+    best, best_similarity = None, DUPLICATE_SIMILARITY
+    for cluster in clusters:
+        if cluster is None or cluster.updated_at < cutoff:
+            continue
+        similarity = estimate_similarity(signature, cluster.value["signature"])
+        if similarity >= best_similarity:
+            best, best_similarity = cluster.value, similarity
+    return best
+
+
+async def record_cluster(
+    store: BaseStore,
+    assistant_id: str,
+    cluster_id: str,
+    signature: list[int],
+    decision: str,
+    size: int = 1,
+) -> None:
+    """Store a triaged email (and its batch duplicates) as a new cluster."""
+    namespace = _namespace(assistant_id)
+    cluster = {
+        "id": cluster_id,
+        "signature": signature,
+        "decision": decision,
+        "size": size,
+    }
+    await store.abatch(
+        [PutOp(namespace, f"cluster:{cluster_id}", cluster, index=False)]
+        + [
+            PutOp(namespace, key, {"cluster": cluster_id}, index=False)
+            for key in band_keys(signature)
+        ]
+    )
+    pruned = await store.aget(namespace, _PRUNED_KEY)
+    if pruned is None or pruned.updated_at < datetime.now(timezone.utc) - PRUNE_INTERVAL:
+        await prune_clusters(store, assistant_id)
+
+
+async def prune_clusters(store: BaseStore, assistant_id: str) -> int:
+    """Delete clusters and band keys older than `CLUSTER_TTL`."""
+    namespace = _namespace(assistant_id)
+    cutoff = datetime.now(timezone.utc) - CLUSTER_TTL
+    expired, offset = [], 0
+    while True:
+        page = await store.asearch(namespace, limit=_PRUNE_PAGE_SIZE, offset=offset)
+        expired.extend(
+            item.key
+            for item in page
+            if item.key != _PRUNED_KEY and item.updated_at < cutoff
+        )
+        offset += len(page)
+        if len(page) < _PRUNE_PAGE_SIZE:
+            break
+    await store.abatch(
+        [PutOp(namespace, key, None) for key in expired]
+        + [
+            PutOp(
+                namespace,
+                _PRUNED_KEY,
+                {"at": datetime.now(timezone.utc).isoformat()},
+                index=False,
+            )
+        ]
+    )
+    metrics.incr("near_duplicate_keys_pruned", len(expired))
+    return len(expired)
+
+
+async def add_to_cluster(
+    store: BaseStore, assistant_id: str, cluster: dict, count: int = 1
+) -> None:
+    """Count emails that reused the cluster's decision."""
+    cluster = {**cluster, "size": cluster.get("size", 1) + count}
+    await store.aput(
+        _namespace(assistant_id), f"cluster:{cluster['id']}", cluster, index=False
+    )
+    metrics.incr("triage_duplicate_shortcuts", count, decision=cluster["decision"])
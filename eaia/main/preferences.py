@@ -0,0 +1,98 @@
+"""Learned prompt memories for an assistant, loaded in one batch and cached in process.
+
+`draft_response` and `rewrite` read these on every run. All of an
+assistant's memories are fetched with a single batched store call and kept
+in memory until the reflection graph writes a new version (see
+`bump_version`) or, for writes made elsewhere (scripts, rollbacks, other
+workers), until `EAIA_PREFERENCES_CACHE_SECONDS` have passed. Missing
+memories fall back to the config defaults without writing anything; seeding
+the store is done once, with `seed_preferences` or
+`scripts/seed_preferences.py`.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from langgraph.store.base import BaseStore, GetOp, PutOp
+
+# Store key -> config key holding its default
+PREFERENCE_DEFAULTS = {
+    "schedule_preferences": "schedule_preferences",
+    "random_preferences": "background_preferences",
+    "response_preferences": "response_preferences",
+    "rewrite_instructions": "rewrite_preferences",
+}
+
+CACHE_SECONDS = float(os.environ.get("EAIA_PREFERENCES_CACHE_SECONDS", 60))
+
+_lock = threading.Lock()
+_versions: dict[str, int] = {}
+# assistant_id -> (version, fetched at, stored values or None when missing)
+_cache: dict[str, tuple[int, float, dict[str, Optional[str]]]] = {}
+
+
+def bump_version(assistant_id: str) -> None:
+    """Invalidate the cached memories of `assistant_id` after a write."""
+    with _lock:
+        _versions[assistant_id] = _versions.get(assistant_id, 0) + 1
+
+
+async def _load(store: BaseStore, assistant_id: str) -> dict[str, Optional[str]]:
+    with _lock:
+        version = _versions.get(assistant_id, 0)
+        cached = _cache.get(assistant_id)
+    if (
+        cached
+        and cached[0] == version
+        and time.monotonic() - cached[1] < CACHE_SECONDS
+    ):
+        return cached[2]
+    fetched_at = time.monotonic()
+    namespace = (assistant_id,)
+    results = await store.abatch(
+        [GetOp(namespace, key) for key in PREFERENCE_DEFAULTS]
+    )
+    stored = {
+        key: item.value["data"] if item and "data" in item.value else None
+        for key, item in zip(PREFERENCE_DEFAULTS, results)
+    }
+    with _lock:
+        # Tagged with the version read before the fetch, so a concurrent
+        # write leaves this entry stale and it is fetched again next time
+        _cache[assistant_id] = (version, fetched_at, stored)
+    return stored
+
+
+async def get_preferences(
+    store: BaseStore, assistant_id: str, prompt_config: dict
+) -> dict[str, str]:
+    """Return every prompt memory of `assistant_id`, keyed by store key."""
+    stored = await _load(store, assistant_id)
+    return {
+        key: stored[key] if stored[key] is not None else prompt_config[default_key]
+        for key, default_key in PREFERENCE_DEFAULTS.items()
+    }
+
+
+async def seed_preferences(
+    store: BaseStore, assistant_id: str, prompt_config: dict
+) -> list[str]:
+    """Write config defaults for any missing memories. Returns the seeded keys."""
+    stored = await _load(store, assistant_id)
+    missing = [key for key, value in stored.items() if value is None]
+    if missing:
+        await store.abatch(
+            [
+                PutOp(
+                    (assistant_id,),
+                    key,
+                    {"data": prompt_config[PREFERENCE_DEFAULTS[key]]},
+                    index=False,
+                )
+                for key in missing
+            ]
+        )
+        bump_version(assistant_id)
+    return missing
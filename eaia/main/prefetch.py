@@ -0,0 +1,138 @@
+"""Concurrent loading of what a triaged email will need.
+
+Once the sender-history and near-duplicate shortcuts have missed and
+`triage_input` is going to call the LLM, `start_prefetch` starts few-shot
+retrieval, the learned preferences and, for emails about scheduling, the
+calendar's busy intervals at once. Triage awaits only the few-shot
+examples; the rest load while the triage LLM call runs and `collect` puts
+them in `state["prefetched"]`. Nodes fall back to loading themselves when
+something is missing, e.g. after a failed fetch. Shortcut runs load
+nothing, so they stay free of embedding and Calendar API calls.
+
+Preferences are only loaded to warm their in-process cache (see
+`eaia.main.preferences`), so a run resumed days later after a human
+interrupt still sees the latest learned prompts.
+"""
+
+import asyncio
+import logging
+import re
+import time
+from datetime import datetime
+
+import pytz
+from langchain_core.runnables import RunnableConfig
+from langgraph.store.base import BaseStore
+
+from eaia import metrics
+from eaia.main.availability import fetch_busy
+from eaia.main.config import get_config
+from eaia.main.fewshot import get_few_shot_examples
+from eaia.main.preferences import get_preferences
+from eaia.schemas import EmailData, State
+
+logger = logging.getLogger(__name__)
+
+# Words like "free", "call" or "available" alone appear in most emails, so
+# they only count in phrases that ask for a time
+SCHEDULING_PATTERN = re.compile(
+    r"\b(meet|meeting|schedule|reschedule|availability|calendar|invite|"
+    r"appointment)\b|"
+    r"\b(are you|is \w+|be|you're) (free|available)\b|"
+    r"\b(free|available) (on|at|next|this|tomorrow|later)\b|"
+    r"\b(a|quick|short|phone|video) call\b|"
+    r"\bcall (on|at|next|this|tomorrow)\b",
+    re.IGNORECASE,
+)
+
+
+def mentions_scheduling(email: EmailData) -> bool:
+    return bool(
+        SCHEDULING_PATTERN.search(email["subject"])
+        or SCHEDULING_PATTERN.search(email["page_content"])
+    )
+
+
+async def _timed(name: str, load) -> tuple[object, float]:
+    """Result (or raised exception) of `load()` and how long it took."""
+    start = time.perf_counter()
+    try:
+        result = await load()
+    except Exception as e:
+        result = e
+    elapsed = time.perf_counter() - start
+    metrics.observe("prefetch", elapsed, task=name)
+    return result, elapsed
+
+
+async def _busy(prompt_config) -> dict:
+    today = datetime.now(pytz.timezone(prompt_config["timezone"])).date()
+    intervals = await asyncio.to_thread(fetch_busy, prompt_config, today)
+    # Kept in state, so stored as ISO strings
+    return {
+        "day": today.isoformat(),
+        "intervals": [[s.isoformat(), e.isoformat()] for s, e in intervals],
+    }
+
+
+def start_prefetch(
+    state: State, config: RunnableConfig, store: BaseStore
+) -> dict[str, asyncio.Task]:
+    """Start every load the run is likely to need, as tasks keyed by name."""
+    prompt_config = get_config(config)
+    assistant_id = config["configurable"].get("assistant_id", "default")
+    # Coroutines are created inside the tasks, so cancelling a task that
+    # has not started yet leaves no coroutine unawaited
+    loads = {
+        "few_shot_examples": lambda: get_few_shot_examples(
+            state["email"], store, config
+        ),
+        "preferences": lambda: get_preferences(store, assistant_id, prompt_config),
+    }
+    if mentions_scheduling(state["email"]):
+        loads["busy"] = lambda: _busy(prompt_config)
+    return {
+        name: asyncio.create_task(_timed(name, load)) for name, load in loads.items()
+    }
+
+
+async def get_loaded(tasks: dict[str, asyncio.Task], name: str):
+    """Result of one load, None if it failed."""
+    result, _ = await tasks[name]
+    if isinstance(result, Exception):
+        logger.warning(f"Prefetching {name} failed: {result}")
+        return None
+    return result
+
+
+def cancel(tasks: dict[str, asyncio.Task]) -> None:
+    for task in tasks.values():
+        task.cancel()
+
+
+async def collect(tasks: dict[str, asyncio.Task], need_busy: bool) -> dict:
+    """Wait for the loads and return what to keep in `state["prefetched"]`.
+
+    The calendar is only needed when triage decided to draft a reply.
+    """
+    tasks = dict(tasks)
+    if not need_busy and "busy" in tasks:
+        tasks.pop("busy").cancel()
+    start = time.perf_counter()
+    results = dict(zip(tasks, await asyncio.gather(*tasks.values())))
+    waited = time.perf_counter() - start
+    # Triage waited for the few-shot examples; everything else loaded
+    # while it ran instead of in the nodes that use it, except for what
+    # is still left to wait for now
+    loaded = sum(d for name, (_, d) in results.items() if name != "few_shot_examples")
+    metrics.observe("prefetch_saved", max(loaded - waited, 0.0))
+
+    prefetched = {}
+    for name, (result, _) in results.items():
+        if name == "few_shot_examples":
+            continue
+        if isinstance(result, Exception):
+            logger.warning(f"Prefetching {name} failed: {result}")
+        elif name == "busy":
+            prefetched[name] = result
+    return prefetched
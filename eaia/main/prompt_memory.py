@@ -0,0 +1,356 @@
+"""Versioned prompt memories with compare-and-swap updates and history.
+
+Each learned prompt is stored as `{"data": text, "version": n}` under the
+assistant's namespace. `compare_and_set` only writes if the stored version
+is still the one the caller read, and `update_prompt` wraps a (slow)
+rewrite of the prompt in a CAS loop: when another reflection wrote the
+prompt in the meantime, both edits are combined with a line-based
+three-way merge, and if they touch the same lines the rewrite is redone on
+top of the newer text.
+
+The store has no native CAS, so the read-compare-write is serialized with a
+per-prompt lock. That makes it atomic for every writer in this process,
+which is where all reflections run.
+
+Every write also records a revision in `(assistant_key, "prompt_history",
+key)`: a line diff against the previous version plus its provenance (what
+produced it), with a full snapshot every `SNAPSHOT_EVERY` versions.
+`get_prompt_at` rebuilds any version from these and `rollback_prompt`
+restores one as a new version.
+"""
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from langgraph.store.base import BaseStore, GetOp, PutOp
+
+from eaia import metrics
+from eaia.main.preferences import bump_version
+from eaia.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MAX_UPDATE_ATTEMPTS = 3
+SNAPSHOT_EVERY = 10
+# Prompts over this many tokens are condensed after being updated
+PROMPT_TOKEN_BUDGET = int(os.environ.get("EAIA_PROMPT_TOKEN_BUDGET", 1500))
+
+_locks: dict[tuple[str, str], asyncio.Lock] = {}
+
+
+class PromptRecord(NamedTuple):
+    text: str
+    # None when the prompt has never been stored
+    version: Optional[int]
+
+
+class VersionConflict(Exception):
+    def __init__(self, current: PromptRecord):
+        super().__init__(f"Prompt was updated to version {current.version}")
+        self.current = current
+
+
+def _lock(assistant_key: str, key: str) -> asyncio.Lock:
+    return _locks.setdefault((assistant_key, key), asyncio.Lock())
+
+
+def history_namespace(assistant_key: str, key: str) -> tuple[str, ...]:
+    return (assistant_key, "prompt_history", key)
+
+
+def revision_key(version: int) -> str:
+    # Zero-padded so revisions sort by version
+    return f"{version:08d}"
+
+
+def make_diff(old: str, new: str) -> list:
+    """Compact line diff: ["=", n] keeps, ["-", n] drops, ["+", lines] adds."""
+    old_lines, new_lines = old.splitlines(), new.splitlines()
+    diff = []
+    matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            diff.append(["=", i2 - i1])
+            continue
+        if i2 > i1:
+            diff.append(["-", i2 - i1])
+        if j2 > j1:
+            diff.append(["+", new_lines[j1:j2]])
+    return diff
+
+
+def apply_diff(old: str, diff: list) -> str:
+    old_lines = old.splitlines()
+    lines: list[str] = []
+    position = 0
+    for op, arg in diff:
+        if op == "=":
+            lines.extend(old_lines[position : position + arg])
+            position += arg
+        elif op == "-":
+            position += arg
+        else:
+            lines.extend(arg)
+    return "\n".join(lines)
+
+
+def rebuild(revisions: list[dict], version: int) -> str:
+    """Text at `version` from consecutive revisions starting at a snapshot."""
+    text = None
+    for revision in sorted(revisions, key=lambda r: r["version"]):
+        if revision["version"] > version:
+            break
+        if "snapshot" in revision:
+            text = revision["snapshot"]
+        elif text is not None:
+            text = apply_diff(text, revision["diff"])
+    if text is None:
+        raise ValueError(f"No snapshot to rebuild version {version} from")
+    return text
+
+
+async def get_prompt(
+    store: BaseStore, assistant_key: str, key: str, default: str
+) -> PromptRecord:
+    item = await store.aget((assistant_key,), key)
+    if item is None or "data" not in item.value:
+        return PromptRecord(default, None)
+    return PromptRecord(item.value["data"], item.value.get("version", 0))
+
+
+async def compare_and_set(
+    store: BaseStore,
+    assistant_key: str,
+    key: str,
+    expected_version: Optional[int],
+    text: str,
+    provenance: Optional[dict] = None,
+) -> PromptRecord:
+    """Write `text` if the stored version is `expected_version`.
+
+    Raises `VersionConflict` with the stored record otherwise. `provenance`
+    is kept with the revision, e.g. `{"source": "reflection"}`.
+    """
+    history = history_namespace(assistant_key, key)
+    async with _lock(assistant_key, key):
+        current = await get_prompt(store, assistant_key, key, "")
+        if current.version != expected_version:
+            metrics.incr("prompt_write_conflicts", key=key)
+            raise VersionConflict(current)
+        version = (expected_version or 0) + 1
+        revision = {
+            "version": version,
+            "tokens": estimate_tokens(text),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **(provenance or {}),
+        }
+        previous = None
+        if current.version:
+            previous = await store.aget(history, revision_key(current.version))
+        if previous is None or version % SNAPSHOT_EVERY == 0:
+            # Also the start of history for prompts written before it existed
+            revision["snapshot"] = text
+        else:
+            revision["diff"] = make_diff(current.text, text)
+        await store.abatch(
+            [
+                PutOp(
+                    (assistant_key,),
+                    key,
+                    {"data": text, "version": version},
+                    index=False,
+                ),
+                PutOp(history, revision_key(version), revision, index=False),
+            ]
+        )
+    bump_version(assistant_key)
+    return PromptRecord(text, version)
+
+
+async def get_history(
+    store: BaseStore, assistant_key: str, key: str, limit: int = 100
+) -> list[dict]:
+    """Most recent revisions of a prompt, newest first."""
+    current = await get_prompt(store, assistant_key, key, "")
+    latest = current.version or 0
+    items = await store.abatch(
+        [
+            GetOp(history_namespace(assistant_key, key), revision_key(v))
+            for v in range(latest, max(latest - limit, 0), -1)
+        ]
+    )
+    return [item.value for item in items if item is not None]
+
+
+async def get_prompt_at(
+    store: BaseStore, assistant_key: str, key: str, version: int
+) -> str:
+    """Text of a prompt as of `version`."""
+    start = max(version - version % SNAPSHOT_EVERY, 1)
+    items = await store.abatch(
+        [
+            GetOp(history_namespace(assistant_key, key), revision_key(v))
+            for v in range(start, version + 1)
+        ]
+    )
+    revisions = [item.value for item in items if item is not None]
+    # The nearest snapshot can be further back if history started mid-cycle
+    while not any("snapshot" in r for r in revisions) and start > 1:
+        end, start = start, max(start - SNAPSHOT_EVERY, 1)
+        items = await store.abatch(
+            [
+                GetOp(history_namespace(assistant_key, key), revision_key(v))
+                for v in range(start, end)
+            ]
+        )
+        revisions += [item.value for item in items if item is not None]
+    return rebuild(revisions, version)
+
+
+async def rollback_prompt(
+    store: BaseStore,
+    assistant_key: str,
+    key: str,
+    version: int,
+    expected_version: Optional[int] = None,
+) -> PromptRecord:
+    """Restore the text of `version` as a new version.
+
+    With `expected_version`, raises `VersionConflict` if the prompt has
+    moved on since the caller looked at its history.
+    """
+    text = await get_prompt_at(store, assistant_key, key, version)
+    if expected_version is None:
+        expected_version = (await get_prompt(store, assistant_key, key, "")).version
+    return await compare_and_set(
+        store,
+        assistant_key,
+        key,
+        expected_version,
+        text,
+        {"source": "rollback", "restored_version": version},
+    )
+
+
+def _hunks(base: list[str], other: list[str]) -> list[tuple[int, int, list[str]]]:
+    matcher = SequenceMatcher(None, base, other, autojunk=False)
+    return [
+        (i1, i2, other[j1:j2])
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != "equal"
+    ]
+
+
+def _overlaps(a: tuple, b: tuple) -> bool:
+    (a1, a2, _), (b1, b2, _) = a, b
+    if a1 == a2 and b1 == b2:
+        # Two insertions conflict only at the same position
+        return a1 == b1
+    return a1 < b2 and b1 < a2 or a1 == b1
+
+
+def merge3(base: str, ours: str, theirs: str) -> Optional[str]:
+    """Line-based three-way merge, None if both sides changed the same lines."""
+    if ours == theirs or theirs == base:
+        return ours
+    if ours == base:
+        return theirs
+    base_lines = base.splitlines()
+    hunks = sorted(
+        _hunks(base_lines, ours.splitlines()) + _hunks(base_lines, theirs.splitlines()),
+        key=lambda h: (h[0], h[1]),
+    )
+    merged: list[str] = []
+    position = 0
+    previous = None
+    for hunk in hunks:
+        if previous is not None and _overlaps(previous, hunk):
+            if hunk == previous:
+                # Both sides made the same change
+                continue
+            return None
+        start, end, lines = hunk
+        merged.extend(base_lines[position:start])
+        merged.extend(lines)
+        position = max(position, end)
+        # Compare later hunks with the one reaching furthest into the base
+        if previous is None or end >= previous[1]:
+            previous = hunk
+    merged.extend(base_lines[position:])
+    return "\n".join(merged)
+
+
+async def update_prompt(
+    store: BaseStore,
+    assistant_key: str,
+    key: str,
+    default: str,
+    rewrite: Callable[[str], Awaitable[Optional[str]]],
+    provenance: Optional[dict] = None,
+) -> Optional[PromptRecord]:
+    """Replace a prompt with `rewrite(current_text)`, safe against concurrent updates.
+
+    `rewrite` returns the new text, or None to leave the prompt unchanged.
+    """
+    record = await get_prompt(store, assistant_key, key, default)
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        new_text = await rewrite(record.text)
+        if new_text is None:
+            return None
+        try:
+            return await compare_and_set(
+                store, assistant_key, key, record.version, new_text, provenance
+            )
+        except VersionConflict as e:
+            merged = merge3(record.text, new_text, e.current.text)
+            if merged is not None:
+                try:
+                    metrics.incr("prompt_write_merges", key=key)
+                    return await compare_and_set(
+                        store,
+                        assistant_key,
+                        key,
+                        e.current.version,
+                        merged,
+                        {**(provenance or {}), "merged": True},
+                    )
+                except VersionConflict as again:
+                    record = again.current
+                    continue
+            logger.info(f"Redoing update of {key} on version {e.current.version}")
+            record = e.current
+    raise VersionConflict(record)
+
+
+async def enforce_budget(
+    store: BaseStore,
+    assistant_key: str,
+    key: str,
+    condense: Callable[[str, int], Awaitable[str]],
+    budget: int = PROMPT_TOKEN_BUDGET,
+) -> Optional[PromptRecord]:
+    """Condense a prompt that is over `budget` tokens with `condense(text, budget)`."""
+    record = await get_prompt(store, assistant_key, key, "")
+    tokens = estimate_tokens(record.text)
+    if record.version is None or tokens <= budget:
+        return None
+
+    async def rewrite(text: str) -> Optional[str]:
+        condensed = await condense(text, budget)
+        # Keep the prompt if condensing did not make it shorter
+        return condensed if estimate_tokens(condensed) < estimate_tokens(text) else None
+
+    metrics.incr("prompt_condensations", key=key)
+    logger.info(f"Condensing {key}: {tokens} tokens over a budget of {budget}")
+    return await update_prompt(
+        store,
+        assistant_key,
+        key,
+        record.text,
+        rewrite,
+        {"source": "condense", "tokens_before": tokens},
+    )
@@ -0,0 +1,171 @@
+"""Process-wide rate limiter for Azure OpenAI deployments.
+
+Every LLM built by `get_azure_llm` reserves budget here before sending a
+request, so concurrent runs share one requests-per-minute (RPM) and
+tokens-per-minute (TPM) budget per deployment instead of each hitting 429s
+and retrying on their own. Waiters are served in FIFO order within a
+priority, and interactive nodes (triage, drafting) go before background
+reflection.
+
+Limits come from `AZURE_OPENAI_RPM_LIMIT` / `AZURE_OPENAI_TPM_LIMIT`, or per
+deployment via `LIMITER.configure`. Unset limits are not enforced.
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from eaia import metrics
+
+INTERACTIVE = 0
+BACKGROUND = 1
+
+WINDOW_SECONDS = 60.0
+# Reserved for the completion until the real usage is known
+DEFAULT_COMPLETION_RESERVE = 512
+_MIN_POLL = 0.05
+_MAX_POLL = 1.0
+
+
+def _env_limit(name: str) -> Optional[int]:
+    value = os.environ.get(name)
+    return int(value) if value else None
+
+
+class Reservation:
+    """Budget held by one request; `tokens` can be corrected once usage is known."""
+
+    def __init__(self, budget: "_Budget", tokens: int):
+        self._budget = budget
+        self.tokens = tokens
+        self.timestamp = time.monotonic()
+        self.expired = False
+
+    def reconcile(self, actual_tokens: int) -> None:
+        with self._budget.lock:
+            if not self.expired:
+                self._budget.used_tokens += actual_tokens - self.tokens
+            self.tokens = actual_tokens
+
+
+class _Budget:
+    def __init__(self, rpm: Optional[int], tpm: Optional[int]):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window: deque[Reservation] = deque()
+        self.used_tokens = 0
+        self.waiters: list = []
+        self.lock = threading.Lock()
+
+    def expire(self, now: float) -> None:
+        while self.window and now - self.window[0].timestamp >= WINDOW_SECONDS:
+            reservation = self.window.popleft()
+            reservation.expired = True
+            self.used_tokens -= reservation.tokens
+
+    def fits(self, tokens: int) -> bool:
+        if not self.window:
+            # Always let a lone request through, even one larger than the TPM
+            return True
+        if self.rpm is not None and len(self.window) >= self.rpm:
+            return False
+        if self.tpm is not None and self.used_tokens + tokens > self.tpm:
+            return False
+        return True
+
+    def wait_time(self, now: float) -> float:
+        if not self.window:
+            return _MIN_POLL
+        wait = WINDOW_SECONDS - (now - self.window[0].timestamp)
+        return min(_MAX_POLL, max(_MIN_POLL, wait))
+
+
+class RateLimiter:
+    def __init__(self):
+        self._budgets: dict[str, _Budget] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def configure(
+        self, deployment: str, rpm: Optional[int] = None, tpm: Optional[int] = None
+    ) -> None:
+        budget = self._get_budget(deployment)
+        with budget.lock:
+            budget.rpm = rpm
+            budget.tpm = tpm
+
+    def _get_budget(self, deployment: str) -> _Budget:
+        with self._lock:
+            if deployment not in self._budgets:
+                self._budgets[deployment] = _Budget(
+                    _env_limit("AZURE_OPENAI_RPM_LIMIT"),
+                    _env_limit("AZURE_OPENAI_TPM_LIMIT"),
+                )
+            return self._budgets[deployment]
+
+    async def acquire(
+        self, deployment: str, tokens: int, priority: int = INTERACTIVE
+    ) -> Reservation:
+        """Wait until `deployment` has room for a request of `tokens` tokens."""
+        budget = self._get_budget(deployment)
+        ticket = (priority, next(self._seq))
+        with budget.lock:
+            heapq.heappush(budget.waiters, ticket)
+        start = time.monotonic()
+        try:
+            while True:
+                with budget.lock:
+                    now = time.monotonic()
+                    budget.expire(now)
+                    if budget.waiters[0] == ticket and budget.fits(tokens):
+                        heapq.heappop(budget.waiters)
+                        reservation = Reservation(budget, tokens)
+                        budget.window.append(reservation)
+                        budget.used_tokens += tokens
+                        break
+                    wait = budget.wait_time(now)
+                await asyncio.sleep(wait)
+        except BaseException:
+            with budget.lock:
+                if ticket in budget.waiters:
+                    budget.waiters.remove(ticket)
+                    heapq.heapify(budget.waiters)
+            raise
+        waited = time.monotonic() - start
+        metrics.observe(
+            "rate_limit_wait", waited, deployment=deployment, priority=priority
+        )
+        return reservation
+
+    def usage(self, deployment: str) -> dict:
+        """Current usage of the rolling window for `deployment`."""
+        budget = self._get_budget(deployment)
+        with budget.lock:
+            budget.expire(time.monotonic())
+            return {
+                "requests": len(budget.window),
+                "tokens": budget.used_tokens,
+                "rpm": budget.rpm,
+                "tpm": budget.tpm,
+                "queued": len(budget.waiters),
+            }
+
+    def spare_capacity(self, deployment: str) -> float:
+        """Fraction (0-1) of the tighter of the RPM/TPM budgets still unused."""
+        usage = self.usage(deployment)
+        fractions = []
+        if usage["rpm"]:
+            fractions.append(1 - usage["requests"] / usage["rpm"])
+        if usage["tpm"]:
+            fractions.append(1 - usage["tokens"] / usage["tpm"])
+        if usage["queued"]:
+            return 0.0
+        return max(0.0, min(fractions)) if fractions else 1.0
+
+
+LIMITER = RateLimiter()
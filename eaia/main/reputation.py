@@ -0,0 +1,166 @@
+"""Per-sender triage history, used to skip the LLM for predictable senders.
+
+Each sender has a record in the assistant's `sender_reputation` namespace
+with how often each triage decision was made for them, the current streak
+of identical decisions and how many triage calls the record has saved.
+Decisions come from `triage_input` and from the user's actions in the inbox
+(`save_email`). Each email counts once: its triage decision is recorded
+first and the user's final outcome for it replaces that decision, so a
+correction that disagrees with the streak resets it. Once a sender has
+`MIN_STREAK` identical decisions in a row, making up at least
+`MIN_CONSISTENCY` of their history, triage reuses that decision. Reused
+decisions are not recorded as history, so a streak can only grow from real
+triage calls or user actions.
+"""
+
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from langgraph.store.base import BaseStore
+
+from eaia import metrics
+from eaia.main.embeddings import sender_address
+
+MIN_STREAK = int(os.environ.get("EAIA_REPUTATION_MIN_STREAK", 5))
+MIN_CONSISTENCY = 0.9
+# Decisions that can be reused; `question` depends on the email itself
+REUSABLE_DECISIONS = {"no", "email", "notify"}
+# Emails remembered per sender, so repeated records for one email count once
+RECENT_EMAILS = 20
+
+
+def _namespace(assistant_id: str) -> tuple[str, ...]:
+    return (assistant_id, "sender_reputation")
+
+
+def _empty_record() -> dict:
+    return {
+        "counts": {},
+        "last": None,
+        "streak": 0,
+        "shortcuts": 0,
+        # email id -> {"decision", "source"} counted for it, oldest first
+        "recent": {},
+        # `last` and `streak` before the most recent email was counted
+        "before_last_email": [None, 0],
+        "last_email_id": None,
+    }
+
+
+async def record_decision(
+    store: BaseStore,
+    assistant_id: str,
+    from_email: str,
+    email_id: str,
+    decision: str,
+    source: str,
+) -> Optional[dict]:
+    """Count `decision` for email `email_id` from the sender of `from_email`.
+
+    `source` is `triage` for model decisions and `user` for inbox actions.
+    An email already counted is only updated by a user action, which
+    replaces the decision counted for it.
+    """
+    sender = sender_address(from_email)
+    if not sender:
+        return None
+    item = await store.aget(_namespace(assistant_id), sender)
+    record = {**_empty_record(), **item.value} if item else _empty_record()
+    counted = record["recent"].get(email_id)
+    if counted is not None:
+        if source != "user" or counted == {"decision": decision, "source": source}:
+            return record
+        counts = record["counts"]
+        counts[counted["decision"]] -= 1
+        if not counts[counted["decision"]]:
+            del counts[counted["decision"]]
+
+    if email_id == record["last_email_id"]:
+        record["last"], record["streak"] = record["before_last_email"]
+        _add(record, decision)
+    elif counted is not None:
+        # A correction of an older email breaks the current streak
+        record["counts"][decision] = record["counts"].get(decision, 0) + 1
+        if decision != record["last"]:
+            record["streak"] = 0
+    else:
+        record["before_last_email"] = [record["last"], record["streak"]]
+        record["last_email_id"] = email_id
+        _add(record, decision)
+
+    record["recent"].pop(email_id, None)
+    record["recent"][email_id] = {"decision": decision, "source": source}
+    while len(record["recent"]) > RECENT_EMAILS:
+        del record["recent"][next(iter(record["recent"]))]
+    record["last_source"] = source
+    record["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await store.aput(_namespace(assistant_id), sender, record, index=False)
+    return record
+
+
+def _add(record: dict, decision: str) -> None:
+    record["counts"][decision] = record["counts"].get(decision, 0) + 1
+    if record["last"] == decision:
+        record["streak"] += 1
+    else:
+        record["last"] = decision
+        record["streak"] = 1
+
+
+async def get_record(
+    store: BaseStore, assistant_id: str, from_email: str
+) -> Optional[dict]:
+    """The sender's history, without counting it as a reuse."""
+    sender = sender_address(from_email)
+    if not sender:
+        return None
+    item = await store.aget(_namespace(assistant_id), sender)
+    return item.value if item else None
+
+
+def get_reusable_decision(record: dict) -> Optional[str]:
+    decision = record.get("last")
+    if decision not in REUSABLE_DECISIONS or record["streak"] < MIN_STREAK:
+        return None
+    total = sum(record["counts"].values())
+    if record["counts"].get(decision, 0) < MIN_CONSISTENCY * total:
+        return None
+    return decision
+
+
+async def lookup_decision(
+    store: BaseStore, assistant_id: str, from_email: str
+) -> Optional[str]:
+    """Reusable decision for the sender of `from_email`, counting the reuse."""
+    sender = sender_address(from_email)
+    if not sender:
+        return None
+    item = await store.aget(_namespace(assistant_id), sender)
+    if item is None:
+        return None
+    decision = get_reusable_decision(item.value)
+    if decision is not None:
+        record = item.value
+        record["shortcuts"] = record.get("shortcuts", 0) + 1
+        await store.aput(_namespace(assistant_id), sender, record, index=False)
+        metrics.incr("triage_sender_shortcuts", decision=decision)
+    return decision
+
+
+async def get_sender_stats(
+    store: BaseStore, assistant_id: str, limit: int = 100
+) -> list[dict]:
+    """Per-sender decision counts and reused decisions, most reused first."""
+    items = await store.asearch(_namespace(assistant_id), limit=limit)
+    stats = [
+        {
+            "sender": item.key,
+            "counts": item.value["counts"],
+            "streak": item.value["streak"],
+            "decision": get_reusable_decision(item.value),
+            "shortcuts": item.value.get("shortcuts", 0),
+        }
+        for item in items
+    ]
+    return sorted(stats, key=lambda s: s["shortcuts"], reverse=True)
@@ -2,18 +2,18 @@
 
 from eaia.schemas import State, ReWriteEmail
 from eaia.main.config import get_config
-from eaia.main.azure_config import get_azure_llm
+from eaia.main.preferences import get_preferences
+from eaia.main.cascade import run_cascade
 
 
-rewrite_prompt = """You job is to rewrite an email draft to sound more like {name}.
+rewrite_system_prompt = """You job is to rewrite an email draft to sound more like {name}.
 
 {name}'s assistant just drafted an email. It is factually correct, but it may not sound like {name}. \
 Your job is to rewrite the email keeping the information the same (do not add anything that is made up!) \
 but adjusting the tone. 
 
-{instructions}
-
-Here is the assistant's current draft:
+{instructions}"""
+rewrite_draft_prompt = """Here is the assistant's current draft:
 
 <draft>
 {draft}
@@ -29,35 +29,36 @@ Subject: {subject}
 
 
 async def rewrite(state: State, config, store):
-    model = config["configurable"].get("model", "gpt-4o")
-    llm = get_azure_llm(temperature=0, model=model)
     prev_message = state["messages"][-1]
     draft = prev_message.tool_calls[0]["args"]["content"]
-    namespace = (config["configurable"].get("assistant_id", "default"),)
-    result = await store.aget(namespace, "rewrite_instructions")
     prompt_config = get_config(config)
-    if result and "data" in result.value:
-        _prompt = result.value["data"]
-    else:
-        await store.aput(
-            namespace,
-            "rewrite_instructions",
-            {"data": prompt_config["rewrite_preferences"]},
-        )
-        _prompt = prompt_config["rewrite_preferences"]
-    input_message = rewrite_prompt.format(
+    preferences = await get_preferences(
+        store, config["configurable"].get("assistant_id", "default"), prompt_config
+    )
+    _prompt = preferences["rewrite_instructions"]
+    system_message = rewrite_system_prompt.format(
+        instructions=_prompt,
+        name=prompt_config["name"],
+    )
+    input_message = rewrite_draft_prompt.format(
         email_thread=state["email"]["page_content"],
         author=state["email"]["from_email"],
         subject=state["email"]["subject"],
         to=state["email"]["to_email"],
         draft=draft,
-        instructions=_prompt,
-        name=prompt_config["name"],
-    )
-    model = llm.with_structured_output(ReWriteEmail).bind(
-        tool_choice={"type": "function", "function": {"name": "ReWriteEmail"}}
     )
-    response = await model.ainvoke(input_message)
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": input_message},
+    ]
+
+    async def call(llm):
+        model = llm.with_structured_output(ReWriteEmail).bind(
+            tool_choice={"type": "function", "function": {"name": "ReWriteEmail"}}
+        )
+        return await model.ainvoke(messages)
+
+    response = await run_cascade("rewrite", config, call, temperature=0)
     tool_calls = [
         {
             "id": prev_message.tool_calls[0]["id"],
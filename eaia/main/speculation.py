@@ -0,0 +1,116 @@
+"""Speculative drafting: start `draft_response` while triage is still running.
+
+For emails that end up as `email`, triage and drafting otherwise run back
+to back before anything reaches Agent Inbox. When cheap signals predict
+`email`, `triage_input` starts the draft concurrently and commits it if
+triage agrees, or discards it (cancelling it if still running) if not.
+
+Enabled per assistant under `configurable.speculative_drafting`, e.g.
+
+    {"speculative_drafting": {"min_score": 0.6}}
+
+The score combines the sender's share of `email` decisions, a question
+mark in the email and scheduling keywords. Tokens spent on discarded
+drafts, retries and cancelled in-flight calls included, are counted in
+`speculative_draft_wasted_tokens` from a usage scope of the draft's task
+(see `eaia.main.accounting.start_usage_scope`).
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, NamedTuple, Optional
+
+from langgraph.store.base import BaseStore
+
+from eaia import metrics
+from eaia.main.accounting import scope_tokens, start_usage_scope
+from eaia.main.prefetch import mentions_scheduling
+from eaia.main.reputation import get_record
+from eaia.schemas import EmailData
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MIN_SCORE = 0.6
+# Triage decisions that are followed by `draft_response`
+DRAFT_DECISIONS = {"email", "question"}
+QUESTION_SCORE = 0.4
+SCHEDULING_SCORE = 0.4
+# Decisions needed before the sender's history counts
+MIN_SENDER_DECISIONS = 2
+
+
+def get_min_score(config: dict) -> Optional[float]:
+    """Score needed to speculate, None when speculative drafting is off."""
+    settings = config["configurable"].get("speculative_drafting")
+    if not settings:
+        return None
+    return float(settings.get("min_score", DEFAULT_MIN_SCORE))
+
+
+async def speculation_score(
+    email: EmailData, store: BaseStore, assistant_id: str
+) -> float:
+    """Rough probability (0-1) that triage will decide to draft a reply."""
+    signals = []
+    record = await get_record(store, assistant_id, email["from_email"])
+    if record:
+        total = sum(record["counts"].values())
+        if total >= MIN_SENDER_DECISIONS:
+            signals.append(
+                sum(record["counts"].get(d, 0) for d in DRAFT_DECISIONS) / total
+            )
+    if "?" in email["page_content"]:
+        signals.append(QUESTION_SCORE)
+    if mentions_scheduling(email):
+        signals.append(SCHEDULING_SCORE)
+    # Any one signal can predict a reply on its own
+    miss = 1.0
+    for signal in signals:
+        miss *= 1 - signal
+    return 1 - miss
+
+
+class SpeculativeDraft(NamedTuple):
+    task: asyncio.Task
+    # Usage scope of the task, see `eaia.main.accounting`
+    usage: dict
+
+
+def start_draft(draft: Callable[[], Awaitable[dict]]) -> SpeculativeDraft:
+    """Run `draft()` in a task whose LLM token usage is counted."""
+    usage: dict = {}
+
+    async def run():
+        start_usage_scope(usage)
+        return await draft()
+
+    return SpeculativeDraft(asyncio.create_task(run()), usage)
+
+
+def _tokens(draft: SpeculativeDraft) -> int:
+    return scope_tokens(draft.usage) if draft.usage else 0
+
+
+async def resolve(draft: SpeculativeDraft, decision: str) -> Optional[dict]:
+    """The speculative draft's update if triage chose to draft, else None."""
+    task = draft.task
+    if decision not in DRAFT_DECISIONS:
+        # Counted before cancelling, which ends calls still in flight
+        wasted = _tokens(draft)
+        if not task.done():
+            task.cancel()
+            metrics.incr("speculative_drafts", outcome="cancelled")
+        elif not task.cancelled() and task.exception() is None:
+            metrics.incr("speculative_drafts", outcome="discarded")
+        metrics.incr("speculative_draft_wasted_tokens", wasted)
+        return None
+    try:
+        result = await task
+    except Exception as e:
+        # Drafted again by `draft_response` after triage
+        logger.warning(f"Speculative draft failed: {e}")
+        metrics.incr("speculative_drafts", outcome="failed")
+        metrics.incr("speculative_draft_wasted_tokens", _tokens(draft))
+        return None
+    metrics.incr("speculative_drafts", outcome="committed")
+    return result
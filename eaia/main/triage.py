@@ -10,10 +10,20 @@ from eaia.schemas import (
 )
 from eaia.main.fewshot import get_few_shot_examples
 from eaia.main.config import get_config
-from eaia.main.azure_config import get_azure_llm
+from eaia.main.cascade import run_cascade, get_min_confidence
+from eaia.main.draft_response import draft_response
+from eaia.main import prefetch, speculation
+from eaia.main.reputation import lookup_decision, record_decision
+from eaia.main.near_duplicates import (
+    REUSABLE_DECISIONS,
+    add_to_cluster,
+    find_cluster,
+    minhash_signature,
+    record_cluster,
+)
 
 
-triage_prompt = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
+triage_system_prompt = """You are {full_name}'s executive assistant. You are a top-notch executive assistant who cares about {name} performing as well as possible.
 
 {background}. 
 
@@ -30,9 +40,9 @@ There are also other things that {name} should know about, but don't require an
 
 For emails not worth responding to, respond `no`. For something where {name} should respond over email, respond `email`. If it's important to notify {name}, but no email is required, respond `notify`. \
 
-If unsure, opt to `notify` {name} - you will learn from this in the future.
+If unsure, opt to `notify` {name} - you will learn from this in the future."""
 
-{fewshotexamples}
+triage_email_prompt = """{fewshotexamples}
 
 Please determine how to handle the below email thread:
 
@@ -43,17 +53,99 @@ Subject: {subject}
 {email_thread}"""
 
 
+def _triage_update(state: State, response: RespondTo) -> dict:
+    if len(state["messages"]) > 0:
+        delete_messages = [RemoveMessage(id=m.id) for m in state["messages"]]
+        return {"triage": response, "messages": delete_messages}
+    else:
+        return {"triage": response}
+
+
 async def triage_input(state: State, config: RunnableConfig, store: BaseStore):
-    model = config["configurable"].get("model", "gpt-4o")
-    llm = get_azure_llm(temperature=0, model=model)
-    examples = await get_few_shot_examples(state["email"], store, config)
+    assistant_id = config["configurable"].get("assistant_id", "default")
+    decision = await lookup_decision(
+        store, assistant_id, state["email"]["from_email"]
+    )
+    if decision is not None:
+        response = RespondTo(
+            logic="Same decision as the sender's previous emails", response=decision
+        )
+        return _triage_update(state, response)
+
+    duplicates = state.get("duplicates") or []
+    signature = minhash_signature(state["email"]["page_content"])
+    if signature is not None:
+        cluster = await find_cluster(store, assistant_id, signature)
+        if cluster is not None:
+            await add_to_cluster(store, assistant_id, cluster, 1 + len(duplicates))
+            response = RespondTo(
+                logic="Same decision as a near-identical email",
+                response=cluster["decision"],
+            )
+            return _triage_update(state, response)
+
+    # Only runs that reach the LLM load few-shots, preferences and calendar
+    loads = prefetch.start_prefetch(state, config, store)
+    speculative = None
+    min_score = speculation.get_min_score(config)
+    if min_score is not None:
+        score = await speculation.speculation_score(
+            state["email"], store, assistant_id
+        )
+        if score >= min_score:
+            speculative = speculation.start_draft(
+                lambda: draft_response({**state, "messages": []}, config, store)
+            )
+    try:
+        examples = await prefetch.get_loaded(loads, "few_shot_examples")
+        response = await _call_triage(state, config, store, examples)
+    except BaseException:
+        prefetch.cancel(loads)
+        if speculative is not None:
+            speculative.task.cancel()
+        raise
+
+    await record_decision(
+        store,
+        assistant_id,
+        state["email"]["from_email"],
+        state["email"]["id"],
+        response.response,
+        "triage",
+    )
+    if signature is not None and response.response in REUSABLE_DECISIONS:
+        await record_cluster(
+            store,
+            assistant_id,
+            state["email"]["id"],
+            signature,
+            response.response,
+            size=1 + len(duplicates),
+        )
+    update = _triage_update(state, response)
+    update["prefetched"] = await prefetch.collect(
+        loads, need_busy=response.response in speculation.DRAFT_DECISIONS
+    )
+    if speculative is not None:
+        draft = await speculation.resolve(speculative, response.response)
+        if draft is not None:
+            # The same update `draft_response` would return; routed straight
+            # to the draft's tool call, see `route_after_triage`
+            update = {
+                **update,
+                **draft,
+                "messages": update.get("messages", []) + draft["messages"],
+            }
+    return update
+
+
+async def _call_triage(
+    state: State, config: RunnableConfig, store: BaseStore, examples=None
+):
+    if examples is None:
+        examples = await get_few_shot_examples(state["email"], store, config)
     prompt_config = get_config(config)
-    input_message = triage_prompt.format(
-        email_thread=state["email"]["page_content"],
-        author=state["email"]["from_email"],
-        to=state["email"].get("to_email", ""),
-        subject=state["email"]["subject"],
-        fewshotexamples=examples,
+    system_message = triage_system_prompt.format(
         name=prompt_config["name"],
         full_name=prompt_config["full_name"],
         background=prompt_config["background"],
@@ -61,12 +153,29 @@ async def triage_input(state: State, config: RunnableConfig, store: BaseStore):
         triage_email=prompt_config["triage_email"],
         triage_notify=prompt_config["triage_notify"],
     )
-    model = llm.with_structured_output(RespondTo).bind(
-        tool_choice={"type": "function", "function": {"name": "RespondTo"}}
+    input_message = triage_email_prompt.format(
+        email_thread=state["email"]["page_content"],
+        author=state["email"]["from_email"],
+        to=state["email"].get("to_email", ""),
+        subject=state["email"]["subject"],
+        fewshotexamples=examples,
+    )
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": input_message},
+    ]
+
+    async def call(llm):
+        model = llm.with_structured_output(RespondTo).bind(
+            tool_choice={"type": "function", "function": {"name": "RespondTo"}}
+        )
+        return await model.ainvoke(messages)
+
+    min_confidence = get_min_confidence(config, "triage_input")
+    return await run_cascade(
+        "triage_input",
+        config,
+        call,
+        accept=lambda r: r.confidence >= min_confidence,
+        temperature=0,
     )
-    response = await model.ainvoke(input_message)
-    if len(state["messages"]) > 0:
-        delete_messages = [RemoveMessage(id=m.id) for m in state["messages"]]
-        return {"triage": response, "messages": delete_messages}
-    else:
-        return {"triage": response}
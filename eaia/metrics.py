@@ -0,0 +1,84 @@
+"""Lightweight in-process metrics for the assistant's hot paths.
+
+Events passed to `emit` are also appended as JSON lines to the file at
+`EAIA_METRICS_PATH`, when set.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+_SINK_LOCK = threading.Lock()
+_COUNTERS: Dict[Tuple, float] = {}
+_TIMINGS: Dict[Tuple, list] = {}
+
+
+def _key(name: str, labels: dict) -> Tuple:
+    return (name,) + tuple(sorted(labels.items()))
+
+
+def incr(name: str, value: float = 1, **labels) -> None:
+    """Increment a counter, optionally split by labels (e.g. node="triage_input")."""
+    key = _key(name, labels)
+    with _LOCK:
+        _COUNTERS[key] = _COUNTERS.get(key, 0) + value
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """Record a duration sample for a timing metric."""
+    key = _key(name, labels)
+    with _LOCK:
+        count, total, peak = _TIMINGS.get(key, (0, 0.0, 0.0))
+        _TIMINGS[key] = (count + 1, total + seconds, max(peak, seconds))
+
+
+def get_counter(name: str, **labels) -> float:
+    with _LOCK:
+        return _COUNTERS.get(_key(name, labels), 0)
+
+
+def snapshot() -> dict:
+    """Return all metrics as plain data, suitable for logging or JSON."""
+    with _LOCK:
+        counters = [
+            {"name": k[0], "labels": dict(k[1:]), "value": v}
+            for k, v in _COUNTERS.items()
+        ]
+        timings = [
+            {
+                "name": k[0],
+                "labels": dict(k[1:]),
+                "count": count,
+                "avg": total / count if count else 0.0,
+                "max": peak,
+            }
+            for k, (count, total, peak) in _TIMINGS.items()
+        ]
+    return {"counters": counters, "timings": timings}
+
+
+def reset() -> None:
+    with _LOCK:
+        _COUNTERS.clear()
+        _TIMINGS.clear()
+
+
+def emit(event: str, **fields) -> None:
+    """Append an event to the local metrics sink, if one is configured."""
+    path = os.environ.get("EAIA_METRICS_PATH")
+    if not path:
+        return
+    record = {"event": event, "ts": time.time(), **fields}
+    try:
+        with _SINK_LOCK:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        logger.warning(f"Could not write metrics to {path}: {e}")
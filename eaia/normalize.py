@@ -0,0 +1,160 @@
+"""Normalizes email bodies before they are pasted into prompts.
+
+Converts HTML to text, strips quoted reply history and signatures, collapses
+whitespace and caps the length. The raw body is kept alongside so nothing is
+lost for display.
+"""
+
+import re
+from html.parser import HTMLParser
+
+MAX_BODY_CHARS = 4000
+TRUNCATION_MARKER = "\n[... truncated]"
+
+_HTML_RE = re.compile(r"<\s*(html|body|div|p|br|table|span|td)\b", re.IGNORECASE)
+_BLOCK_TAGS = {
+    "p", "div", "br", "tr", "li", "ul", "ol", "table", "blockquote",
+    "h1", "h2", "h3", "h4", "h5", "h6", "hr",
+}
+_SKIP_TAGS = {"script", "style", "head", "title"}
+
+# Lines that introduce quoted history in English, Dutch and French clients
+_REPLY_HEADER_PATTERNS = [
+    re.compile(r"^On .{0,200}wrote:\s*$", re.IGNORECASE),
+    re.compile(r"^Op .{0,200}(schreef|geschreven).{0,60}:\s*$", re.IGNORECASE),
+    re.compile(r"^Le .{0,200}a écrit\s*:\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Oorspronkelijk bericht\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Message d'origine\s*-{2,}\s*$", re.IGNORECASE),
+    re.compile(r"^_{10,}\s*$"),
+]
+# Outlook style header blocks, e.g. "From: ..." followed by "Sent: ..."
+_OUTLOOK_FROM_RE = re.compile(r"^(From|Van|De)\s*:", re.IGNORECASE)
+_OUTLOOK_NEXT_RE = re.compile(
+    r"^(Sent|Date|Verzonden|Datum|Envoyé|To|Aan|À)\s*:", re.IGNORECASE
+)
+_SIGNATURE_DELIMITER_RE = re.compile(r"^--\s*$")
+_MOBILE_SIGNATURE_RE = re.compile(
+    r"^(Sent from my|Verzonden (vanaf|met) mijn|Envoyé de mon|Get Outlook for)",
+    re.IGNORECASE,
+)
+_SIGN_OFF_RE = re.compile(
+    r"^(best|kind|warm)?\s*regards,?$|^(met )?vriendelijke groet(en)?,?$|"
+    r"^groet(en|jes)?,?$|^cordialement,?$|^bien à vous,?$|^thanks,?$|^thank you,?$",
+    re.IGNORECASE,
+)
+# How far from the end of the message a sign-off may appear
+_SIGN_OFF_WINDOW = 15
+# Lines below a sign-off are only dropped when they look like a contact
+# block: a few short lines, none of them a question or a postscript
+_SIGNATURE_MAX_LINES = 8
+_SIGNATURE_MAX_CHARS = 60
+_CONTACT_RE = re.compile(r"@|https?://|www\.|\+?\d[\d ()./-]{6,}")
+_NOT_SIGNATURE_RE = re.compile(r"\?\s*$|^p\.?\s?s\b", re.IGNORECASE)
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    return "".join(parser.parts)
+
+
+def looks_like_html(body: str) -> bool:
+    return bool(_HTML_RE.search(body))
+
+
+def strip_quoted_history(text: str) -> str:
+    lines = text.split("\n")
+    kept = []
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if any(p.match(stripped) for p in _REPLY_HEADER_PATTERNS):
+            break
+        if _OUTLOOK_FROM_RE.match(stripped) and any(
+            _OUTLOOK_NEXT_RE.match(nxt.strip()) for nxt in lines[i + 1 : i + 4]
+        ):
+            break
+        if stripped.startswith(">"):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _looks_like_signature(lines: list[str]) -> bool:
+    lines = [line.strip() for line in lines if line.strip()]
+    return len(lines) <= _SIGNATURE_MAX_LINES and all(
+        not _NOT_SIGNATURE_RE.search(line)
+        and (len(line) <= _SIGNATURE_MAX_CHARS or _CONTACT_RE.search(line))
+        for line in lines
+    )
+
+
+def strip_signature(text: str) -> str:
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        stripped = line.strip()
+        if _SIGNATURE_DELIMITER_RE.match(line) or _MOBILE_SIGNATURE_RE.match(stripped):
+            lines = lines[:i]
+            break
+    # Keep the sign-off and the name below it, drop the contact block
+    start = max(0, len(lines) - _SIGN_OFF_WINDOW)
+    for i in range(len(lines) - 1, start - 1, -1):
+        if _SIGN_OFF_RE.match(lines[i].strip()):
+            end = i + 1
+            while end < len(lines) and not lines[end].strip():
+                end += 1
+            if _looks_like_signature(lines[end + 1 :]):
+                lines = lines[: end + 1]
+            break
+    return "\n".join(lines)
+
+
+def collapse_whitespace(text: str) -> str:
+    text = text.replace("\r\n", "\n").replace("\r", "\n").replace("\xa0", " ")
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.split("\n")]
+    text = "\n".join(lines)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+
+def cap_length(text: str, max_chars: int = MAX_BODY_CHARS) -> str:
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + TRUNCATION_MARKER
+
+
+def normalize_body(body: str, max_chars: int = MAX_BODY_CHARS) -> str:
+    """Return the prompt-ready version of a raw email body."""
+    if not body:
+        return ""
+    text = html_to_text(body) if looks_like_html(body) else body
+    text = collapse_whitespace(text)
+    normalized = collapse_whitespace(strip_signature(strip_quoted_history(text)))
+    # Never strip a message down to nothing, e.g. a pure forward
+    if not normalized:
+        normalized = text
+    return cap_length(normalized, max_chars)
@@ -1,33 +1,56 @@
 from langgraph.store.base import BaseStore
 from langchain_anthropic import ChatAnthropic
 from typing import TypedDict, Optional
+from typing_extensions import NotRequired
 from langgraph.graph import StateGraph, START, END, MessagesState
-from langgraph.types import Command, Send
+from eaia import metrics
 from eaia.main.azure_config import get_azure_llm
+from eaia.main.config import get_config
+from eaia.main.deployment_pool import get_pool
+from eaia.main.preferences import get_preferences
+from eaia.main.prompt_memory import (
+    VersionConflict,
+    enforce_budget,
+    rollback_prompt,
+    update_prompt,
+)
+from eaia.main.rate_limit import BACKGROUND, LIMITER
+from eaia.reflection_queue import (
+    ReflectionQueue,
+    load_events,
+    pending_keys,
+    persist_event,
+    remove_events,
+)
+from eaia.trajectory import compact_trajectory
 
 from dotenv import load_dotenv
+import logging
 import os
+import time
 
 load_dotenv() 
 
+logger = logging.getLogger(__name__)
+
+# "online" reflects in the server shortly after feedback arrives, "batch"
+# persists feedback for `batch_reflection_graph` to process on a schedule
+REFLECTION_MODE = os.environ.get("EAIA_REFLECTION_MODE", "online")
+
 TONE_INSTRUCTIONS = "Only update the prompt to include instructions on the **style and tone and format** of the response. Do NOT update the prompt to include anything about the actual content - only the style and tone and format. The user sometimes responds differently to different types of people - take that into account, but don't be too specific."
 RESPONSE_INSTRUCTIONS = "Only update the prompt to include instructions on the **content** of the response. Do NOT update the prompt to include anything about the tone or style or format of the response."
 SCHEDULE_INSTRUCTIONS = "Only update the prompt to include instructions on how to send calendar invites - eg when to send them, what title should be, length, time of day, etc"
 BACKGROUND_INSTRUCTIONS = "Only update the propmpt to include pieces of information that are relevant to being the user's assistant. Do not update the instructions to include anything about the tone of emails sent, when to send calendar invites. Examples of good things to include are (but are not limited to): people's emails, addresses, etc."
 
 
-def get_trajectory_clean(messages):
-    response = []
-    for m in messages:
-        response.append(m.pretty_repr())
-    return "\n".join(response)
-
-
 class ReflectionState(MessagesState):
     feedback: Optional[str]
     prompt_key: str
     assistant_key: str
     instructions: str
+    # Several {"trajectory", "feedback"} interactions to reflect on at once,
+    # instead of `messages` and `feedback`
+    events: NotRequired[list[dict]]
 
 
 class GeneralResponse(TypedDict):
@@ -43,16 +66,11 @@ These is their current prompt:
 {current_prompt}
 </current_prompt>
 
-Here was the agent's trajectory:
-<trajectory>
-{trajectory}
-</trajectory>
+Here are the agent's trajectories and the user's feedback on each of them:
 
-Here is the user's feedback:
-
-<feedback>
-{feedback}
-</feedback>
+<interactions>
+{interactions}
+</interactions>
 
 Here are instructions for updating the agent's prompt:
 
@@ -66,36 +84,99 @@ Based on this, return an updated prompt
 You should return the full prompt, so if there's anything from before that you want to include, make sure to do that. Feel free to override or change anything that seems irrelevant. You do not need to update the prompt - if you don't want to, just return `update_prompt = False` and an empty string for new prompt."""
 
 
-async def update_general(state: ReflectionState, config, store: BaseStore):
-    reflection_model = get_azure_llm(model="o1", disable_streaming=True)
+interaction_template = """<interaction>
+<trajectory>
+{trajectory}
+</trajectory>
+<feedback>
+{feedback}
+</feedback>
+</interaction>"""
+
+
+condense_prompt = """This is a system prompt that an AI agent has built up from user feedback over time:
+
+<current_prompt>
+{current_prompt}
+</current_prompt>
+
+It has grown too long. Rewrite it in under {budget} tokens. Keep every distinct instruction and fact, merge ones that repeat or overlap, and drop only wording. Return only the new prompt."""
+
+
+def format_interactions(events: list[dict]) -> str:
+    return "\n".join(
+        interaction_template.format(
+            trajectory=event.get("trajectory")
+            or compact_trajectory(event["messages"]),
+            feedback=event["feedback"],
+        )
+        for event in events
+    )
+
+
+async def reflect(
+    store: BaseStore,
+    config,
+    assistant_key: str,
+    prompt_key: str,
+    instructions: str,
+    events: list[dict],
+):
+    """Update one prompt from all the feedback in `events` with a single call."""
+    reflection_model = get_azure_llm(
+        model="o1", disable_streaming=True, priority=BACKGROUND
+    )
     # reflection_model = ChatAnthropic(model="claude-3-5-sonnet-latest")
-    namespace = (state["assistant_key"],)
-    key = state["prompt_key"]
-    result = await store.aget(namespace, key)
+    preferences = await get_preferences(store, assistant_key, get_config(config))
+    interactions = format_interactions(events)
 
-    async def get_output(messages, current_prompt, feedback, instructions):
-        trajectory = get_trajectory_clean(messages)
+    async def rewrite(current_prompt: str):
         prompt = general_reflection_prompt.format(
             current_prompt=current_prompt,
-            trajectory=trajectory,
-            feedback=feedback,
+            interactions=interactions,
             instructions=instructions,
         )
-        _output = await reflection_model.with_structured_output(
+        output = await reflection_model.with_structured_output(
             GeneralResponse, method="json_schema"
         ).ainvoke(prompt)
-        return _output
+        return output["new_prompt"] if output["update_prompt"] else None
+
+    # Concurrent reflections on the same prompt are merged, not overwritten
+    record = await update_prompt(
+        store,
+        assistant_key,
+        prompt_key,
+        preferences[prompt_key],
+        rewrite,
+        {
+            "source": "reflection",
+            "feedback": [event["feedback"][:200] for event in events[:5]],
+            "events": len(events),
+        },
+    )
+    if record is not None:
+
+        async def condense(text: str, budget: int) -> str:
+            output = await reflection_model.ainvoke(
+                condense_prompt.format(current_prompt=text, budget=budget)
+            )
+            return output.content
+
+        await enforce_budget(store, assistant_key, prompt_key, condense)
 
-    output = await get_output(
-        state["messages"],
-        result.value["data"],
-        state["feedback"],
+
+async def update_general(state: ReflectionState, config, store: BaseStore):
+    events = state.get("events") or [
+        {"messages": state["messages"], "feedback": state["feedback"]}
+    ]
+    await reflect(
+        store,
+        config,
+        state["assistant_key"],
+        state["prompt_key"],
         state["instructions"],
+        events,
     )
-    if output["update_prompt"]:
-        await store.aput(
-            namespace, key, {"data": output["new_prompt"]}, index=False
-        )
 
 
 
@@ -152,10 +233,46 @@ class MultiMemoryInput(MessagesState):
     assistant_key: str
 
 
-async def determine_what_to_update(state: MultiMemoryInput):
-    reflection_model = get_azure_llm(model="gpt-4o", disable_streaming=True)
+async def _flush_reflection(key, events: list[dict], context: dict):
+    assistant_key, prompt_key = key
+    await reflect(
+        context["store"],
+        context["config"],
+        assistant_key,
+        prompt_key,
+        context["instructions"],
+        events,
+    )
+
+
+# Feedback is coalesced per prompt, so a burst of inbox actions costs one
+# reflection per prompt instead of one per action
+REFLECTION_QUEUE = ReflectionQueue(
+    _flush_reflection,
+    quiet_seconds=float(os.environ.get("EAIA_REFLECTION_QUIET_SECONDS", 120)),
+    max_batch=int(os.environ.get("EAIA_REFLECTION_MAX_BATCH", 10)),
+)
+
+
+def _persistable(configurable: dict) -> dict:
+    # Drop the runtime objects LangGraph adds to the configurable
+    return {
+        k: v
+        for k, v in configurable.items()
+        if not k.startswith("__")
+        and isinstance(v, (str, int, float, bool, list, dict, type(None)))
+    }
+
+
+async def determine_what_to_update(
+    state: MultiMemoryInput, config, store: BaseStore
+):
+    reflection_model = get_azure_llm(
+        model="gpt-4o", disable_streaming=True, priority=BACKGROUND
+    )
     #reflection_model = ChatAnthropic(model="claude-3-5-sonnet-latest")
-    trajectory = get_trajectory_clean(state["messages"])
+    # Rendered once and shared by every prompt reflection this feedback joins
+    trajectory = compact_trajectory(state["messages"])
     types_of_prompts = "\n".join(
         [f"`{p_type}`: {MEMORY_TO_UPDATE[p_type]}" for p_type in state["prompt_types"]]
     )
@@ -168,28 +285,145 @@ async def determine_what_to_update(state: MultiMemoryInput):
     class MemoryToUpdate(TypedDict):
         memory_types_to_update: list[str]
 
-    response = reflection_model.with_structured_output(MemoryToUpdate).invoke(prompt)
-    sends = []
+    response = await reflection_model.with_structured_output(MemoryToUpdate).ainvoke(
+        prompt
+    )
+    event = {"trajectory": trajectory, "feedback": state["feedback"]}
     for t in response["memory_types_to_update"]:
-        _state = {
-            "messages": state["messages"],
-            "feedback": state["feedback"],
-            "prompt_key": MEMORY_TO_UPDATE_KEYS[t],
-            "assistant_key": state["assistant_key"],
-            "instructions": MEMORY_TO_UPDATE_INSTRUCTIONS[t],
-        }
-        send = Send("reflection", _state)
-        sends.append(send)
-    return Command(goto=sends)
-
-
-# Done so this can run in parallel
-async def call_reflection(state: ReflectionState):
-    await general_reflection_graph.ainvoke(state)
+        key = (state["assistant_key"], MEMORY_TO_UPDATE_KEYS[t])
+        if REFLECTION_MODE == "batch":
+            await persist_event(
+                store,
+                key,
+                {**event, "configurable": _persistable(config["configurable"])},
+            )
+            continue
+        await REFLECTION_QUEUE.add(
+            key,
+            event,
+            store=store,
+            config={"configurable": dict(config["configurable"])},
+            instructions=MEMORY_TO_UPDATE_INSTRUCTIONS[t],
+        )
 
 
 multi_reflection_graph = StateGraph(MultiMemoryInput)
 multi_reflection_graph.add_node(determine_what_to_update)
-multi_reflection_graph.add_node("reflection", call_reflection)
 multi_reflection_graph.add_edge(START, "determine_what_to_update")
+multi_reflection_graph.add_edge("determine_what_to_update", END)
 multi_reflection_graph = multi_reflection_graph.compile()
+
+
+INSTRUCTIONS_BY_PROMPT_KEY = {
+    MEMORY_TO_UPDATE_KEYS[t]: MEMORY_TO_UPDATE_INSTRUCTIONS[t]
+    for t in MEMORY_TO_UPDATE_KEYS
+}
+
+
+class BatchReflectionState(TypedDict):
+    # Only run if the reflection deployments have at least this fraction of
+    # their rate limit unused, e.g. 0.5 for an opportunistic schedule
+    min_spare_capacity: NotRequired[float]
+    max_batch: NotRequired[int]
+    processed: NotRequired[int]
+    remaining: NotRequired[int]
+
+
+def _spare_capacity() -> float:
+    return max(LIMITER.spare_capacity(d.key) for d in get_pool().candidates())
+
+
+async def process_reflection_queue(
+    state: BatchReflectionState, config, store: BaseStore
+):
+    """Reflect on all persisted feedback, one call per prompt and batch."""
+    spare = _spare_capacity()
+    if spare < state.get("min_spare_capacity", 0.0):
+        logger.info(f"Skipping batch reflection, spare capacity is {spare:.0%}")
+        metrics.incr("reflection_batches_skipped")
+        return {"processed": 0}
+    max_batch = state.get("max_batch", REFLECTION_QUEUE.max_batch)
+    start = time.monotonic()
+    queue = {key: await load_events(store, key) for key in await pending_keys(store)}
+    depth = sum(len(items) for items in queue.values())
+    processed = remaining = 0
+    for key, items in queue.items():
+        assistant_key, prompt_key = key
+        for i in range(0, len(items), max_batch):
+            chunk = items[i : i + max_batch]
+            # The latest event has the assistant's current configuration
+            event_config = {"configurable": chunk[-1].value.get("configurable", {})}
+            try:
+                await reflect(
+                    store,
+                    event_config,
+                    assistant_key,
+                    prompt_key,
+                    INSTRUCTIONS_BY_PROMPT_KEY[prompt_key],
+                    [item.value for item in chunk],
+                )
+            except Exception:
+                # Left in the queue for the next run
+                logger.exception(f"Batch reflection for {key} failed")
+                metrics.incr("reflection_batch_failures")
+                remaining += len(items) - i
+                break
+            await remove_events(store, key, chunk)
+            processed += len(chunk)
+
+    seconds = time.monotonic() - start
+    metrics.incr("reflection_events_processed", processed)
+    metrics.emit(
+        "reflection_batch",
+        depth=depth,
+        groups=len(queue),
+        processed=processed,
+        remaining=remaining,
+        seconds=seconds,
+        events_per_second=processed / seconds if seconds else 0.0,
+        spare_capacity=spare,
+    )
+    logger.info(
+        f"Reflected on {processed} of {depth} queued events in {seconds:.1f}s, "
+        f"{remaining} left in the queue"
+    )
+    return {"processed": processed, "remaining": remaining}
+
+
+batch_reflection_graph = StateGraph(BatchReflectionState)
+batch_reflection_graph.add_node(process_reflection_queue)
+batch_reflection_graph.add_edge(START, "process_reflection_queue")
+batch_reflection_graph.add_edge("process_reflection_queue", END)
+batch_reflection_graph = batch_reflection_graph.compile()
+
+
+class PromptRollbackState(TypedDict):
+    assistant_key: str
+    prompt_key: str
+    version: int
+    # Version the caller saw as current; the rollback fails if it changed
+    expected_version: NotRequired[int]
+    restored_as: NotRequired[Optional[int]]
+    current_version: NotRequired[Optional[int]]
+
+
+async def rollback(state: PromptRollbackState, config, store: BaseStore):
+    """Restore an earlier prompt version, as a compare-and-set write."""
+    try:
+        record = await rollback_prompt(
+            store,
+            state["assistant_key"],
+            state["prompt_key"],
+            state["version"],
+            state.get("expected_version"),
+        )
+    except VersionConflict as e:
+        return {"restored_as": None, "current_version": e.current.version}
+    return {"restored_as": record.version, "current_version": record.version}
+
+
+prompt_rollback_graph = StateGraph(PromptRollbackState)
+prompt_rollback_graph.add_node(rollback)
+prompt_rollback_graph.add_edge(START, "rollback")
+prompt_rollback_graph.add_edge("rollback", END)
+prompt_rollback_graph = prompt_rollback_graph.compile()
@@ -0,0 +1,154 @@
+"""Debounced queue that coalesces feedback into batched reflections.
+
+Every inbox action produces a feedback event for one or more prompts.
+Reflecting on each one separately costs a reasoning-model call per event,
+and concurrent reflections on the same prompt overwrite each other.
+`ReflectionQueue` buffers events per (assistant_key, prompt_key) and
+flushes them together once the key has been quiet for `quiet_seconds`,
+`max_batch` events have accumulated, or the oldest event has waited
+`max_wait_seconds`. Flushes of the same key never overlap.
+
+The queue lives in the server process, so buffered events are lost if it
+restarts before they are flushed. In batch mode events are instead written
+to the store with `persist_event`, under `("reflection_queue",
+assistant_key, prompt_key)`, and a scheduled job reads them back with
+`pending_keys` / `load_events` and deletes them once reflected on.
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Optional
+
+from langgraph.store.base import BaseStore, Item, PutOp
+
+from eaia import metrics
+
+logger = logging.getLogger(__name__)
+
+QueueKey = tuple[str, str]
+FlushFn = Callable[[QueueKey, list[dict], dict], Awaitable[Any]]
+
+DURABLE_PREFIX = ("reflection_queue",)
+_LOAD_PAGE_SIZE = 500
+
+
+class _Buffer:
+    def __init__(self):
+        self.events: list[dict] = []
+        self.context: dict = {}
+        self.first_at: Optional[float] = None
+        self.last_at: Optional[float] = None
+        self.timer: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+
+class ReflectionQueue:
+    def __init__(
+        self,
+        flush: FlushFn,
+        quiet_seconds: float = 120.0,
+        max_batch: int = 10,
+        max_wait_seconds: float = 900.0,
+    ):
+        self._flush_fn = flush
+        self.quiet_seconds = quiet_seconds
+        self.max_batch = max_batch
+        self.max_wait_seconds = max_wait_seconds
+        self._buffers: dict[QueueKey, _Buffer] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        # A fresh context, so flushes are not traced as part of the run that
+        # happened to enqueue the last event
+        task = asyncio.get_running_loop().create_task(
+            coro, context=contextvars.Context()
+        )
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def pending(self, key: QueueKey) -> int:
+        buffer = self._buffers.get(key)
+        return len(buffer.events) if buffer else 0
+
+    async def add(self, key: QueueKey, event: dict, **context) -> None:
+        """Buffer `event` for `key`; `context` is passed to the flush (latest wins)."""
+        buffer = self._buffers.setdefault(key, _Buffer())
+        now = time.monotonic()
+        buffer.events.append(event)
+        buffer.context.update(context)
+        buffer.first_at = buffer.first_at or now
+        buffer.last_at = now
+        metrics.incr("reflection_events_queued")
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+        if len(buffer.events) >= self.max_batch:
+            buffer.timer = None
+            self._spawn(self.flush(key))
+        else:
+            delay = min(
+                self.quiet_seconds, buffer.first_at + self.max_wait_seconds - now
+            )
+            buffer.timer = self._spawn(self._flush_later(key, max(delay, 0)))
+
+    async def _flush_later(self, key: QueueKey, delay: float) -> None:
+        await asyncio.sleep(delay)
+        buffer = self._buffers[key]
+        # Past this point new events must not cancel the flush
+        if buffer.timer is asyncio.current_task():
+            buffer.timer = None
+        await self.flush(key)
+
+    async def flush(self, key: QueueKey) -> None:
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            return
+        async with buffer.lock:
+            events, context = buffer.events, buffer.context
+            if not events:
+                return
+            buffer.events, buffer.context = [], {}
+            buffer.first_at = buffer.last_at = None
+            metrics.incr("reflection_flushes")
+            metrics.incr("reflection_events_flushed", len(events))
+            try:
+                await self._flush_fn(key, events, context)
+            except Exception:
+                logger.exception(f"Reflection for {key} failed on {len(events)} events")
+
+    async def flush_all(self) -> None:
+        await asyncio.gather(*(self.flush(key) for key in list(self._buffers)))
+
+
+async def persist_event(store: BaseStore, key: QueueKey, event: dict) -> None:
+    """Add `event` for `key` to the durable queue in the store."""
+    # Time-ordered keys, so events are reflected on in arrival order
+    event_key = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+    await store.aput(DURABLE_PREFIX + key, event_key, event, index=False)
+    metrics.incr("reflection_events_persisted")
+
+
+async def pending_keys(store: BaseStore) -> list[QueueKey]:
+    namespaces = await store.alist_namespaces(prefix=DURABLE_PREFIX, limit=1000)
+    return [tuple(ns[len(DURABLE_PREFIX) :]) for ns in namespaces]
+
+
+async def load_events(store: BaseStore, key: QueueKey, limit: int = 1000) -> list[Item]:
+    """The oldest `limit` queued events for `key`, in arrival order."""
+    # Searches without a query return the newest items first, so the whole
+    # queue is read before taking the oldest events
+    items = []
+    while True:
+        page = await store.asearch(
+            DURABLE_PREFIX + key, limit=_LOAD_PAGE_SIZE, offset=len(items)
+        )
+        items.extend(page)
+        if len(page) < _LOAD_PAGE_SIZE:
+            return sorted(items, key=lambda item: item.key)[:limit]
+
+
+async def remove_events(store: BaseStore, key: QueueKey, items: list[Item]) -> None:
+    await store.abatch([PutOp(DURABLE_PREFIX + key, item.key, None) for item in items])
@@ -1,7 +1,7 @@
 from typing import Annotated, List, Literal
 from langchain_core.pydantic_v1 import BaseModel, Field
 from langgraph.graph.message import AnyMessage
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
 
 
 from langgraph.graph import add_messages
@@ -12,9 +12,14 @@ class EmailData(TypedDict):
     thread_id: str
     from_email: str
     subject: str
+    # Normalized body used in prompts, see `eaia.normalize`
     page_content: str
     send_time: str
     to_email: str
+    raw_page_content: NotRequired[str]
+    tokens_saved: NotRequired[int]
+    # List-Id header of mailing list and newsletter emails
+    list_id: NotRequired[str]
 
 
 class RespondTo(BaseModel):
@@ -22,6 +27,10 @@ class RespondTo(BaseModel):
         description="logic on WHY the response choice is the way it is", default=""
     )
     response: Literal["no", "email", "notify", "question"] = "no"
+    confidence: float = Field(
+        description="How confident you are in this response choice, from 0 to 1",
+        default=1.0,
+    )
 
 
 class ResponseEmailDraft(BaseModel):
@@ -92,6 +101,10 @@ class State(TypedDict):
     email: EmailData
     triage: Annotated[RespondTo, convert_obj]
     messages: Annotated[List[AnyMessage], add_messages]
+    # Near-identical emails from the same ingest batch, handled with `email`
+    duplicates: NotRequired[List[EmailData]]
+    # Loaded alongside the triage LLM call, see `eaia.main.prefetch`
+    prefetched: NotRequired[dict]
 
 
 email_template = """From: {author}
@@ -0,0 +1,566 @@
+"""Persistent store backed by SQLite with a local NumPy vector index.
+
+`langgraph dev` keeps its store in memory, so triage examples and learned
+prompts are lost on restart. `SqliteStore` keeps items in a SQLite database
+and their embeddings in one float32 matrix file per namespace, next to it.
+New vectors are appended to the end of the file; overwritten or deleted
+rows are only unlinked and the file is rewritten once most of it is dead.
+Each namespace's matrix is loaded once (or memory-mapped with `mmap=True`)
+and searched with a single matrix product.
+
+The server uses it through `generate_store`, see `langgraph.json`. The
+database location is taken from `EAIA_STORE_PATH`.
+"""
+
+import asyncio
+import contextlib
+import hashlib
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+import numpy as np
+from langgraph.store.base import (
+    BaseStore,
+    GetOp,
+    IndexConfig,
+    Item,
+    ListNamespacesOp,
+    MatchCondition,
+    Op,
+    PutOp,
+    Result,
+    SearchItem,
+    SearchOp,
+    ensure_embeddings,
+    get_text_at_path,
+    tokenize_path,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = ".langgraph_store/store.sqlite"
+# Rewrite a namespace's matrix file once this share of its rows is dead
+_COMPACT_DEAD_RATIO = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (prefix, key)
+);
+CREATE INDEX IF NOT EXISTS items_updated ON items (prefix, updated_at);
+CREATE TABLE IF NOT EXISTS vectors (
+    prefix TEXT NOT NULL,
+    key TEXT NOT NULL,
+    path TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    PRIMARY KEY (prefix, key, path)
+);
+CREATE TABLE IF NOT EXISTS matrices (
+    prefix TEXT PRIMARY KEY,
+    rows INTEGER NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def _to_prefix(namespace: tuple[str, ...]) -> str:
+    return ".".join(namespace)
+
+
+def _to_namespace(prefix: str) -> tuple[str, ...]:
+    return tuple(prefix.split("."))
+
+
+class _VectorIndex:
+    """Unit-normalized vectors of one namespace and the item key of each row."""
+
+    def __init__(
+        self,
+        dims: int,
+        generation: int,
+        vectors: np.ndarray,
+        owners: list[Optional[str]],
+    ):
+        self.dims = dims
+        self.generation = generation
+        self.count = len(owners)
+        self.dead = owners.count(None)
+        self.vectors = vectors
+        self.owners = owners
+
+    def append(self, rows: np.ndarray, keys: list[str]) -> None:
+        needed = self.count + len(rows)
+        if needed > len(self.vectors) or not self.vectors.flags.writeable:
+            grown = np.empty((max(needed, 2 * len(self.vectors), 64), self.dims), np.float32)
+            grown[: self.count] = self.vectors[: self.count]
+            self.vectors = grown
+        self.vectors[self.count : needed] = rows
+        self.owners.extend(keys)
+        self.count = needed
+
+    def scores(self, query: np.ndarray) -> np.ndarray:
+        return self.vectors[: self.count] @ query
+
+
+class SqliteStore(BaseStore):
+    """SQLite key/value store with namespace-partitioned vector search.
+
+    Args:
+        path: SQLite database file; matrix files go in a directory beside it.
+        index: Same as `InMemoryStore`'s `index`: `dims`, `embed` and `fields`.
+        mmap: Memory-map matrix files instead of reading them into memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        index: Optional[IndexConfig] = None,
+        mmap: bool = False,
+    ):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.vector_dir = self.path.with_suffix(".vectors")
+        self.vector_dir.mkdir(exist_ok=True)
+        self.mmap = mmap
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._indexes: dict[str, _VectorIndex] = {}
+        self._to_compact: set[str] = set()
+        self.index_config = None
+        self.embeddings = None
+        if index:
+            self.index_config = dict(index)
+            self.embeddings = ensure_embeddings(index.get("embed"))
+            self._fields = [
+                (p, tokenize_path(p) if p != "$" else p)
+                for p in (index.get("fields") or ["$"])
+            ]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    # Batch entry points
+
+    def batch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = self._embed_queries(ops)
+        texts = self._extract_texts(ops)
+        vectors = self.embeddings.embed_documents(list(texts)) if texts else []
+        return self._execute(ops, queries, texts, vectors)
+
+    async def abatch(self, ops: Iterable[Op]) -> list[Result]:
+        ops = list(ops)
+        queries = await self._aembed_queries(ops)
+        texts = self._extract_texts(ops)
+        vectors = await self.embeddings.aembed_documents(list(texts)) if texts else []
+        return await asyncio.to_thread(self._execute, ops, queries, texts, vectors)
+
+    def _execute(
+        self,
+        ops: list[Op],
+        queries: dict[str, list[float]],
+        texts: dict[str, list[tuple[tuple[str, ...], str, str]]],
+        vectors: list[list[float]],
+    ) -> list[Result]:
+        embedded = defaultdict(list)
+        for vector, targets in zip(vectors, texts.values()):
+            for namespace, key, path in targets:
+                embedded[(namespace, key)].append((path, vector))
+        results: list[Result] = []
+        with self._lock:
+            try:
+                with self._conn:
+                    for op in ops:
+                        results.append(self._apply(op, queries, embedded))
+            except BaseException:
+                # The transaction was rolled back, reload indexes from disk
+                self._indexes.clear()
+                self._to_compact.clear()
+                raise
+            while self._to_compact:
+                self._compact(self._to_compact.pop())
+        return results
+
+    def _apply(self, op: Op, queries: dict, embedded: dict) -> Result:
+        if isinstance(op, GetOp):
+            return self._get(op.namespace, op.key)
+        elif isinstance(op, SearchOp):
+            return self._search(op, queries.get(op.query))
+        elif isinstance(op, ListNamespacesOp):
+            return self._list_namespaces(op)
+        elif isinstance(op, PutOp):
+            self._put(op, embedded.get((op.namespace, op.key), []))
+            return None
+        raise ValueError(f"Unknown operation type: {type(op)}")
+
+    # Embedding
+
+    def _queries(self, ops: list[Op]) -> list[str]:
+        if not self.embeddings:
+            return []
+        return list({op.query for op in ops if isinstance(op, SearchOp) and op.query})
+
+    def _embed_queries(self, ops: list[Op]) -> dict[str, list[float]]:
+        queries = self._queries(ops)
+        return {q: self.embeddings.embed_query(q) for q in queries}
+
+    async def _aembed_queries(self, ops: list[Op]) -> dict[str, list[float]]:
+        queries = self._queries(ops)
+        results = await asyncio.gather(*(self.embeddings.aembed_query(q) for q in queries))
+        return dict(zip(queries, results))
+
+    def _extract_texts(
+        self, ops: list[Op]
+    ) -> dict[str, list[tuple[tuple[str, ...], str, str]]]:
+        to_embed = defaultdict(list)
+        if not self.embeddings:
+            return to_embed
+        puts = {(op.namespace, op.key): op for op in ops if isinstance(op, PutOp)}
+        for op in puts.values():
+            if op.value is None or op.index is False:
+                continue
+            if op.index is None:
+                paths = self._fields
+            else:
+                paths = [(p, tokenize_path(p)) for p in op.index]
+            for path, field in paths:
+                found = get_text_at_path(op.value, field)
+                for i, text in enumerate(found):
+                    suffix = f"{path}.{i}" if len(found) > 1 else path
+                    to_embed[text].append((op.namespace, op.key, suffix))
+        return to_embed
+
+    # Operations, called with the lock held
+
+    def _row_to_item(self, prefix: str, row: tuple, cls=Item, **kwargs) -> Item:
+        key, value, created_at, updated_at = row
+        return cls(
+            namespace=_to_namespace(prefix),
+            key=key,
+            value=json.loads(value),
+            created_at=datetime.fromisoformat(created_at),
+            updated_at=datetime.fromisoformat(updated_at),
+            **kwargs,
+        )
+
+    def _get(self, namespace: tuple[str, ...], key: str) -> Optional[Item]:
+        prefix = _to_prefix(namespace)
+        row = self._conn.execute(
+            "SELECT key, value, created_at, updated_at FROM items"
+            " WHERE prefix = ? AND key = ?",
+            (prefix, key),
+        ).fetchone()
+        return self._row_to_item(prefix, row) if row else None
+
+    def _put(self, op: PutOp, vectors: list[tuple[str, list[float]]]) -> None:
+        prefix = _to_prefix(op.namespace)
+        if op.value is None:
+            self._conn.execute(
+                "DELETE FROM items WHERE prefix = ? AND key = ?", (prefix, op.key)
+            )
+            self._unlink_vectors(prefix, op.key)
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        self._conn.execute(
+            "INSERT INTO items (prefix, key, value, created_at, updated_at)"
+            " VALUES (?, ?, ?, ?, ?)"
+            " ON CONFLICT (prefix, key) DO UPDATE SET"
+            " value = excluded.value, updated_at = excluded.updated_at",
+            (prefix, op.key, json.dumps(op.value), now, now),
+        )
+        if op.index is False or not self.embeddings:
+            return
+        self._unlink_vectors(prefix, op.key)
+        if vectors:
+            self._append_vectors(prefix, op.key, vectors)
+
+    def _search(self, op: SearchOp, query: Optional[list[float]]) -> list[SearchItem]:
+        prefixes = [
+            prefix
+            for prefix in self._prefixes()
+            if _to_namespace(prefix)[: len(op.namespace_prefix)] == op.namespace_prefix
+        ]
+        if query is None:
+            return self._search_recent(op, prefixes)
+
+        wanted = op.offset + op.limit
+        query_vec = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query_vec)
+        if norm:
+            query_vec = query_vec / norm
+        scored: list[tuple[float, str, str]] = []
+        for prefix in prefixes:
+            index = self._get_index(prefix)
+            if index is None or not index.count:
+                continue
+            best: dict[str, float] = {}
+            for row, score in enumerate(index.scores(query_vec).tolist()):
+                key = index.owners[row]
+                # Max pooling over an item's indexed fields
+                if key is not None and score > best.get(key, -2.0):
+                    best[key] = score
+            scored.extend((score, prefix, key) for key, score in best.items())
+        scored.sort(key=lambda s: s[0], reverse=True)
+
+        results: list[SearchItem] = []
+        for score, prefix, key in scored:
+            item = self._get(_to_namespace(prefix), key)
+            if item is None or not _matches(item.value, op.filter):
+                continue
+            results.append(
+                SearchItem(
+                    namespace=item.namespace,
+                    key=item.key,
+                    value=item.value,
+                    created_at=item.created_at,
+                    updated_at=item.updated_at,
+                    score=score,
+                )
+            )
+            if len(results) >= wanted:
+                break
+        if len(results) < wanted:
+            # Fill with items that have no vectors, like InMemoryStore
+            seen = {(r.namespace, r.key) for r in results}
+            seen.update((_to_namespace(p), k) for _, p, k in scored)
+            for item in self._recent(prefixes):
+                if (item.namespace, item.key) in seen or not _matches(
+                    item.value, op.filter
+                ):
+                    continue
+                results.append(item)
+                if len(results) >= wanted:
+                    break
+        return results[op.offset :]
+
+    def _search_recent(self, op: SearchOp, prefixes: list[str]) -> list[SearchItem]:
+        if not op.filter:
+            return list(self._recent(prefixes, op.limit, op.offset))
+        # Filters are matched on decoded values, so rows are read until
+        # enough of them match
+        matching = (
+            item for item in self._recent(prefixes) if _matches(item.value, op.filter)
+        )
+        return list(itertools.islice(matching, op.offset, op.offset + op.limit))
+
+    def _recent(
+        self, prefixes: list[str], limit: int = -1, offset: int = 0
+    ) -> Iterator[SearchItem]:
+        """Items in `prefixes`, newest first; rows are read as they are consumed."""
+        if not prefixes:
+            return
+        placeholders = ", ".join("?" * len(prefixes))
+        rows = self._conn.execute(
+            "SELECT prefix, key, value, created_at, updated_at FROM items"
+            f" WHERE prefix IN ({placeholders}) ORDER BY updated_at DESC"
+            " LIMIT ? OFFSET ?",
+            (*prefixes, limit, offset),
+        )
+        for prefix, *row in rows:
+            yield self._row_to_item(prefix, row, SearchItem)
+
+    def _prefixes(self) -> list[str]:
+        return [row[0] for row in self._conn.execute("SELECT DISTINCT prefix FROM items")]
+
+    def _list_namespaces(self, op: ListNamespacesOp) -> list[tuple[str, ...]]:
+        namespaces = [_to_namespace(prefix) for prefix in self._prefixes()]
+        if op.match_conditions:
+            namespaces = [
+                ns
+                for ns in namespaces
+                if all(_does_match(c, ns) for c in op.match_conditions)
+            ]
+        if op.max_depth is not None:
+            namespaces = sorted({ns[: op.max_depth] for ns in namespaces})
+        else:
+            namespaces = sorted(namespaces)
+        return namespaces[op.offset : op.offset + op.limit]
+
+    # Vector files
+
+    def _matrix_path(self, prefix: str, generation: int) -> Path:
+        digest = hashlib.sha1(prefix.encode("utf-8")).hexdigest()
+        return self.vector_dir / f"{digest}.{generation}.f32"
+
+    def _get_index(self, prefix: str) -> Optional[_VectorIndex]:
+        if prefix in self._indexes:
+            return self._indexes[prefix]
+        if not self.index_config:
+            return None
+        dims = self.index_config["dims"]
+        rows, generation = self._matrix_info(prefix)
+        owners: list[Optional[str]] = [None] * rows
+        for key, row in self._conn.execute(
+            "SELECT key, row FROM vectors WHERE prefix = ?", (prefix,)
+        ):
+            owners[row] = key
+        path = self._matrix_path(prefix, generation)
+        if not rows:
+            vectors = np.empty((0, dims), np.float32)
+        elif self.mmap:
+            vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dims))
+        else:
+            vectors = np.fromfile(path, dtype=np.float32, count=rows * dims)
+            vectors = vectors.reshape(rows, dims)
+        index = _VectorIndex(dims, generation, vectors, owners)
+        self._indexes[prefix] = index
+        return index
+
+    def _matrix_info(self, prefix: str) -> tuple[int, int]:
+        row = self._conn.execute(
+            "SELECT rows, generation FROM matrices WHERE prefix = ?", (prefix,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (0, 0)
+
+    def _append_vectors(
+        self, prefix: str, key: str, vectors: list[tuple[str, list[float]]]
+    ) -> None:
+        dims = self.index_config["dims"]
+        matrix = np.asarray([vector for _, vector in vectors], dtype=np.float32)
+        if matrix.shape[1] != dims:
+            raise ValueError(
+                f"Embedding has {matrix.shape[1]} dimensions, index expects {dims}"
+            )
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.where(norms == 0, 1, norms)
+        index = self._get_index(prefix)
+        start = index.count
+        # Truncate any rows left by a write whose transaction did not commit
+        with open(self._matrix_path(prefix, index.generation), "ab") as f:
+            f.truncate(start * dims * 4)
+            f.write(matrix.tobytes())
+        index.append(matrix, [key] * len(vectors))
+        self._conn.executemany(
+            "INSERT INTO vectors (prefix, key, path, row) VALUES (?, ?, ?, ?)",
+            [(prefix, key, path, start + i) for i, (path, _) in enumerate(vectors)],
+        )
+        self._conn.execute(
+            "INSERT INTO matrices (prefix, rows) VALUES (?, ?)"
+            " ON CONFLICT (prefix) DO UPDATE SET rows = excluded.rows",
+            (prefix, index.count),
+        )
+
+    def _unlink_vectors(self, prefix: str, key: str) -> None:
+        rows = [
+            row
+            for (row,) in self._conn.execute(
+                "SELECT row FROM vectors WHERE prefix = ? AND key = ?", (prefix, key)
+            )
+        ]
+        if not rows:
+            return
+        self._conn.execute(
+            "DELETE FROM vectors WHERE prefix = ? AND key = ?", (prefix, key)
+        )
+        index = self._get_index(prefix)
+        for row in rows:
+            index.owners[row] = None
+        index.dead += len(rows)
+        if index.dead > _COMPACT_DEAD_RATIO * index.count:
+            self._to_compact.add(prefix)
+
+    def _compact(self, prefix: str) -> None:
+        """Rewrite a namespace's live vectors into a new matrix file."""
+        index = self._indexes[prefix]
+        live = [row for row, key in enumerate(index.owners) if key is not None]
+        remap = {old: new for new, old in enumerate(live)}
+        vectors = np.ascontiguousarray(index.vectors[live], dtype=np.float32)
+        generation = index.generation + 1
+        vectors.tofile(self._matrix_path(prefix, generation))
+        # The old file stays valid until the new generation is committed
+        with self._conn:
+            moved = self._conn.execute(
+                "SELECT key, path, row FROM vectors WHERE prefix = ?", (prefix,)
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE vectors SET row = ? WHERE prefix = ? AND key = ? AND path = ?",
+                [(remap[row], prefix, key, p) for key, p, row in moved],
+            )
+            self._conn.execute(
+                "UPDATE matrices SET rows = ?, generation = ? WHERE prefix = ?",
+                (len(live), generation, prefix),
+            )
+        self._matrix_path(prefix, index.generation).unlink(missing_ok=True)
+        self._indexes[prefix] = _VectorIndex(
+            index.dims, generation, vectors, [index.owners[row] for row in live]
+        )
+
+
+def _matches(value: dict, filter: Optional[dict[str, Any]]) -> bool:
+    if not filter:
+        return True
+    return all(_compare(value.get(k), v) for k, v in filter.items())
+
+
+def _compare(value: Any, expected: Any) -> bool:
+    if isinstance(expected, dict):
+        if any(k.startswith("$") for k in expected):
+            return all(_apply_operator(value, op, arg) for op, arg in expected.items())
+        return isinstance(value, dict) and _matches(value, expected)
+    return value == expected
+
+
+def _apply_operator(value: Any, operator: str, arg: Any) -> bool:
+    if operator == "$eq":
+        return value == arg
+    if operator == "$ne":
+        return value != arg
+    if value is None:
+        return False
+    if operator == "$gt":
+        return value > arg
+    if operator == "$gte":
+        return value >= arg
+    if operator == "$lt":
+        return value < arg
+    if operator == "$lte":
+        return value <= arg
+    raise ValueError(f"Unsupported operator: {operator}")
+
+
+def _does_match(condition: MatchCondition, namespace: tuple[str, ...]) -> bool:
+    path = condition.path
+    if len(namespace) < len(path):
+        return False
+    if condition.match_type == "prefix":
+        pairs = zip(namespace, path)
+    elif condition.match_type == "suffix":
+        pairs = zip(reversed(namespace), reversed(path))
+    else:
+        raise ValueError(f"Unsupported match type: {condition.match_type}")
+    return all(p == "*" or n == p for n, p in pairs)
+
+
+@contextlib.asynccontextmanager
+async def generate_store():
+    """Store factory for the LangGraph server, see `langgraph.json`."""
+    from eaia.loop_watchdog import start_watchdog, stop_watchdog
+    from eaia.main.embeddings import aembed_texts
+
+    # The store lives as long as the server, so debug tooling starts here
+    start_watchdog()
+    store = SqliteStore(
+        os.environ.get("EAIA_STORE_PATH", DEFAULT_STORE_PATH),
+        index={"dims": 1536, "embed": aembed_texts},
+        mmap=os.environ.get("EAIA_STORE_MMAP", "").lower() in ("1", "true"),
+    )
+    try:
+        yield store
+    finally:
+        store.close()
+        stop_watchdog()
@@ -0,0 +1,28 @@
+"""Token estimation for prompt budgeting."""
+
+import logging
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # tiktoken fetches encodings on first use, which fails offline
+        logger.info(f"Falling back to character-based token estimates: {e}")
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in `text` for gpt-4o class models."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
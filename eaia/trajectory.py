@@ -0,0 +1,85 @@
+"""Compact renderings of agent trajectories for reflection prompts.
+
+A raw trajectory repeats the email in several messages and can carry long
+tool outputs such as calendar dumps from `find_meeting_time`.
+`compact_trajectory` renders one line block per message, keeps long
+paragraphs only the first time they appear, truncates tool outputs and
+drops the oldest middle messages until the result fits a token budget.
+"""
+
+import json
+import os
+
+from langchain_core.messages import ToolMessage, convert_to_messages
+
+from eaia import metrics
+from eaia.tokens import estimate_tokens
+
+TRAJECTORY_TOKEN_BUDGET = int(os.environ.get("EAIA_TRAJECTORY_TOKEN_BUDGET", 3000))
+TOOL_OUTPUT_CHARS = 600
+TOOL_ARGS_CHARS = 1000
+# Paragraphs at least this long are replaced by a reference when repeated
+MIN_DEDUP_CHARS = 200
+
+
+def _truncate(text: str, limit: int) -> str:
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} more characters]"
+
+
+def _content(message) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in message.content
+    )
+
+
+def _render(index: int, message, seen: dict[str, int]) -> str:
+    paragraphs = []
+    for paragraph in _content(message).split("\n\n"):
+        stripped = paragraph.strip()
+        if len(stripped) >= MIN_DEDUP_CHARS:
+            if stripped in seen:
+                paragraphs.append(f"[same text as message {seen[stripped]}]")
+                continue
+            seen[stripped] = index
+        paragraphs.append(paragraph)
+    content = "\n\n".join(paragraphs)
+    if isinstance(message, ToolMessage):
+        content = _truncate(content, TOOL_OUTPUT_CHARS)
+    lines = [f"[{index}] {message.type}: {content}"]
+    for call in getattr(message, "tool_calls", None) or []:
+        args = _truncate(json.dumps(call["args"]), TOOL_ARGS_CHARS)
+        lines.append(f"    -> {call['name']}({args})")
+    return "\n".join(lines)
+
+
+def compact_trajectory(messages, budget: int = TRAJECTORY_TOKEN_BUDGET) -> str:
+    """Render `messages` (message objects or dicts) within `budget` tokens."""
+    messages = convert_to_messages(messages)
+    seen: dict[str, int] = {}
+    blocks = [_render(i, m, seen) for i, m in enumerate(messages, start=1)]
+    tokens = [estimate_tokens(b) for b in blocks]
+    # The first message holds the email and the last the agent's final
+    # action, so messages in between are dropped first
+    dropped = 0
+    while sum(tokens) > budget and len(blocks) > 2:
+        blocks.pop(1)
+        tokens.pop(1)
+        dropped += 1
+    if dropped:
+        blocks.insert(1, f"[{dropped} earlier messages omitted]")
+    trajectory = "\n".join(blocks)
+    if estimate_tokens(trajectory) > budget:
+        # Roughly four characters per token
+        trajectory = _truncate(trajectory, budget * 4)
+
+    raw_tokens = sum(estimate_tokens(m.pretty_repr()) for m in messages)
+    metrics.incr(
+        "reflection_trajectory_tokens_saved",
+        max(raw_tokens - estimate_tokens(trajectory), 0),
+    )
+    return trajectory
@@ -0,0 +1,111 @@
+"""Deduplicate and cap an assistant's stored triage examples.
+
+Examples saved before content-addressed keys were introduced live under
+random keys, often several per email. This moves each example to its
+content key (keeping the most recently updated copy) and then evicts
+near-duplicates and the oldest examples down to the cap.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from langgraph_sdk import get_client
+
+from eaia.main.embeddings import build_embedding_text
+from eaia.main.examples import (
+    MAX_TRIAGE_EXAMPLES,
+    Example,
+    example_key,
+    example_value,
+    select_evictions,
+)
+
+PAGE_SIZE = 100
+
+
+async def main(
+    url: Optional[str] = None,
+    assistant_id: str = "default",
+    cap: int = MAX_TRIAGE_EXAMPLES,
+    dry_run: bool = False,
+):
+    if url is None:
+        client = get_client(url="http://127.0.0.1:2024")
+    else:
+        client = get_client(url=url)
+    namespace = [assistant_id, "triage_examples"]
+    items = []
+    while True:
+        page = await client.store.search_items(
+            namespace, limit=PAGE_SIZE, offset=len(items)
+        )
+        items.extend(page["items"])
+        if len(page["items"]) < PAGE_SIZE:
+            break
+
+    latest = {}
+    for item in sorted(items, key=lambda i: i["updated_at"]):
+        latest[example_key(item["value"]["input"])] = item
+    examples = [
+        Example(key, build_embedding_text(i["value"]["input"]), i["updated_at"])
+        for key, i in latest.items()
+    ]
+    evicted = set(select_evictions(examples, cap))
+    print(
+        f"{len(items)} examples: {len(latest)} unique, "
+        f"{len(evicted)} over the cap of {cap}"
+    )
+    if dry_run:
+        return
+
+    for key, item in latest.items():
+        # Rewritten unless already stored under its content key with the
+        # metadata few-shot retrieval filters on
+        if key in evicted or (item["key"] == key and "sender" in item["value"]):
+            continue
+        value = example_value(item["value"]["input"], item["value"]["triage"])
+        await client.store.put_item(namespace, key, value, index=["embedding_text"])
+    # Everything not kept under its content key: duplicates, examples under
+    # random keys (moved above) and evicted examples
+    existing = {i["key"] for i in items}
+    removed = (existing - set(latest)) | (existing & evicted)
+    for key in removed:
+        await client.store.delete_item(namespace, key)
+    print(f"Removed {len(removed)} stored examples")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL to run against",
+    )
+    parser.add_argument(
+        "--assistant-id",
+        type=str,
+        default="default",
+        help="The assistant whose triage examples to compact",
+    )
+    parser.add_argument(
+        "--cap",
+        type=int,
+        default=MAX_TRIAGE_EXAMPLES,
+        help="Maximum number of examples to keep",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only report what would be removed",
+    )
+
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            url=args.url,
+            assistant_id=args.assistant_id,
+            cap=args.cap,
+            dry_run=args.dry_run,
+        )
+    )
@@ -0,0 +1,105 @@
+"""List the revisions of a learned prompt, or roll it back to one of them.
+
+Rollbacks run `prompt_rollback_graph` on the server, so they go through the
+same compare-and-set write as reflection and fail if the prompt changed
+after the history was read.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+from langgraph_sdk import get_client
+
+PAGE_SIZE = 100
+
+
+async def main(
+    url: Optional[str] = None,
+    assistant_id: str = "default",
+    key: str = "rewrite_instructions",
+    rollback: Optional[int] = None,
+):
+    if url is None:
+        client = get_client(url="http://127.0.0.1:2024")
+    else:
+        client = get_client(url=url)
+    namespace = [assistant_id, "prompt_history", key]
+    items = []
+    while True:
+        page = await client.store.search_items(
+            namespace, limit=PAGE_SIZE, offset=len(items)
+        )
+        items.extend(page["items"])
+        if len(page["items"]) < PAGE_SIZE:
+            break
+    revisions = sorted((i["value"] for i in items), key=lambda r: r["version"])
+    if not revisions:
+        print(f"No history for {key}")
+        return
+
+    if rollback is None:
+        for r in revisions:
+            source = r.get("source", "-")
+            if "restored_version" in r:
+                source += f" of v{r['restored_version']}"
+            print(f"v{r['version']} {r['created_at']} {source}, {r['tokens']} tokens")
+            for feedback in r.get("feedback", []):
+                print(f"    {feedback}")
+        return
+
+    current = revisions[-1]["version"]
+    result = await client.runs.wait(
+        None,
+        "prompt_rollback_graph",
+        input={
+            "assistant_key": assistant_id,
+            "prompt_key": key,
+            "version": rollback,
+            "expected_version": current,
+        },
+    )
+    if result.get("restored_as") is None:
+        print(
+            f"{key} changed to v{result.get('current_version')} after v{current} "
+            "was read, run the rollback again"
+        )
+        return
+    print(f"Restored {key} v{rollback} as v{result['restored_as']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL to run against",
+    )
+    parser.add_argument(
+        "--assistant-id",
+        type=str,
+        default="default",
+        help="The assistant whose prompt to show",
+    )
+    parser.add_argument(
+        "--key",
+        type=str,
+        default="rewrite_instructions",
+        help="The prompt to show, e.g. rewrite_instructions or random_preferences",
+    )
+    parser.add_argument(
+        "--rollback",
+        type=int,
+        default=None,
+        help="Restore this version as the current prompt",
+    )
+
+    args = parser.parse_args()
+    asyncio.run(
+        main(
+            url=args.url,
+            assistant_id=args.assistant_id,
+            key=args.key,
+            rollback=args.rollback,
+        )
+    )
@@ -3,6 +3,7 @@ import asyncio
 from typing import Optional
 from eaia.gmail import fetch_group_emails
 from eaia.main.config import get_config
+from eaia.main.near_duplicates import group_near_duplicates
 from langgraph_sdk import get_client
 import httpx
 import uuid
@@ -30,6 +31,7 @@ async def main(
         )
 
     # TODO: This really should be async
+    pending = {}
     for email in fetch_group_emails(
         email_address,
         minutes_since=minutes_since,
@@ -61,11 +63,16 @@ async def main(
                 else:
                     continue
         await client.threads.update(thread_id, metadata={"email_id": email["id"]})
+        pending[email["id"]] = (thread_id, email)
 
+    # Near-identical emails from one sender in one thread are triaged and
+    # surfaced as one; other threads reuse the decision through the
+    # near-duplicate clusters (see `eaia.main.near_duplicates`)
+    for group in group_near_duplicates([e for _, e in pending.values()]):
         await client.runs.create(
-            thread_id,
+            pending[group[0]["id"]][0],
             "main",
-            input={"email": email},
+            input={"email": group[0], "duplicates": group[1:]},
             multitask_strategy="rollback",
         )
 
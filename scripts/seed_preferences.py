@@ -0,0 +1,56 @@
+"""Seed an assistant's prompt memories with the defaults from its config.
+
+Run this once when creating an assistant, so the request path never has to
+write defaults to the store.
+"""
+import argparse
+import asyncio
+from typing import Optional
+
+import httpx
+from langgraph_sdk import get_client
+
+from eaia.main.config import get_config
+from eaia.main.preferences import PREFERENCE_DEFAULTS
+
+
+async def main(url: Optional[str] = None, assistant_id: str = "default"):
+    if url is None:
+        client = get_client(url="http://127.0.0.1:2024")
+    else:
+        client = get_client(url=url)
+    prompt_config = get_config({"configurable": {}})
+    namespace = [assistant_id]
+    for key, default_key in PREFERENCE_DEFAULTS.items():
+        try:
+            item = await client.store.get_item(namespace, key)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                raise e
+            item = None
+        if item and "data" in item["value"]:
+            print(f"{key}: already set")
+            continue
+        await client.store.put_item(
+            namespace, key, {"data": prompt_config[default_key]}, index=False
+        )
+        print(f"{key}: seeded")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL to run against",
+    )
+    parser.add_argument(
+        "--assistant-id",
+        type=str,
+        default="default",
+        help="The assistant whose prompt memories to seed",
+    )
+
+    args = parser.parse_args()
+    asyncio.run(main(url=args.url, assistant_id=args.assistant_id))
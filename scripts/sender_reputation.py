@@ -0,0 +1,57 @@
+"""Print per-sender triage history and how many triage calls it saved."""
+import argparse
+import asyncio
+from typing import Optional
+
+from langgraph_sdk import get_client
+
+from eaia.main.reputation import get_reusable_decision
+
+PAGE_SIZE = 100
+
+
+async def main(url: Optional[str] = None, assistant_id: str = "default"):
+    if url is None:
+        client = get_client(url="http://127.0.0.1:2024")
+    else:
+        client = get_client(url=url)
+    namespace = [assistant_id, "sender_reputation"]
+    items = []
+    while True:
+        page = await client.store.search_items(
+            namespace, limit=PAGE_SIZE, offset=len(items)
+        )
+        items.extend(page["items"])
+        if len(page["items"]) < PAGE_SIZE:
+            break
+
+    items.sort(key=lambda i: i["value"].get("shortcuts", 0), reverse=True)
+    for item in items:
+        record = item["value"]
+        decision = get_reusable_decision(record) or "-"
+        counts = ", ".join(f"{k}={v}" for k, v in sorted(record["counts"].items()))
+        print(
+            f"{item['key']}: {counts}; streak {record['streak']}; "
+            f"reused {decision} {record.get('shortcuts', 0)} times"
+        )
+    total = sum(i["value"].get("shortcuts", 0) for i in items)
+    print(f"{len(items)} senders, {total} triage calls skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--url",
+        type=str,
+        default=None,
+        help="URL to run against",
+    )
+    parser.add_argument(
+        "--assistant-id",
+        type=str,
+        default="default",
+        help="The assistant whose sender history to show",
+    )
+
+    args = parser.parse_args()
+    asyncio.run(main(url=args.url, assistant_id=args.assistant_id))
@@ -1,4 +1,8 @@
-"""Set up a cron job that runs every 10 minutes to check for emails"""
+"""Set up a cron job that runs every 10 minutes to check for emails
+
+With --reflection-schedule, also schedule batch reflection on the feedback
+queued while EAIA_REFLECTION_MODE=batch.
+"""
 import argparse
 import asyncio
 from typing import Optional
@@ -8,6 +12,8 @@ from langgraph_sdk import get_client
 async def main(
     url: Optional[str] = None,
     minutes_since: int = 60,
+    reflection_schedule: Optional[str] = None,
+    reflection_min_spare: float = 0.0,
 ):
     if url is None:
         client = get_client(url="http://127.0.0.1:2024")
@@ -16,6 +22,12 @@ async def main(
             url=url
         )
     await client.crons.create("cron", schedule="*/10 * * * *", input={"minutes_since": minutes_since})
+    if reflection_schedule:
+        await client.crons.create(
+            "batch_reflection_graph",
+            schedule=reflection_schedule,
+            input={"min_spare_capacity": reflection_min_spare},
+        )
 
 
 
@@ -33,11 +45,25 @@ if __name__ == "__main__":
         default=60,
         help="Only process emails that are less than this many minutes old.",
     )
+    parser.add_argument(
+        "--reflection-schedule",
+        type=str,
+        default=None,
+        help="Cron schedule for batch reflection, e.g. '0 3 * * *' for nightly",
+    )
+    parser.add_argument(
+        "--reflection-min-spare",
+        type=float,
+        default=0.0,
+        help="Skip batch reflection unless this fraction of the rate limit is unused",
+    )
 
     args = parser.parse_args()
     asyncio.run(
         main(
             url=args.url,
             minutes_since=args.minutes_since,
+            reflection_schedule=args.reflection_schedule,
+            reflection_min_spare=args.reflection_min_spare,
         )
     )
\ No newline at end of file
@@ -0,0 +1,59 @@
+"""Fixtures shared by the unit tests."""
+
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+# One embedding dimension per keyword, so similarity is easy to reason about
+KEYWORDS = ["invoice", "meeting", "newsletter", "payment"]
+
+
+@pytest.fixture
+def make_email():
+    """Factory for emails; `i` sets the ids and date, other fields override."""
+
+    def make(
+        i=1,
+        body="Can we meet on Tuesday to go over the launch plan?",
+        sender="Jane <jane@example.com>",
+        subject="Launch",
+        **fields,
+    ):
+        return {
+            "id": f"msg-{i}",
+            "thread_id": f"thread-{i}",
+            "send_time": f"2024-01-0{i % 9 + 1}T00:00:00",
+            "from_email": sender,
+            "to_email": "me@mine.com",
+            "subject": subject,
+            "page_content": body,
+            **fields,
+        }
+
+    return make
+
+
+@pytest.fixture
+def examples_namespace():
+    return ("jvc", "triage_examples")
+
+
+@pytest.fixture
+def embedded():
+    """Texts passed to the keyword embedding, in order."""
+    return []
+
+
+@pytest.fixture
+def keyword_index(embedded):
+    """Store index config with a keyword embedding instead of a model."""
+
+    def embed(texts):
+        embedded.extend(texts)
+        return [[float(w in t.lower()) for w in KEYWORDS] for t in texts]
+
+    return {"dims": len(KEYWORDS), "embed": embed}
+
+
+@pytest.fixture
+def keyword_store(keyword_index):
+    return InMemoryStore(index=keyword_index)
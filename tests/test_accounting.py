@@ -0,0 +1,96 @@
+"""Unit tests for per-node LLM usage accounting."""
+
+from typing import TypedDict
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langgraph.graph import START, StateGraph
+
+from eaia.main.accounting import UsageTracker, estimate_cost
+
+
+def test_estimate_cost_uses_base_model_price():
+    assert estimate_cost("gpt-4o-2024-08-06", 1_000_000, 0) == 2.50
+    assert estimate_cost("gpt-4o-mini", 0, 1_000_000) == 0.60
+    assert estimate_cost("unknown", 1000, 1000) == 0.0
+
+
+async def test_calls_are_accounted_to_node_with_retries():
+    tracker = UsageTracker()
+    usage = {
+        "input_tokens": 1000,
+        "output_tokens": 10,
+        "total_tokens": 1010,
+        "input_token_details": {"cache_read": 512},
+    }
+
+    class State(TypedDict):
+        done: bool
+
+    async def draft_response(state):
+        llm = GenericFakeChatModel(
+            messages=iter([AIMessage("", usage_metadata=usage)] * 2),
+            callbacks=[tracker],
+        )
+        await llm.ainvoke("first attempt")
+        await llm.ainvoke("retry")
+        return {"done": True}
+
+    builder = StateGraph(State)
+    builder.add_node(draft_response)
+    builder.add_edge(START, "draft_response")
+    await builder.compile().ainvoke(
+        {"done": False}, {"configurable": {"assistant_id": "jvc"}}
+    )
+
+    run = tracker.get_run_usage("local")
+    assert run["assistant_id"] == "jvc"
+    totals = run["nodes"]["draft_response"]
+    assert totals["calls"] == 2
+    assert totals["retries"] == 1
+    assert totals["prompt_tokens"] == 2000
+    assert totals["cached_tokens"] == 1024
+
+
+async def test_thread_usage_is_written_once_per_burst(monkeypatch):
+    from eaia.main import accounting
+
+    writes = []
+
+    async def update_thread(thread_id, usage):
+        writes.append((thread_id, usage["total"]["calls"]))
+
+    monkeypatch.setattr(accounting, "_update_thread", update_thread)
+    monkeypatch.setattr(accounting, "THREAD_WRITE_DELAY", 0.01)
+    tracker = UsageTracker()
+    llm = GenericFakeChatModel(
+        messages=iter([AIMessage("")] * 3), callbacks=[tracker]
+    )
+    for _ in range(3):
+        await llm.ainvoke("hi", {"metadata": {"thread_id": "t1"}})
+    await tracker.flush()
+    assert writes == [("t1", 3)]
+
+
+async def test_usage_finishing_as_the_writer_exits_is_written(monkeypatch):
+    import asyncio
+
+    from eaia.main import accounting
+
+    writes = []
+    tracker = UsageTracker()
+
+    async def update_thread(thread_id, usage):
+        writes.append(usage["total"]["calls"])
+        if len(writes) == 1:
+            # Runs after the writer returns but before its done callback
+            asyncio.get_running_loop().call_soon(
+                tracker._write_thread_metadata, "t1", "r1", {"total": {"calls": 2}}
+            )
+
+    monkeypatch.setattr(accounting, "_update_thread", update_thread)
+    monkeypatch.setattr(accounting, "THREAD_WRITE_DELAY", 0.01)
+    tracker._write_thread_metadata("t1", "r1", {"total": {"calls": 1}})
+    await asyncio.sleep(0.05)
+    await tracker.flush()
+    assert writes == [1, 2]
@@ -0,0 +1,85 @@
+"""Unit tests for the free-slot engine."""
+
+from datetime import date, datetime, time, timedelta
+
+import pytest
+import pytz
+
+from eaia.main.availability import (
+    SchedulingSettings,
+    busy_intervals,
+    calendar_days,
+    format_slots,
+    free_slots,
+    merge_intervals,
+    parse_working_hours,
+)
+
+TZ = pytz.timezone("CET")
+
+
+def at(day: int, hour: int, minute: int = 0) -> datetime:
+    # June 2024: the 3rd is a Monday, the 9th a Sunday
+    return TZ.localize(datetime(2024, 6, day, hour, minute))
+
+
+SETTINGS = SchedulingSettings(
+    hours=parse_working_hours("Mon-Sat 09:00-19:00"),
+    min_length=timedelta(hours=1),
+    buffer=timedelta(minutes=30),
+    tz=TZ,
+)
+
+
+def test_parse_working_hours():
+    hours = parse_working_hours("Mon-Sat 09:00-19:00")
+    assert hours.days == frozenset(range(6))
+    assert (hours.start, hours.end) == (time(9), time(19))
+    assert parse_working_hours("Saturday-Monday 10:00-12:00").days == {5, 6, 0}
+    assert parse_working_hours("Tue 8:30-12:00").days == {1}
+    with pytest.raises(ValueError):
+        parse_working_hours("weekdays")
+    with pytest.raises(ValueError):
+        parse_working_hours("Mon-Fri 17:00-09:00")
+
+
+def test_merge_intervals():
+    merged = merge_intervals([(at(3, 13), at(3, 14)), (at(3, 9), at(3, 10)), (at(3, 9, 30), at(3, 11))])
+    assert merged == [(at(3, 9), at(3, 11)), (at(3, 13), at(3, 14))]
+
+
+def test_busy_intervals_skip_free_events_and_block_all_day_events():
+    events = [
+        {"start": {"dateTime": "2024-06-03T08:00:00Z"}, "end": {"dateTime": "2024-06-03T09:00:00Z"}},
+        {"start": {"dateTime": "2024-06-03T12:00:00Z"}, "end": {"dateTime": "2024-06-03T13:00:00Z"}, "transparency": "transparent"},
+        # All-day events are marked free by default but still block the day
+        {"start": {"date": "2024-06-04"}, "end": {"date": "2024-06-05"}, "transparency": "transparent"},
+        {"start": {"date": "2024-06-07"}, "end": {"date": "2024-06-08"}, "status": "cancelled"},
+        # Working locations are all-day events that do not make the user busy
+        {"start": {"date": "2024-06-03"}, "end": {"date": "2024-06-04"}, "transparency": "transparent", "eventType": "workingLocation"},
+        {"start": {"date": "2024-06-06"}, "end": {"date": "2024-06-07"}, "eventType": "outOfOffice"},
+    ]
+    assert busy_intervals(events, TZ) == [
+        (at(3, 10), at(3, 11)),
+        (at(4, 0), at(5, 0)),
+        (at(6, 0), at(7, 0)),
+    ]
+
+
+def test_free_slots_apply_hours_buffer_and_min_length():
+    busy = [
+        (at(3, 10), at(3, 11)),
+        # Leaves 11:30-12:00 between buffers, shorter than an hour
+        (at(3, 12, 30), at(3, 15)),
+        (at(4, 0), at(5, 0)),
+    ]
+    slots = free_slots(busy, at(3, 8), at(10, 12), SETTINGS)
+    assert slots[:2] == [(at(3, 15, 30), at(3, 19)), (at(5, 9), at(5, 19))]
+    # 09:00-09:30 before the first meeting is too short as well
+    assert all(start.day not in (4, 9) for start, _ in slots)
+    assert slots[-1] == (at(10, 9), at(10, 12))
+    assert "Monday 03 June: 15:30-19:00" in format_slots(slots, TZ)
+
+
+def test_calendar_days():
+    assert calendar_days(date(2024, 12, 30), 3) == ["30-12-2024", "31-12-2024", "01-01-2025"]
@@ -0,0 +1,83 @@
+"""Unit tests for range fetches and caching in the calendar layer."""
+
+import pytest
+
+from eaia import gmail
+
+
+class _Request:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return self.result
+
+
+class FakeCalendar:
+    def __init__(self, events):
+        self.events_ = events
+        self.calls = []
+
+    def calendarList(self):
+        return self
+
+    def events(self):
+        return self
+
+    def list(self, **kwargs):
+        if "calendarId" not in kwargs:
+            self.calls.append("calendarList")
+            return _Request({"items": [{"summary": "Work", "id": "work@group"}]})
+        self.calls.append(("events", kwargs["timeMin"], kwargs["timeMax"]))
+        return _Request({"items": self.events_})
+
+
+@pytest.fixture
+def calendar(monkeypatch):
+    fake = FakeCalendar(
+        events=[
+            {
+                "summary": "Boiler install",
+                "start": {"dateTime": "2024-06-03T09:00:00Z"},
+                "end": {"dateTime": "2024-06-04T12:00:00Z"},
+            },
+            {"summary": "Holiday", "start": {"date": "2024-06-05"}, "end": {"date": "2024-06-06"}},
+        ],
+    )
+    monkeypatch.setattr(gmail, "_calendar_service", lambda: fake)
+    gmail.invalidate_calendar_cache()
+    gmail._calendar_ids.clear()
+    yield fake
+    gmail.invalidate_calendar_cache()
+    gmail._calendar_ids.clear()
+
+
+def test_days_are_fetched_in_one_range_request_and_cached(calendar):
+    days = ["03-06-2024", "04-06-2024", "05-06-2024"]
+    events = gmail.list_events(days, "Work")
+    assert [e["summary"] for e in events["04-06-2024"]] == ["Boiler install"]
+    assert [e["summary"] for e in events["05-06-2024"]] == ["Holiday"]
+    assert calendar.calls == [
+        "calendarList",
+        ("events", "2024-06-03T00:00:00+00:00", "2024-06-06T00:00:00+00:00"),
+    ]
+
+    # Overlapping days and the calendar ID come from the cache
+    gmail.list_events(["04-06-2024", "05-06-2024"], "Work")
+    assert len(calendar.calls) == 2
+    gmail.list_events(["05-06-2024", "06-06-2024"], "Work")
+    assert calendar.calls[-1] == (
+        "events",
+        "2024-06-06T00:00:00+00:00",
+        "2024-06-07T00:00:00+00:00",
+    )
+
+
+def test_invalidation_refetches(calendar):
+    gmail.list_events(["03-06-2024"])
+    gmail.list_events(["03-06-2024"])
+    assert [c[0] for c in calendar.calls] == ["events"]
+
+    gmail.invalidate_calendar_cache("primary")
+    gmail.list_events(["03-06-2024"])
+    assert [c[0] for c in calendar.calls] == ["events", "events"]
@@ -0,0 +1,59 @@
+"""Unit tests for the triage/draft model cascade."""
+
+import pytest
+
+from eaia import metrics
+from eaia.main import cascade
+
+CONFIG = {
+    "configurable": {
+        "cascade": {
+            "triage_input": {
+                "tiers": [{"model": "gpt-4o-mini", "deployment": "mini"}, "gpt-4o"],
+                "min_confidence": 0.7,
+            }
+        }
+    }
+}
+
+
+@pytest.fixture(autouse=True)
+def fake_llms(monkeypatch):
+    metrics.reset()
+    monkeypatch.setattr(cascade, "get_tier_llm", lambda tier, **kwargs: tier["model"])
+
+
+def test_tiers_default_to_configured_model():
+    config = {"configurable": {"model": "gpt-4o"}}
+    assert cascade.get_tiers(config, "rewrite") == [{"model": "gpt-4o"}]
+    assert cascade.get_tiers(CONFIG, "triage_input")[1] == {"model": "gpt-4o"}
+
+
+async def test_accepted_result_does_not_escalate():
+    async def call(llm):
+        return {"model": llm, "confidence": 0.9}
+
+    result = await cascade.run_cascade(
+        "triage_input", CONFIG, call, accept=lambda r: r["confidence"] >= 0.7
+    )
+    assert result["model"] == "gpt-4o-mini"
+    assert cascade.get_escalation_rate("triage_input") == 0.0
+
+
+async def test_low_confidence_and_schema_errors_escalate():
+    async def low_confidence(llm):
+        return {"model": llm, "confidence": 0.1}
+
+    result = await cascade.run_cascade(
+        "triage_input", CONFIG, low_confidence, accept=lambda r: r["confidence"] >= 0.7
+    )
+    assert result["model"] == "gpt-4o"
+
+    async def invalid_on_mini(llm):
+        if llm == "gpt-4o-mini":
+            raise ValueError("validation error")
+        return {"model": llm}
+
+    result = await cascade.run_cascade("triage_input", CONFIG, invalid_on_mini)
+    assert result["model"] == "gpt-4o"
+    assert cascade.get_escalation_rate("triage_input") == 1.0
@@ -0,0 +1,63 @@
+"""Unit tests for the cached, validated config loader."""
+
+import os
+
+import pytest
+import yaml
+
+from eaia.main.config import CONFIG_PATH, get_config, load_file_config
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    with open(CONFIG_PATH) as f:
+        raw = yaml.safe_load(f)
+    path = tmp_path / "config.yaml"
+    path.write_text(yaml.safe_dump(raw))
+    return path, raw
+
+
+def test_file_is_parsed_once_until_mtime_changes(config_file):
+    path, raw = config_file
+    first = load_file_config(path)
+    assert load_file_config(path) is first
+
+    raw["name"] = "Jan"
+    path.write_text(yaml.safe_dump(raw))
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert load_file_config(path)["name"] == "Jan"
+
+
+def test_missing_keys_fail_fast(config_file):
+    path, raw = config_file
+    del raw["triage_no"]
+    path.write_text(yaml.safe_dump(raw))
+    with pytest.raises(ValueError, match="triage_no"):
+        load_file_config(path)
+
+
+@pytest.mark.parametrize(
+    "key, value",
+    [
+        ("working_hours", "Mon-Fri 17:00-09:00"),
+        ("working_hours", "weekdays"),
+        ("min_meeting_minutes", True),
+    ],
+)
+def test_invalid_scheduling_settings_fail_fast(config_file, key, value):
+    path, raw = config_file
+    raw[key] = value
+    path.write_text(yaml.safe_dump(raw))
+    with pytest.raises(ValueError, match=key):
+        load_file_config(path)
+
+
+def test_configurable_is_validated_and_memoized(config_file):
+    _, raw = config_file
+    first = get_config({"configurable": {**raw, "thread_id": "a"}})
+    second = get_config({"configurable": {**raw, "thread_id": "b"}})
+    assert first is second
+    assert "thread_id" not in first
+    with pytest.raises(ValueError, match="memory"):
+        get_config({"configurable": {**raw, "memory": "yes"}})
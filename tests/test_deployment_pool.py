@@ -0,0 +1,83 @@
+"""Unit tests for routing across Azure OpenAI deployments."""
+
+import json
+
+from eaia.main.deployment_pool import Deployment, DeploymentPool, load_pool
+
+
+def _pool():
+    return DeploymentPool(
+        [
+            Deployment("https://a", "gpt-4o", "key", "v1", weight=2),
+            Deployment("https://b", "gpt-4o", "key", "v1"),
+            Deployment("https://b", "gpt-4o-mini", "key", "v1", group="mini"),
+        ]
+    )
+
+
+def test_routes_by_least_outstanding_tokens_per_weight():
+    pool = _pool()
+    a, b, _ = pool.deployments
+    pool.start(a, 1000)
+    assert pool.choose() is b
+    pool.start(b, 1000)
+    # `a` has twice the weight, so equal load counts half as much there
+    assert pool.choose() is a
+    assert pool.choose("mini").deployment == "gpt-4o-mini"
+
+
+def test_unhealthy_deployment_leaves_rotation():
+    pool = _pool()
+    a, b, _ = pool.deployments
+    pool.mark_unhealthy(a, cooldown=60)
+    assert pool.choose() is b
+    pool.finish(b, 0, 0.5, error=True)
+    stats = pool.stats()
+    assert stats["https://a/gpt-4o"]["healthy"] is False
+    assert stats["https://b/gpt-4o"]["errors"] == 1
+
+
+def test_unknown_deployment_gets_its_own_group(monkeypatch):
+    monkeypatch.setenv(
+        "AZURE_OPENAI_DEPLOYMENTS",
+        json.dumps([{"endpoint": "https://a", "deployment": "gpt-4o"}]),
+    )
+    pool = load_pool()
+    assert pool.choose("o1").deployment == "o1"
+    assert [d.deployment for d in pool.candidates()] == ["gpt-4o"]
+
+
+def test_cancelled_request_releases_outstanding_tokens(monkeypatch):
+    import asyncio
+
+    from langchain_core.messages import HumanMessage
+
+    from eaia.main import azure_config, deployment_pool
+
+    pool = _pool()
+    monkeypatch.setattr(deployment_pool, "_POOL", pool)
+
+    class Hanging:
+        async def _agenerate(self, *args, **kwargs):
+            await asyncio.sleep(60)
+
+    llm = azure_config.PooledAzureChatOpenAI(
+        azure_deployment="gpt-4o",
+        azure_endpoint="https://a",
+        api_key="key",
+        openai_api_version="v1",
+        streaming=False,
+    )
+    monkeypatch.setattr(
+        azure_config.PooledAzureChatOpenAI, "_client_for", lambda self, d: Hanging()
+    )
+
+    async def run():
+        task = asyncio.create_task(llm._agenerate([HumanMessage(content="hi")]))
+        await asyncio.sleep(0.01)
+        assert sum(d.outstanding_tokens for d in pool.deployments) > 0
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert all(d.outstanding_tokens == 0 for d in pool.deployments)
@@ -0,0 +1,86 @@
+"""Unit tests for few-shot embedding text and the embedding cache."""
+
+import asyncio
+
+from eaia.main import embeddings
+from eaia.main.embeddings import (
+    aembed_texts,
+    build_embedding_text,
+    embed_texts,
+    make_batches,
+)
+
+
+def test_embedding_text_is_compact():
+    email = {
+        "id": "msg-1",
+        "thread_id": "thread-1",
+        "send_time": "2024-01-01T00:00:00",
+        "from_email": "Jane Doe <Jane@Example.com>",
+        "to_email": "me@mine.com",
+        "subject": "Quarterly numbers",
+        "page_content": "Hi,\n\nSee attached.\n\n" + "x" * 5000,
+    }
+    text = build_embedding_text(email)
+    assert text.startswith("Subject: Quarterly numbers\nFrom: example.com\n\n")
+    assert "msg-1" not in text and "2024-01-01" not in text
+    assert len(text) < 1200
+
+
+async def test_each_text_is_embedded_once(monkeypatch):
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_batch", fake_embed)
+    monkeypatch.setattr(embeddings, "_cache", embeddings.OrderedDict())
+
+    query = await aembed_texts(["triage query"])
+    stored = await aembed_texts(["triage query", "other", "other"])
+    assert stored[0] == query[0]
+    assert calls == [["triage query"], ["other"]]
+
+
+def test_batches_respect_size_and_token_limits():
+    texts = ["a" * 40] * 5
+    assert [len(b) for b in make_batches(texts, max_texts=2, max_tokens=1000)] == [2, 2, 1]
+    assert [len(b) for b in make_batches(texts, max_texts=10, max_tokens=25)] == [2, 2, 1]
+    # A text over the token cap still gets a batch of its own
+    assert make_batches(["a" * 400], max_texts=10, max_tokens=5) == [["a" * 400]]
+
+
+async def test_embed_texts_batches_and_dedupes(monkeypatch):
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_batch", fake_embed)
+    monkeypatch.setattr(embeddings, "make_batches", lambda t: make_batches(t, 2))
+
+    vectors = await embed_texts(["a", "bb", "a", "ccc"])
+    assert vectors == [[1.0], [2.0], [1.0], [3.0]]
+    assert sorted(map(len, calls)) == [1, 2]
+
+
+async def test_concurrent_misses_share_one_request(monkeypatch):
+    calls = []
+
+    async def fake_embed(texts):
+        calls.append(list(texts))
+        await asyncio.sleep(0.01)
+        return [[float(len(t))] for t in texts]
+
+    monkeypatch.setattr(embeddings, "_embed_batch", fake_embed)
+    monkeypatch.setattr(embeddings, "_cache", embeddings.OrderedDict())
+
+    results = await asyncio.gather(
+        aembed_texts(["same query"]),
+        aembed_texts(["same query"]),
+        aembed_texts(["same query", "other"]),
+    )
+    assert calls == [["same query"], ["other"]]
+    assert results == [[[10.0]], [[10.0]], [[10.0], [5.0]]]
@@ -0,0 +1,46 @@
+"""Unit tests for deduplicated, bounded triage examples."""
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main.examples import Example, example_key, save_example, select_evictions
+
+
+def test_example_key_ignores_ids_and_timestamps(make_email):
+    assert example_key(make_email(1)) == example_key(make_email(2))
+    assert example_key(make_email(1)) != example_key(make_email(1, body="Other"))
+
+
+async def test_save_example_upserts_by_content(make_email, examples_namespace):
+    store = InMemoryStore()
+    await save_example(store, examples_namespace, make_email(1), "notify")
+    await save_example(store, examples_namespace, make_email(2), "email")
+    items = await store.asearch(examples_namespace)
+    assert len(items) == 1
+    assert items[0].value["triage"] == "email"
+
+
+def test_eviction_drops_near_duplicates_before_oldest():
+    base = "please review the attached quarterly report before friday thanks a lot"
+    examples = [
+        Example("old-unique", "the office is closed on monday for the holiday", "1"),
+        Example("dup-old", base, "2"),
+        Example("dup-new", base + " again", "3"),
+        Example("new-unique", "your flight to lisbon has been confirmed", "4"),
+    ]
+    assert select_evictions(examples, 3) == ["dup-old"]
+    assert select_evictions(examples, 2) == ["dup-old", "old-unique"]
+    assert select_evictions(examples, 4) == []
+
+
+async def test_save_example_enforces_cap(monkeypatch, make_email, examples_namespace):
+    monkeypatch.setattr("eaia.main.examples.EVICTION_SLACK", 0)
+    store = InMemoryStore()
+    for i in range(5):
+        await save_example(
+            store,
+            examples_namespace,
+            make_email(i, body=f"topic number {i}"),
+            "no",
+            cap=3,
+        )
+    assert len(await store.asearch(examples_namespace, limit=10)) == 3
@@ -0,0 +1,47 @@
+"""Unit tests for hybrid few-shot retrieval."""
+
+from eaia.main.examples import save_example
+from eaia.main.fewshot import bm25_scores, retrieve_examples
+
+
+def test_bm25_prefers_rare_matching_terms():
+    scores = bm25_scores(
+        "overdue invoice", ["invoice overdue", "team meeting", "invoice attached"]
+    )
+    assert scores[0] > scores[2] > scores[1] == 0.0
+
+
+async def test_same_sender_examples_skip_embedding(
+    make_email, keyword_store, embedded, examples_namespace
+):
+    for subject, triage in [("Invoice 1", "no"), ("Meeting", "email")]:
+        email = make_email(sender="a@acme.com", subject=subject, body="")
+        await save_example(keyword_store, examples_namespace, email, triage)
+    embedded.clear()
+
+    results = await retrieve_examples(
+        make_email(sender="A <a@acme.com>", subject="Invoice 2", body=""),
+        keyword_store,
+        examples_namespace,
+    )
+    assert [r.value["input"]["subject"] for r in results] == ["Invoice 1", "Meeting"]
+    assert embedded == []
+
+
+async def test_dissimilar_examples_are_dropped(
+    make_email, keyword_store, examples_namespace
+):
+    for sender, subject, triage in [
+        ("b@acme.com", "Invoice", "no"),
+        ("c@other.com", "Meeting", "email"),
+    ]:
+        email = make_email(sender=sender, subject=subject, body="")
+        await save_example(keyword_store, examples_namespace, email, triage)
+
+    for subject, expected in [("Invoice due", ["Invoice"]), ("Newsletter", [])]:
+        results = await retrieve_examples(
+            make_email(sender="d@acme.com", subject=subject, body=""),
+            keyword_store,
+            examples_namespace,
+        )
+        assert [r.value["input"]["subject"] for r in results] == expected
@@ -0,0 +1,38 @@
+"""Unit tests for the event-loop watchdog."""
+
+import asyncio
+import logging
+import time
+
+from eaia import metrics
+from eaia.loop_watchdog import start_watchdog, stop_watchdog
+
+
+def blocking_call():
+    time.sleep(0.3)
+
+
+async def test_watchdog_reports_blocking_call_with_stack(caplog):
+    before = metrics.get_counter("event_loop_stalls")
+    start_watchdog(threshold=0.05)
+    try:
+        await asyncio.sleep(0.05)
+        with caplog.at_level(logging.WARNING, logger="eaia.loop_watchdog"):
+            blocking_call()
+            await asyncio.sleep(0.1)
+    finally:
+        stop_watchdog()
+    assert metrics.get_counter("event_loop_stalls") == before + 1
+    assert "blocking_call" in caplog.text
+
+
+async def test_watchdog_ignores_non_blocking_waits(monkeypatch):
+    monkeypatch.delenv("EAIA_LOOP_WATCHDOG", raising=False)
+    assert start_watchdog() is None
+    before = metrics.get_counter("event_loop_stalls")
+    start_watchdog(threshold=0.05)
+    try:
+        await asyncio.to_thread(time.sleep, 0.3)
+    finally:
+        stop_watchdog()
+    assert metrics.get_counter("event_loop_stalls") == before
@@ -0,0 +1,112 @@
+"""Unit tests for MinHash near-duplicate detection."""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main import near_duplicates
+from eaia.main.near_duplicates import (
+    estimate_similarity,
+    find_cluster,
+    group_near_duplicates,
+    minhash_signature,
+    prune_clusters,
+    record_cluster,
+)
+from eaia.main.triage import triage_input
+
+CAMPAIGN = (
+    "Hi {name}, our spring sale starts today with up to fifty percent off on all "
+    "outdoor furniture, garden tools and barbecue accessories. Visit the store or "
+    "shop online before the end of the month to get free delivery on every order "
+    "above one hundred euros. Kind regards, the Garden Shop team"
+)
+OTHER = (
+    "Hello, the quarterly board meeting has been moved to Thursday at three in the "
+    "afternoon. Please review the attached financial statements and the draft "
+    "budget for next year before the meeting and send any questions to the office."
+)
+
+
+def test_near_identical_bodies_have_similar_signatures():
+    a = minhash_signature(CAMPAIGN.format(name="Jane"))
+    b = minhash_signature(CAMPAIGN.format(name="John"))
+    assert estimate_similarity(a, b) >= 0.8
+    assert estimate_similarity(a, minhash_signature(OTHER)) < 0.2
+    assert minhash_signature("Thanks, sounds good!") is None
+
+
+def test_batch_is_grouped_by_near_duplicates(make_email):
+    emails = [
+        make_email(1, CAMPAIGN.format(name="Jane")),
+        make_email(2, OTHER),
+        make_email(3, CAMPAIGN.format(name="John"), thread_id="thread-1"),
+        make_email(4, "Thanks!", thread_id="thread-1"),
+        make_email(5, "Thanks!", thread_id="thread-1"),
+        # Same text from someone else or in another thread needs its own reply
+        make_email(6, CAMPAIGN.format(name="Ann"), sender="ann@example.com"),
+        make_email(7, CAMPAIGN.format(name="Bob")),
+    ]
+    groups = group_near_duplicates(emails)
+    assert [[e["id"] for e in g] for g in groups] == [
+        ["msg-1", "msg-3"],
+        ["msg-2"],
+        ["msg-4"],
+        ["msg-5"],
+        ["msg-6"],
+        ["msg-7"],
+    ]
+
+
+async def test_duplicate_in_another_thread_gets_its_own_reply(make_email):
+    first = make_email(1, CAMPAIGN.format(name="Jane"))
+    second = make_email(2, CAMPAIGN.format(name="John"))
+    assert [[e["id"] for e in g] for g in group_near_duplicates([first, second])] == [
+        ["msg-1"],
+        ["msg-2"],
+    ]
+
+    store = InMemoryStore()
+    signature = minhash_signature(first["page_content"])
+    await record_cluster(store, "jvc", "msg-1", signature, "email")
+    # The second thread's run reuses the decision and goes on to draft
+    update = await triage_input(
+        {"email": second, "messages": []},
+        {"configurable": {"assistant_id": "jvc"}},
+        store,
+    )
+    assert update["triage"].response == "email"
+
+
+async def test_triaged_cluster_is_found_for_later_duplicates():
+    store = InMemoryStore()
+    signature = minhash_signature(CAMPAIGN.format(name="Jane"))
+    await record_cluster(store, "jvc", "msg-1", signature, "no")
+
+    cluster = await find_cluster(
+        store, "jvc", minhash_signature(CAMPAIGN.format(name="Ann"))
+    )
+    assert cluster["decision"] == "no"
+    assert await find_cluster(store, "jvc", minhash_signature(OTHER)) is None
+    assert await find_cluster(store, "other", signature) is None
+
+
+async def test_expired_clusters_and_bands_are_pruned(monkeypatch):
+    store = InMemoryStore()
+    namespace = ("jvc", "near_duplicates")
+    await record_cluster(
+        store, "jvc", "msg-1", minhash_signature(CAMPAIGN.format(name="Jane")), "no"
+    )
+    first = max(i.updated_at for i in await store.asearch(namespace, limit=100))
+    await asyncio.sleep(0.01)
+    await record_cluster(store, "jvc", "msg-2", minhash_signature(OTHER), "notify")
+    # Everything written for msg-1 is past the TTL, msg-2 is not
+    expires = first + timedelta(milliseconds=5)
+    monkeypatch.setattr(
+        near_duplicates, "CLUSTER_TTL", datetime.now(timezone.utc) - expires
+    )
+
+    assert await prune_clusters(store, "jvc") == 17
+    assert await find_cluster(store, "jvc", minhash_signature(OTHER)) is not None
+    assert await store.aget(namespace, "cluster:msg-1") is None
@@ -0,0 +1,65 @@
+"""Unit tests for email body normalization."""
+
+from eaia.normalize import normalize_body, TRUNCATION_MARKER
+
+
+def test_html_is_converted_to_text():
+    html = (
+        "<html><head><style>p {color: red}</style></head><body>"
+        "<p>Goedemorgen,</p><p>Mijn ketel&nbsp;lekt.</p><br></body></html>"
+    )
+    assert normalize_body(html) == "Goedemorgen,\n\nMijn ketel lekt."
+
+
+def test_quoted_history_is_stripped():
+    body = (
+        "Tuesday works for me.\n\n"
+        "On Mon, 6 Jan 2025 at 10:00, Johan <johan@example.com> wrote:\n"
+        "> Would Tuesday at 10 work?\n"
+        "> Kind regards"
+    )
+    assert normalize_body(body) == "Tuesday works for me."
+
+
+def test_outlook_header_block_is_stripped():
+    body = (
+        "Graag een offerte.\n\n"
+        "Van: Jan Peeters\n"
+        "Verzonden: maandag 6 januari 2025 10:00\n"
+        "Aan: Johan\n"
+        "Onderwerp: Offerte\n\nOude tekst"
+    )
+    assert normalize_body(body) == "Graag een offerte."
+
+
+def test_signature_is_stripped_but_sign_off_kept():
+    body = (
+        "Can you service my boiler next week?\n\n"
+        "Kind regards,\nAn Janssens\nJanssens BV\nKerkstraat 1, 9000 Gent\n+32 9 000 00 00"
+    )
+    assert normalize_body(body) == (
+        "Can you service my boiler next week?\n\nKind regards,\nAn Janssens"
+    )
+    assert normalize_body("Yes, fine.\n--\nAn\nSent with care") == "Yes, fine."
+
+
+def test_whitespace_collapsed_and_length_capped():
+    assert normalize_body("a  \t b\n\n\n\nc") == "a b\n\nc"
+    capped = normalize_body("x" * 50, max_chars=10)
+    assert capped == "x" * 10 + TRUNCATION_MARKER
+
+
+def test_quote_only_message_is_kept():
+    body = "> forwarded line"
+    assert normalize_body(body) == "> forwarded line"
+
+
+def test_sign_off_mid_body_keeps_the_rest():
+    body = (
+        "Thanks,\nthat fixed the heating.\n\n"
+        "One more thing: could you also look at the radiator in the attic "
+        "when you are here next week?\n\nAn"
+    )
+    assert normalize_body(body) == body
+    postscript = "See you Monday.\n\nThanks,\nAn\n\nP.S. Bring the spare key"
+    assert normalize_body(postscript) == postscript
@@ -0,0 +1,66 @@
+"""Unit tests for batched, cached preference loading."""
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main.preferences import bump_version, get_preferences, seed_preferences
+
+CONFIG = {
+    "schedule_preferences": "Mon-Sat",
+    "background_preferences": "Plumber",
+    "response_preferences": "Formal",
+    "rewrite_preferences": "Dutch",
+}
+
+
+class CountingStore(InMemoryStore):
+    def __init__(self):
+        super().__init__()
+        self.batches = 0
+
+    async def abatch(self, ops):
+        self.batches += 1
+        return await super().abatch(ops)
+
+
+async def test_preferences_are_fetched_in_one_batch_and_cached():
+    store = CountingStore()
+    prefs = await get_preferences(store, "a1", CONFIG)
+    assert prefs["random_preferences"] == "Plumber"
+    assert store.batches == 1
+    await get_preferences(store, "a1", CONFIG)
+    assert store.batches == 1
+    # Defaults are not written on the request path
+    assert await store.aget(("a1",), "random_preferences") is None
+
+
+async def test_reflection_write_invalidates_cache():
+    store = CountingStore()
+    await get_preferences(store, "a2", CONFIG)
+    await store.aput(("a2",), "rewrite_instructions", {"data": "Short"})
+    bump_version("a2")
+    prefs = await get_preferences(store, "a2", CONFIG)
+    assert prefs["rewrite_instructions"] == "Short"
+
+
+async def test_seed_writes_only_missing_defaults():
+    store = CountingStore()
+    await store.aput(("a3",), "response_preferences", {"data": "Learned"})
+    seeded = await seed_preferences(store, "a3", CONFIG)
+    assert "response_preferences" not in seeded
+    item = await store.aget(("a3",), "schedule_preferences")
+    assert item.value == {"data": "Mon-Sat"}
+    assert (await get_preferences(store, "a3", CONFIG))["response_preferences"] == "Learned"
+
+
+async def test_writes_from_elsewhere_are_seen_after_the_ttl(monkeypatch):
+    from eaia.main import preferences
+
+    store = CountingStore()
+    await get_preferences(store, "a4", CONFIG)
+    # e.g. a rollback from scripts/prompt_history.py, without bump_version
+    await store.aput(("a4",), "response_preferences", {"data": "Rolled back"})
+    assert (await get_preferences(store, "a4", CONFIG))["response_preferences"] == "Formal"
+    monkeypatch.setattr(preferences, "CACHE_SECONDS", 0)
+    assert (
+        await get_preferences(store, "a4", CONFIG)
+    )["response_preferences"] == "Rolled back"
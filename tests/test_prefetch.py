@@ -0,0 +1,102 @@
+"""Unit tests for the prefetch node."""
+
+import asyncio
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia import metrics
+from eaia.main import prefetch
+from eaia.main.prefetch import mentions_scheduling
+
+EMAIL = {
+    "id": "1",
+    "thread_id": "t1",
+    "from_email": "Ann <ann@example.com>",
+    "to_email": "jane@example.com",
+    "subject": "Quick question",
+    "page_content": "Could we meet on Thursday to go over the plan?",
+    "send_time": "2024-05-01T10:00:00",
+}
+
+
+def test_mentions_scheduling():
+    assert mentions_scheduling(EMAIL)
+    assert mentions_scheduling({**EMAIL, "page_content": "Are you free on Friday?"})
+    assert mentions_scheduling({**EMAIL, "page_content": "Can we have a quick call?"})
+    assert not mentions_scheduling({**EMAIL, "page_content": "Thanks for the update!"})
+    # "free" and "call" on their own are not about a time
+    assert not mentions_scheduling(
+        {**EMAIL, "page_content": "Feel free to call it done, delivery is free."}
+    )
+
+
+async def test_loads_run_concurrently_and_tolerate_failures(monkeypatch):
+    started = []
+
+    async def few_shots(email, store, config):
+        started.append("few_shot_examples")
+        return "examples"
+
+    async def preferences(store, assistant_id, prompt_config):
+        started.append("preferences")
+        return {}
+
+    def calendar(prompt_config, start):
+        raise RuntimeError("no calendar access")
+
+    monkeypatch.setattr(prefetch, "get_few_shot_examples", few_shots)
+    monkeypatch.setattr(prefetch, "get_preferences", preferences)
+    monkeypatch.setattr(prefetch, "fetch_busy", calendar)
+    before = metrics.snapshot()["timings"]
+    tasks = prefetch.start_prefetch(
+        {"email": EMAIL}, {"configurable": {}}, InMemoryStore()
+    )
+    assert await prefetch.get_loaded(tasks, "few_shot_examples") == "examples"
+    assert await prefetch.collect(tasks, need_busy=True) == {}
+    assert sorted(started) == ["few_shot_examples", "preferences"]
+    saved = [t for t in metrics.snapshot()["timings"] if t["name"] == "prefetch_saved"]
+    assert saved and saved[0]["count"] == sum(
+        t["count"] for t in before if t["name"] == "prefetch_saved"
+    ) + 1
+
+
+async def test_calendar_is_dropped_when_no_reply_is_drafted(monkeypatch):
+    async def few_shots(email, store, config):
+        return "examples"
+
+    async def preferences(store, assistant_id, prompt_config):
+        return {}
+
+    def calendar(prompt_config, start):
+        return []
+
+    monkeypatch.setattr(prefetch, "get_few_shot_examples", few_shots)
+    monkeypatch.setattr(prefetch, "get_preferences", preferences)
+    monkeypatch.setattr(prefetch, "fetch_busy", calendar)
+    config = {"configurable": {}}
+    tasks = prefetch.start_prefetch({"email": EMAIL}, config, InMemoryStore())
+    assert await prefetch.collect(tasks, need_busy=False) == {}
+    tasks = prefetch.start_prefetch({"email": EMAIL}, config, InMemoryStore())
+    assert "busy" in await prefetch.collect(tasks, need_busy=True)
+
+
+async def test_waiting_after_triage_is_not_counted_as_saved(monkeypatch):
+    async def few_shots(email, store, config):
+        return "examples"
+
+    async def preferences(store, assistant_id, prompt_config):
+        await asyncio.sleep(0.1)
+        return {}
+
+    observed = []
+    monkeypatch.setattr(prefetch, "get_few_shot_examples", few_shots)
+    monkeypatch.setattr(prefetch, "get_preferences", preferences)
+    monkeypatch.setattr(
+        metrics, "observe", lambda name, seconds, **_: observed.append((name, seconds))
+    )
+    email = {**EMAIL, "page_content": "Thanks for the update!"}
+    tasks = prefetch.start_prefetch({"email": email}, {"configurable": {}}, None)
+    # Triage returns right away, so the whole load is still waited for
+    await prefetch.collect(tasks, need_busy=False)
+    saved = [seconds for name, seconds in observed if name == "prefetch_saved"]
+    assert saved and saved[0] < 0.05
@@ -0,0 +1,140 @@
+"""Unit tests for versioned prompt updates."""
+
+import asyncio
+
+import pytest
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main.prompt_memory import (
+    SNAPSHOT_EVERY,
+    VersionConflict,
+    apply_diff,
+    compare_and_set,
+    enforce_budget,
+    get_history,
+    get_prompt,
+    get_prompt_at,
+    make_diff,
+    merge3,
+    rollback_prompt,
+    update_prompt,
+)
+
+BASE = "Be concise.\nSign off with Best.\nUse first names."
+
+
+def test_merge3_combines_disjoint_edits():
+    ours = "Be very concise.\nSign off with Best.\nUse first names."
+    theirs = "Be concise.\nSign off with Best.\nUse first names.\nNo emojis."
+    assert merge3(BASE, ours, theirs) == (
+        "Be very concise.\nSign off with Best.\nUse first names.\nNo emojis."
+    )
+    assert merge3(BASE, ours, ours) == ours
+
+
+def test_merge3_rejects_overlapping_edits():
+    ours = "Be concise.\nSign off with Cheers.\nUse first names."
+    theirs = "Be concise.\nSign off with Thanks.\nUse first names."
+    assert merge3(BASE, ours, theirs) is None
+
+
+async def test_compare_and_set_rejects_stale_version():
+    store = InMemoryStore()
+    first = await compare_and_set(store, "jvc", "rewrite_instructions", None, BASE)
+    assert first.version == 1
+    with pytest.raises(VersionConflict) as e:
+        await compare_and_set(store, "jvc", "rewrite_instructions", None, "other")
+    assert e.value.current == first
+
+
+async def test_concurrent_updates_are_merged():
+    store = InMemoryStore()
+    await compare_and_set(store, "jvc", "rewrite_instructions", None, BASE)
+
+    async def edit(old, new, delay):
+        async def rewrite(text):
+            await asyncio.sleep(delay)
+            return text.replace(old, new)
+
+        return await update_prompt(store, "jvc", "rewrite_instructions", "", rewrite)
+
+    await asyncio.gather(
+        edit("Be concise.", "Be very concise.", 0.01),
+        edit("Use first names.", "Use first names.\nNo emojis.", 0.02),
+    )
+    record = await get_prompt(store, "jvc", "rewrite_instructions", "")
+    assert record.text == (
+        "Be very concise.\nSign off with Best.\nUse first names.\nNo emojis."
+    )
+    assert record.version == 3
+
+
+async def test_conflicting_update_is_redone_on_latest_text():
+    store = InMemoryStore()
+    await compare_and_set(store, "jvc", "rewrite_instructions", None, BASE)
+    calls = []
+
+    async def rewrite(text):
+        calls.append(text)
+        if len(calls) == 1:
+            # Someone else changes the same line while this rewrite runs
+            await compare_and_set(
+                store, "jvc", "rewrite_instructions", 1, text.replace("Best", "Thanks")
+            )
+        return text.replace("Sign off with Best.", "Sign off with Cheers.").replace(
+            "Sign off with Thanks.", "Sign off with Cheers, thanks."
+        )
+
+    record = await update_prompt(store, "jvc", "rewrite_instructions", "", rewrite)
+    assert len(calls) == 2
+    assert "Sign off with Cheers, thanks." in record.text
+
+
+def test_diff_round_trips():
+    new = "Be very concise.\nSign off with Best.\nNo emojis."
+    assert apply_diff(BASE, make_diff(BASE, new)) == new
+    assert apply_diff("", make_diff("", BASE)) == BASE
+
+
+async def test_history_rebuilds_every_version_and_rolls_back():
+    store = InMemoryStore()
+    texts = [f"{BASE}\nRule {i}." for i in range(SNAPSHOT_EVERY + 3)]
+    version = None
+    for text in texts:
+        record = await compare_and_set(
+            store, "jvc", "rewrite_instructions", version, text, {"source": "test"}
+        )
+        version = record.version
+    history = await get_history(store, "jvc", "rewrite_instructions")
+    assert [r["version"] for r in history] == list(range(len(texts), 0, -1))
+    assert sum("snapshot" in r for r in history) == 2
+    for v, text in enumerate(texts, start=1):
+        assert await get_prompt_at(store, "jvc", "rewrite_instructions", v) == text
+
+    restored = await rollback_prompt(store, "jvc", "rewrite_instructions", 2)
+    assert restored.version == len(texts) + 1
+    assert (await get_prompt(store, "jvc", "rewrite_instructions", "")).text == texts[1]
+    latest = (await get_history(store, "jvc", "rewrite_instructions", limit=1))[0]
+    assert latest["source"] == "rollback" and latest["restored_version"] == 2
+
+    # A rollback based on an outdated view of the history is refused
+    with pytest.raises(VersionConflict):
+        await rollback_prompt(
+            store, "jvc", "rewrite_instructions", 1, expected_version=len(texts)
+        )
+
+
+async def test_enforce_budget_condenses_long_prompts():
+    store = InMemoryStore()
+    long_text = "\n".join(f"Rule {i}: keep replies short." for i in range(50))
+    await compare_and_set(store, "jvc", "rewrite_instructions", None, long_text)
+
+    async def condense(text, budget):
+        return "Keep replies short."
+
+    assert await enforce_budget(store, "jvc", "rewrite_instructions", condense, 10000) is None
+    record = await enforce_budget(store, "jvc", "rewrite_instructions", condense, 20)
+    assert record.text == "Keep replies short."
+    history = await get_history(store, "jvc", "rewrite_instructions")
+    assert history[0]["source"] == "condense"
+    assert await get_prompt_at(store, "jvc", "rewrite_instructions", 1) == long_text
@@ -0,0 +1,37 @@
+"""Unit tests for the shared Azure OpenAI rate limiter."""
+
+import asyncio
+
+import pytest
+
+from eaia.main import rate_limit
+from eaia.main.rate_limit import BACKGROUND, INTERACTIVE, RateLimiter
+
+
+async def test_interactive_requests_go_before_background(monkeypatch):
+    monkeypatch.setattr(rate_limit, "WINDOW_SECONDS", 0.2)
+    limiter = RateLimiter()
+    limiter.configure("gpt-4o", rpm=1)
+    await limiter.acquire("gpt-4o", 10)
+
+    order = []
+
+    async def call(name, priority):
+        await limiter.acquire("gpt-4o", 10, priority)
+        order.append(name)
+
+    background = asyncio.create_task(call("reflection", BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("triage", INTERACTIVE))
+    await asyncio.gather(background, interactive)
+    assert order == ["triage", "reflection"]
+
+
+async def test_token_budget_is_reconciled_with_actual_usage():
+    limiter = RateLimiter()
+    limiter.configure("gpt-4o", tpm=1000)
+    reservation = await limiter.acquire("gpt-4o", 800)
+    assert limiter.spare_capacity("gpt-4o") == pytest.approx(0.2)
+    reservation.reconcile(300)
+    assert limiter.usage("gpt-4o")["tokens"] == 300
+    await asyncio.wait_for(limiter.acquire("gpt-4o", 500), timeout=0.5)
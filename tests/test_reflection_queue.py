@@ -0,0 +1,103 @@
+"""Unit tests for the debounced reflection queue."""
+
+import asyncio
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia import reflection_graphs
+from eaia.reflection_queue import (
+    ReflectionQueue,
+    load_events,
+    pending_keys,
+    persist_event,
+)
+
+KEY = ("jvc", "rewrite_instructions")
+
+
+def make_queue(**kwargs):
+    flushed = []
+
+    async def flush(key, events, context):
+        flushed.append((key, [e["feedback"] for e in events], context))
+
+    return ReflectionQueue(flush, **kwargs), flushed
+
+
+async def test_events_are_coalesced_after_quiet_period():
+    queue, flushed = make_queue(quiet_seconds=0.05, max_batch=10)
+    for i in range(3):
+        await queue.add(KEY, {"feedback": f"f{i}"}, instructions=f"i{i}")
+        await asyncio.sleep(0.01)
+    await queue.add(("jvc", "random_preferences"), {"feedback": "other"})
+    assert flushed == []
+
+    await asyncio.sleep(0.1)
+    assert sorted(flushed) == [
+        (("jvc", "random_preferences"), ["other"], {}),
+        (KEY, ["f0", "f1", "f2"], {"instructions": "i2"}),
+    ]
+
+
+async def test_size_threshold_flushes_immediately():
+    queue, flushed = make_queue(quiet_seconds=60, max_batch=2)
+    await queue.add(KEY, {"feedback": "a"})
+    await queue.add(KEY, {"feedback": "b"})
+    await asyncio.sleep(0)
+    assert flushed == [(KEY, ["a", "b"], {})]
+    assert queue.pending(KEY) == 0
+
+
+async def test_max_wait_bounds_a_steady_trickle():
+    queue, flushed = make_queue(quiet_seconds=0.05, max_batch=100, max_wait_seconds=0.1)
+    for i in range(8):
+        await queue.add(KEY, {"feedback": str(i)})
+        await asyncio.sleep(0.02)
+    assert flushed and len(flushed[0][1]) < 8
+
+
+async def test_batch_reflection_processes_persisted_events(monkeypatch):
+    store = InMemoryStore()
+    other = ("jvc", "random_preferences")
+    for i in range(5):
+        await persist_event(store, KEY, {"feedback": f"f{i}", "configurable": {}})
+    await persist_event(store, other, {"feedback": "bad", "configurable": {}})
+    assert sorted(await pending_keys(store)) == sorted([KEY, other])
+
+    calls = []
+
+    async def reflect(store, config, assistant_key, prompt_key, instructions, events):
+        if prompt_key == "random_preferences":
+            raise RuntimeError("o1 is down")
+        calls.append((prompt_key, [e["feedback"] for e in events]))
+
+    monkeypatch.setattr(reflection_graphs, "reflect", reflect)
+    monkeypatch.setattr(reflection_graphs, "_spare_capacity", lambda: 0.2)
+    result = await reflection_graphs.process_reflection_queue(
+        {"min_spare_capacity": 0.5}, {}, store
+    )
+    assert result["processed"] == 0 and calls == []
+
+    result = await reflection_graphs.process_reflection_queue(
+        {"max_batch": 3}, {}, store
+    )
+    assert calls == [
+        ("rewrite_instructions", ["f0", "f1", "f2"]),
+        ("rewrite_instructions", ["f3", "f4"]),
+    ]
+    assert result["processed"] == 5 and result["remaining"] == 1
+    assert await load_events(store, KEY) == []
+    assert [i.value["feedback"] for i in await load_events(store, other)] == ["bad"]
+
+
+async def test_load_events_returns_the_oldest_events(tmp_path, monkeypatch):
+    from eaia import reflection_queue
+    from eaia.store import SqliteStore
+
+    monkeypatch.setattr(reflection_queue, "_LOAD_PAGE_SIZE", 2)
+    # Newest items come first from a search without a query
+    store = SqliteStore(str(tmp_path / "store.sqlite"))
+    for i in range(5):
+        await persist_event(store, KEY, {"feedback": f"f{i}"})
+    events = await load_events(store, KEY, limit=3)
+    assert [e.value["feedback"] for e in events] == ["f0", "f1", "f2"]
@@ -0,0 +1,64 @@
+"""Unit tests for per-sender triage history."""
+
+from langgraph.store.memory import InMemoryStore
+
+from eaia.main.reputation import (
+    MIN_STREAK,
+    get_sender_stats,
+    lookup_decision,
+    record_decision,
+)
+
+SENDER = "Billing <billing@supplier.com>"
+
+
+async def test_consistent_history_is_reused_and_counted():
+    store = InMemoryStore()
+    for i in range(MIN_STREAK - 1):
+        await record_decision(store, "jvc", SENDER, f"e{i}", "no", "triage")
+    assert await lookup_decision(store, "jvc", SENDER) is None
+
+    await record_decision(store, "jvc", SENDER, "e-last", "no", "user")
+    assert await lookup_decision(store, "jvc", "billing@supplier.com") == "no"
+    assert await lookup_decision(store, "other", SENDER) is None
+
+    [stats] = await get_sender_stats(store, "jvc")
+    assert stats["sender"] == "billing@supplier.com"
+    assert stats["counts"] == {"no": MIN_STREAK}
+    assert stats["shortcuts"] == 1
+
+
+async def test_user_correction_resets_streak():
+    store = InMemoryStore()
+    for i in range(MIN_STREAK):
+        await record_decision(store, "jvc", SENDER, f"e{i}", "notify", "triage")
+    await record_decision(store, "jvc", SENDER, f"e{MIN_STREAK - 1}", "email", "user")
+    assert await lookup_decision(store, "jvc", SENDER) is None
+    [stats] = await get_sender_stats(store, "jvc")
+    assert stats["counts"] == {"notify": MIN_STREAK - 1, "email": 1}
+
+
+async def test_questions_are_never_reused():
+    store = InMemoryStore()
+    for i in range(MIN_STREAK * 2):
+        await record_decision(store, "jvc", SENDER, f"e{i}", "question", "triage")
+    assert await lookup_decision(store, "jvc", SENDER) is None
+
+
+async def test_each_email_counts_once():
+    store = InMemoryStore()
+    for i in range(2):
+        await record_decision(store, "jvc", SENDER, f"e{i}", "email", "triage")
+        # `save_email` runs for every inbox action in the email's thread
+        for _ in range(3):
+            await record_decision(store, "jvc", SENDER, f"e{i}", "email", "user")
+    [stats] = await get_sender_stats(store, "jvc")
+    assert stats["counts"] == {"email": 2}
+    assert stats["streak"] == 2
+
+    # The user's outcome for an older email replaces its triage decision
+    await record_decision(store, "jvc", SENDER, "e2", "email", "triage")
+    await record_decision(store, "jvc", SENDER, "e0", "no", "user")
+    [stats] = await get_sender_stats(store, "jvc")
+    assert stats["counts"] == {"email": 2, "no": 1}
+    assert stats["streak"] == 0
@@ -0,0 +1,98 @@
+"""Unit tests for speculative drafting."""
+
+import asyncio
+from uuid import uuid4
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.store.memory import InMemoryStore
+
+from eaia import metrics
+from eaia.main import speculation
+from eaia.main.accounting import UsageTracker
+from eaia.main.reputation import record_decision
+from eaia.tokens import estimate_tokens
+
+EMAIL = {
+    "id": "1",
+    "thread_id": "t1",
+    "from_email": "Ann <ann@example.com>",
+    "to_email": "jane@example.com",
+    "subject": "Boiler",
+    "page_content": "The boiler is making a noise again.",
+    "send_time": "2024-05-01T10:00:00",
+}
+
+
+def _draft(tokens=120):
+    message = AIMessage(
+        content="",
+        usage_metadata={"input_tokens": 100, "output_tokens": 20, "total_tokens": tokens},
+    )
+    return {"draft": message, "messages": [message]}
+
+
+def test_disabled_without_settings():
+    assert speculation.get_min_score({"configurable": {}}) is None
+    config = {"configurable": {"speculative_drafting": {"min_score": 0.7}}}
+    assert speculation.get_min_score(config) == 0.7
+
+
+async def test_score_combines_signals():
+    store = InMemoryStore()
+    assert await speculation.speculation_score(EMAIL, store, "jvc") == 0.0
+    question = {**EMAIL, "page_content": "Could you come and meet on Thursday?"}
+    assert round(await speculation.speculation_score(question, store, "jvc"), 2) == 0.64
+
+    for i, decision in enumerate(["email", "email", "email", "no"]):
+        await record_decision(
+            store, "jvc", EMAIL["from_email"], f"e{i}", decision, "user"
+        )
+    assert await speculation.speculation_score(EMAIL, store, "jvc") == 0.75
+
+
+async def test_resolve_commits_or_discards():
+    async def draft():
+        return _draft()
+
+    speculative = speculation.start_draft(draft)
+    assert await speculation.resolve(speculative, "email") == _draft()
+
+    slow = speculation.start_draft(lambda: asyncio.sleep(10))
+    assert await speculation.resolve(slow, "notify") is None
+    await asyncio.sleep(0)
+    assert slow.task.cancelled()
+
+
+async def test_wasted_tokens_include_retries_and_calls_in_flight():
+    tracker = UsageTracker()
+    usage = {"input_tokens": 100, "output_tokens": 20, "total_tokens": 120}
+
+    async def draft():
+        llm = GenericFakeChatModel(
+            messages=iter([AIMessage("", usage_metadata=usage)] * 2),
+            callbacks=[tracker],
+        )
+        # A malformed first attempt and its retry
+        await llm.ainvoke("draft")
+        await llm.ainvoke("draft again")
+        return _draft()
+
+    wasted = metrics.get_counter("speculative_draft_wasted_tokens")
+    speculative = speculation.start_draft(draft)
+    await speculative.task
+    assert await speculation.resolve(speculative, "no") is None
+    assert metrics.get_counter("speculative_draft_wasted_tokens") == wasted + 240
+
+    async def hanging():
+        tracker.on_chat_model_start(
+            {}, [[HumanMessage("x" * 400)]], run_id=uuid4(), metadata={}
+        )
+        await asyncio.sleep(10)
+
+    wasted = metrics.get_counter("speculative_draft_wasted_tokens")
+    speculative = speculation.start_draft(hanging)
+    await asyncio.sleep(0)
+    assert await speculation.resolve(speculative, "no") is None
+    in_flight = estimate_tokens("x" * 400)
+    assert metrics.get_counter("speculative_draft_wasted_tokens") == wasted + in_flight
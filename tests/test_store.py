@@ -0,0 +1,74 @@
+"""Unit tests for the SQLite/NumPy store."""
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from eaia.store import SqliteStore  # noqa: E402
+
+
+@pytest.fixture
+def make_store(tmp_path, keyword_index):
+    def make(**kwargs):
+        return SqliteStore(
+            str(tmp_path / "store.sqlite"),
+            index={**keyword_index, "fields": ["text"]},
+            **kwargs,
+        )
+
+    return make
+
+
+async def test_items_and_vectors_survive_restart(make_store):
+    store = make_store()
+    await store.aput(("jvc", "triage_examples"), "a", {"text": "invoice due"})
+    await store.aput(("jvc", "triage_examples"), "b", {"text": "meeting today"})
+    await store.aput(("jvc",), "random_preferences", {"data": "x"}, index=False)
+    store.close()
+
+    store = make_store(mmap=True)
+    assert (await store.aget(("jvc",), "random_preferences")).value == {"data": "x"}
+    results = await store.asearch(("jvc", "triage_examples"), query="meeting", limit=1)
+    assert [r.key for r in results] == ["b"]
+    assert results[0].score == pytest.approx(1.0)
+    # Appends after reopening keep working on the memory-mapped matrix
+    await store.aput(("jvc", "triage_examples"), "c", {"text": "newsletter"})
+    results = await store.asearch(("jvc", "triage_examples"), query="newsletter")
+    assert results[0].key == "c"
+
+
+def test_search_is_partitioned_by_namespace_and_filters(make_store):
+    store = make_store()
+    store.put(("jvc", "triage_examples"), "a", {"text": "invoice", "triage": "no"})
+    store.put(("other", "triage_examples"), "b", {"text": "invoice", "triage": "no"})
+    store.put(("jvc", "triage_examples"), "c", {"text": "invoice", "triage": "email"})
+    results = store.search(("jvc",), query="invoice", filter={"triage": "no"})
+    assert [r.key for r in results] == ["a"]
+    assert store.list_namespaces(prefix=("jvc",)) == [("jvc", "triage_examples")]
+
+
+def test_search_without_query_pages_newest_first(make_store):
+    store = make_store()
+    for i in range(6):
+        namespace = ("jvc", "triage_examples" if i % 2 else "reputation")
+        triage = "no" if i % 3 else "email"
+        store.put(namespace, str(i), {"triage": triage}, index=False)
+    page = store.search(("jvc",), limit=2, offset=1)
+    assert [r.key for r in page] == ["4", "3"]
+    page = store.search(("jvc",), filter={"triage": "no"}, limit=2, offset=1)
+    assert [r.key for r in page] == ["4", "2"]
+
+
+def test_overwrites_and_deletes_are_compacted(make_store):
+    store = make_store()
+    namespace = ("jvc", "triage_examples")
+    for i in range(5):
+        store.put(namespace, "a", {"text": "invoice" if i % 2 else "meeting"})
+    store.put(namespace, "b", {"text": "newsletter"})
+    store.delete(namespace, "b")
+
+    results = store.search(namespace, query="invoice")
+    assert [(r.key, r.value["text"]) for r in results] == [("a", "meeting")]
+    # Dead rows were dropped from the matrix file
+    assert store._indexes[".".join(namespace)].count <= 2
+    assert len(list(store.vector_dir.iterdir())) == 1
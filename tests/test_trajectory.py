@@ -0,0 +1,44 @@
+"""Unit tests for trajectory compaction."""
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from eaia.trajectory import compact_trajectory
+
+EMAIL = "Hi Jane, " + "could we meet next week to go over the quarterly numbers? " * 10
+
+
+def _messages(calendar_events: int = 100):
+    return [
+        HumanMessage(content=f"Draft a response to this email:\n\n{EMAIL}"),
+        AIMessage(
+            content="",
+            tool_calls=[{"id": "1", "name": "MeetingAssistant", "args": {"call": True}}],
+        ),
+        ToolMessage(
+            content="\n".join(f"Event {i}: busy" for i in range(calendar_events)),
+            tool_call_id="1",
+        ),
+        HumanMessage(content=f"Here is the email again:\n\n{EMAIL}"),
+        AIMessage(content="Sure, how about Tuesday at 10am?"),
+    ]
+
+
+def test_email_is_kept_once_and_tool_output_truncated():
+    trajectory = compact_trajectory(_messages())
+    assert trajectory.count("quarterly numbers") == 10
+    assert "[same text as message 1]" in trajectory
+    assert "Event 99" not in trajectory and "more characters]" in trajectory
+    assert "-> MeetingAssistant" in trajectory
+    assert trajectory.rstrip().endswith("how about Tuesday at 10am?")
+
+
+def test_budget_drops_middle_messages_first():
+    trajectory = compact_trajectory(_messages(), budget=250)
+    assert trajectory.startswith("[1] human: Draft a response")
+    assert "earlier messages omitted]" in trajectory
+    assert "how about Tuesday at 10am?" in trajectory
+
+
+def test_accepts_message_dicts():
+    trajectory = compact_trajectory([{"role": "user", "content": "Hello"}])
+    assert trajectory == "[1] human: Hello"